@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from multiprocessing import cpu_count
+from time import perf_counter
+from typing import Any
+
+import numpy as np
+
+from mlib.core.logger import LoggingMode, MLogger
+
+# 基準より遅くなったとみなす処理時間の下限差分(秒)（短い段階の揺らぎを拾わないようにする）
+REGRESSION_MIN_SECONDS = 0.05
+
+# 基準より増えたとみなすメモリのピークの下限差分
+REGRESSION_MIN_BYTES = 1024**2
+
+# 左右対称フィッティングの結果が、全ボーンフィッティングの結果と一致しているとみなすボーン位置の差
+SYMMETRIC_FITTING_TOLERANCE = 0.1
+
+
+def get_scenario_name(parameters: dict) -> str:
+    """計測条件ごとの基準値のキー"""
+    return (
+        f"v{parameters['vertices']}_b{parameters['bones']}_m{parameters['morphs']}"
+        + f"_mt{parameters['materials']}_r{parameters['rigidbodies']}_s{parameters['seed']}"
+        + ("_memory" if parameters["trace_memory"] else "")
+        + ("_fitting" if parameters["trace_fitting"] else "")
+        + ("_symmetric" if parameters["symmetric_fitting"] else "")
+    )
+
+
+def get_fitting_positions(dress: Any) -> dict[str, np.ndarray]:
+    """フィッティングモーフを適用した衣装のボーン位置"""
+    from mlib.vmd.vmd_collection import VmdMotion
+    from mlib.vmd.vmd_part import VmdMorphFrame
+    from service.usecase.dress_bone_setting import DRESS_BONE_FITTING_NAME
+
+    dress_motion = VmdMotion("dress fit motion")
+    dress_motion.morphs[DRESS_BONE_FITTING_NAME].append(VmdMorphFrame(0, DRESS_BONE_FITTING_NAME, ratio=1.0))
+    dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
+
+    return dict([(bone.name, dress_matrixes[0, bone.name].position.vector) for bone in dress.bones])
+
+
+def compare_fitting(positions: dict[str, np.ndarray], full_positions: dict[str, np.ndarray], tolerance: float) -> list[tuple[str, float]]:
+    """全ボーンフィッティングの結果と比べて、ボーン位置が許容差より離れているボーンと、その距離を返す"""
+    differences: list[tuple[str, float]] = []
+    for bone_name, full_position in full_positions.items():
+        if bone_name not in positions:
+            continue
+        distance = float(np.linalg.norm(positions[bone_name] - full_position))
+        if tolerance < distance:
+            differences.append((bone_name, distance))
+    return sorted(differences, key=lambda x: -x[1])
+
+
+def compare_stages(baseline_stages: dict[str, dict], stages: dict[str, dict], threshold: float) -> list[str]:
+    """
+    基準値と比べて、閾値（割合）より遅くなった段階・メモリのピークが増えた段階を返す
+    threshold: 0.2 の場合、基準値の1.2倍を超えたら遅くなったとみなす
+    """
+    regressions: list[str] = []
+    for path, stage in stages.items():
+        if path not in baseline_stages:
+            continue
+        baseline_stage = baseline_stages[path]
+
+        if (
+            baseline_stage["median"] * (1 + threshold) < stage["median"]
+            and REGRESSION_MIN_SECONDS < stage["median"] - baseline_stage["median"]
+        ):
+            regressions.append(f"{path}: {baseline_stage['median']:.3f}s -> {stage['median']:.3f}s")
+
+        if (
+            "peak_bytes" in baseline_stage
+            and "peak_bytes" in stage
+            and baseline_stage["peak_bytes"] * (1 + threshold) < stage["peak_bytes"]
+            and REGRESSION_MIN_BYTES < stage["peak_bytes"] - baseline_stage["peak_bytes"]
+        ):
+            regressions.append(f"{path}: {baseline_stage['peak_bytes'] / 1024 ** 2:.1f}MB -> {stage['peak_bytes'] / 1024 ** 2:.1f}MB")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    # 引数の取得
+    parser = argparse.ArgumentParser(description="合成した人物・衣装モデルで、読み込み（フィッティング）と出力の処理時間を計測する")
+    parser.add_argument("--vertices", default=20000, type=int, help="頂点数")
+    parser.add_argument("--bones", default=100, type=int, help="準標準ボーン以外に追加するボーン数")
+    parser.add_argument("--morphs", default=50, type=int, help="頂点モーフ数")
+    parser.add_argument("--materials", default=10, type=int, help="材質数")
+    parser.add_argument("--rigidbodies", default=50, type=int, help="剛体数")
+    parser.add_argument("--repeat", default=3, type=int, help="計測回数（段階ごとの中央値を記録する）")
+    parser.add_argument("--seed", default=0, type=int, help="モデル生成の乱数シード")
+    parser.add_argument("--output", default="", type=str, help="計測結果JSONの出力先（未指定の場合、リポジトリ直下の benchmark フォルダ）")
+    parser.add_argument("--trace_memory", default=0, type=int, help="段階ごとのメモリ量も計測する（処理時間は遅くなる）")
+    parser.add_argument(
+        "--trace_fitting",
+        default="",
+        type=str,
+        help="ボーンフィッティングの記録CSVの出力先（最後の計測回を出力する。処理時間は少し遅くなる）",
+    )
+    parser.add_argument(
+        "--symmetric_fitting",
+        default=0,
+        type=int,
+        help="左右対称なボーンは片側だけフィッティングする（計測後に全ボーンフィッティングと結果を比べる）",
+    )
+    parser.add_argument("--baseline", default="", type=str, help="計測条件ごとの基準値JSON（指定した場合、基準値と比べる）")
+    parser.add_argument("--update_baseline", default=0, type=int, help="今回の計測結果を基準値JSONに保存する")
+    parser.add_argument("--threshold", default=0.2, type=float, help="基準値より遅くなったとみなす割合")
+    parser.add_argument("--verbose", default=30, type=int)
+    parser.add_argument("--lang", default="ja", type=str)
+
+    args, argv = parser.parse_known_args()
+
+    # ロガーの初期化（画面は使わない）
+    root_dir = os.path.dirname(os.path.abspath(__file__))
+    MLogger.initialize(
+        lang=args.lang,
+        root_dir=root_dir,
+        version_name="benchmark",
+        mode=LoggingMode(0),
+        level=args.verbose,
+        is_out_log=0,
+    )
+    logger = MLogger(os.path.basename(__file__))
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    from mlib.core.math import MVector3D
+    from mlib.pmx.pmx_reader import PmxReader
+    from mlib.pmx.pmx_writer import PmxWriter
+    from mlib.vmd.vmd_collection import VmdMotion
+    from mlib.vmd.vmd_part import VmdMorphFrame
+    from service.usecase.dress_bone_setting import DRESS_BONE_FITTING_NAME, DRESS_VERTEX_FITTING_NAME
+    from service.usecase.load_usecase import LoadUsecase
+    from service.usecase.preview_mesh import PreviewMeshes
+    from service.usecase.save_usecase import SaveUsecase
+    from service.usecase.synthetic_model import SyntheticModel
+    from service.worker.load_steps import load_dress, load_model
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root_dir, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+
+    parameters = dict(
+        vertices=args.vertices,
+        bones=args.bones,
+        morphs=args.morphs,
+        materials=args.materials,
+        rigidbodies=args.rigidbodies,
+        seed=args.seed,
+        trace_memory=args.trace_memory,
+        trace_fitting=bool(args.trace_fitting),
+        symmetric_fitting=bool(args.symmetric_fitting),
+    )
+
+    # 段階ごとの計測結果（キー: 段階のパス、値: 計測回ごとの所要時間）
+    stage_elapsed_times: dict[str, list[float]] = {}
+
+    def append_elapsed(path: str, elapsed: float) -> None:
+        if path not in stage_elapsed_times:
+            stage_elapsed_times[path] = []
+        stage_elapsed_times[path].append(elapsed)
+
+    # メモリ計測中の場合、段階ごとのピーク（キー: 段階のパス、値: 計測回ごとのピーク）
+    stage_peak_bytes: dict[str, list[int]] = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # 人物と、人物より一回り大きくずらした衣装を生成する
+        model_path = os.path.join(work_dir, "model.pmx")
+        dress_path = os.path.join(work_dir, "dress.pmx")
+        output_path = os.path.join(work_dir, "output", "output.pmx")
+
+        PmxWriter(
+            SyntheticModel(args.seed).create(
+                "人物", args.vertices, args.bones, args.morphs, args.materials, args.rigidbodies, path=model_path
+            ),
+            model_path,
+        ).save()
+        PmxWriter(
+            SyntheticModel(args.seed + 1).create(
+                "衣装",
+                args.vertices,
+                args.bones,
+                args.morphs,
+                args.materials,
+                args.rigidbodies,
+                scale=(1.1, 0.95, 1.05),
+                thickness=1.2,
+                path=dress_path,
+            ),
+            dress_path,
+        ).save()
+
+        for n in range(args.repeat):
+            logger.warning("計測 [{n}/{r}]", n=n + 1, r=args.repeat)
+
+            # 読み込み・フィッティング
+            load_usecase = LoadUsecase()
+            load_usecase.trace.is_enabled = bool(args.trace_fitting)
+            load_usecase.is_symmetric_fitting = bool(args.symmetric_fitting)
+            load_start = perf_counter()
+            original_model, model = load_model(load_usecase, PmxReader(), model_path)
+            original_dress, dress, individual_morph_names, _, _ = load_dress(load_usecase, PmxReader(), dress_path, model, PreviewMeshes())
+            append_elapsed("読み込み", perf_counter() - load_start)
+
+            if args.trace_fitting:
+                load_usecase.trace.save(args.trace_fitting)
+
+            # 出力（画面の初期値と同じ設定で出力する）
+            dress_motion = VmdMotion("dress fit motion")
+            for morph_name in (DRESS_BONE_FITTING_NAME, DRESS_VERTEX_FITTING_NAME):
+                mf = VmdMorphFrame(0, morph_name)
+                mf.ratio = 1
+                dress_motion.morphs[morph_name].append(mf)
+
+            model_material_names = [material.name for material in model.materials]
+            dress_material_names = [material.name for material in dress.materials]
+
+            save_usecase = SaveUsecase()
+            save_start = perf_counter()
+            save_usecase.save(
+                model,
+                original_dress,
+                dress,
+                None,
+                dress_motion,
+                output_path,
+                dict([(material_name, 1.0) for material_name in model_material_names]),
+                {},
+                dict([(material_name, False) for material_name in model_material_names]),
+                dict([(material_name, [0, 0, 0]) for material_name in model_material_names]),
+                dict([(material_name, 0) for material_name in model_material_names]),
+                dict([(material_name, 1.0) for material_name in dress_material_names]),
+                {},
+                dict([(material_name, False) for material_name in dress_material_names]),
+                dict([(material_name, [0, 0, 0]) for material_name in dress_material_names]),
+                dict([(material_name, 0) for material_name in dress_material_names]),
+                dict([(morph_name, MVector3D(1, 1, 1)) for morph_name in individual_morph_names]),
+                dict([(morph_name, MVector3D()) for morph_name in individual_morph_names]),
+                dict([(morph_name, MVector3D()) for morph_name in individual_morph_names]),
+                dict([(morph_name, False) for morph_name in individual_morph_names]),
+            )
+            append_elapsed("出力", perf_counter() - save_start)
+
+            for timer in (load_usecase.timer, save_usecase.timer):
+                for path, elapsed, _ in timer.get_stages():
+                    append_elapsed(path, elapsed)
+                for path, peak_bytes, _ in timer.get_memory_summary(len(timer.get_stages())):
+                    stage_peak_bytes.setdefault(path, []).append(peak_bytes)
+
+        symmetric_differences: list[tuple[str, float]] = []
+        if args.symmetric_fitting:
+            # 左右対称フィッティングの結果が、全ボーンをフィッティングした結果と変わらないか確かめる（計測には含めない）
+            full_load_usecase = LoadUsecase()
+            _, full_model = load_model(full_load_usecase, PmxReader(), model_path)
+            _, full_dress, _, _, _ = load_dress(full_load_usecase, PmxReader(), dress_path, full_model, PreviewMeshes())
+
+            symmetric_differences = compare_fitting(
+                get_fitting_positions(dress), get_fitting_positions(full_dress), SYMMETRIC_FITTING_TOLERANCE
+            )
+            if symmetric_differences:
+                logger.warning(
+                    "左右対称フィッティングの結果が全ボーンフィッティングと異なります（許容差 {t}）\n{d}",
+                    t=SYMMETRIC_FITTING_TOLERANCE,
+                    d="\n".join([f"  {distance:8.3f} {bone_name}" for bone_name, distance in symmetric_differences]),
+                )
+            else:
+                logger.warning(
+                    "左右対称フィッティングの結果は全ボーンフィッティングと一致しました（許容差 {t}）", t=SYMMETRIC_FITTING_TOLERANCE
+                )
+
+    # コミット間で比べられるように、計測条件と段階ごとの中央値・最小値を出力する
+    result = dict(
+        commit=commit,
+        created=f"{datetime.now():%Y-%m-%d %H:%M:%S}",
+        python=platform.python_version(),
+        platform=platform.platform(),
+        cpu_count=cpu_count(),
+        parameters=parameters,
+        repeat=args.repeat,
+        stages=dict(
+            [
+                (path, dict(median=round(float(np.median(elapsed_times)), 6), min=round(float(np.min(elapsed_times)), 6)))
+                for path, elapsed_times in stage_elapsed_times.items()
+            ]
+        ),
+    )
+    for path, peak_bytes in stage_peak_bytes.items():
+        result["stages"][path]["peak_bytes"] = int(np.max(peak_bytes))
+
+    # ソースの中に出力しないように、未指定の場合はリポジトリ直下の benchmark フォルダに出力する
+    output_result_path = args.output or os.path.join(os.path.dirname(root_dir), "benchmark", f"benchmark_{commit[:8] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_result_path)), exist_ok=True)
+    with open(output_result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    logger.warning(
+        "段階ごとの処理時間（中央値）\n{s}",
+        s="\n".join([f"{stage['median']:10.3f}s  {path}" for path, stage in result["stages"].items()]),
+    )
+    logger.warning("計測結果を出力しました -> {p}", p=output_result_path)
+
+    if args.baseline:
+        scenario_name = get_scenario_name(parameters)
+
+        baselines: dict[str, dict] = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baselines = json.load(f)
+
+        regressions: list[str] = []
+        if scenario_name in baselines:
+            regressions = compare_stages(baselines[scenario_name]["stages"], result["stages"], args.threshold)
+            logger.warning("基準値 [{s}] ({c}) と比較", s=scenario_name, c=baselines[scenario_name]["commit"][:8])
+            if regressions:
+                logger.warning("遅くなった段階があります\n{r}", r="\n".join([f"  ! {regression}" for regression in regressions]))
+            else:
+                logger.warning("遅くなった段階はありません")
+        else:
+            logger.warning("基準値 [{s}] がありません", s=scenario_name)
+
+        if args.update_baseline:
+            baselines[scenario_name] = dict(commit=commit, created=result["created"], stages=result["stages"])
+            with open(args.baseline, "w", encoding="utf-8") as f:
+                json.dump(baselines, f, ensure_ascii=False, indent=2)
+            logger.warning("基準値を保存しました -> {p}", p=args.baseline)
+
+        if regressions:
+            # CIなどで止められるように、遅くなった段階がある場合は異常終了にする
+            sys.exit(1)
+
+    if symmetric_differences:
+        # 左右対称フィッティングの結果がずれている場合も異常終了にする
+        sys.exit(1)
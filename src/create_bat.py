@@ -23,6 +23,10 @@ for file_path, args in [
         f"../dist/{EXE_NAME}.exe - ログあり版.bat",
         "--verbose 20 --out_log 1 --lang ja",
     ),
+    (
+        f"../dist/{EXE_NAME}.exe - 別プロセス版.bat",
+        "--verbose 20 --out_log 0 --lang ja --process_worker 1",
+    ),
 ]:
     print("file_name: ", file_path)
     print("args: ", args)
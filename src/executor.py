@@ -3,7 +3,6 @@ import os
 from multiprocessing import freeze_support
 
 import numpy as np
-import wx
 
 from mlib.core.logger import LoggingMode, MLogger
 
@@ -27,11 +26,19 @@ if __name__ == "__main__":
     parser.add_argument("--out_log", default=0, type=int)
     parser.add_argument("--is_saving", default=1, type=int)
     parser.add_argument("--lang", default="ja", type=str)
+    parser.add_argument("--process_worker", default=0, type=int)
+    parser.add_argument("--trace_memory", default=0, type=int)
+    parser.add_argument("--profile", default=0, type=int)
+    parser.add_argument("--trace_fitting", default=0, type=int)
+    parser.add_argument("--symmetric_fitting", default=0, type=int)
 
     args, argv = parser.parse_known_args()
 
+    # 画面はアプリ起動時だけ読み込む（APP_NAMEなどは画面なしでも参照できるようにする）
+    import wx
+
     # ロガーの初期化
-    MLogger.initialize(
+    logger_config = dict(
         lang=args.lang,
         root_dir=os.path.dirname(os.path.abspath(__file__)),
         version_name=f"{APP_NAME} {VERSION_NAME}",
@@ -39,6 +46,14 @@ if __name__ == "__main__":
         level=args.verbose,
         is_out_log=args.out_log,
     )
+    MLogger.initialize(**logger_config)
+
+    if args.trace_memory:
+        # 段階ごとのメモリ量を計測する（子プロセスでも計測するように環境変数でも指定する）
+        import tracemalloc
+
+        os.environ["PYTHONTRACEMALLOC"] = "1"
+        tracemalloc.start()
 
     from mlib.utils.file_utils import get_path
     from service.form.main_frame import MainFrame
@@ -46,7 +61,20 @@ if __name__ == "__main__":
     # アプリの起動
     app = wx.App(False)
     icon = wx.Icon(get_path("resources/logo.ico"), wx.BITMAP_TYPE_ICO)
-    frame = MainFrame(app, f"{APP_NAME} {VERSION_NAME}", wx.Size(1200, 880), args.is_saving)
+    frame = MainFrame(
+        app,
+        f"{APP_NAME} {VERSION_NAME}",
+        wx.Size(1200, 880),
+        args.is_saving,
+        # 重い処理を子プロセスで実行する場合、子プロセスでも同じ設定でロガーを初期化する
+        process_logger_config=(logger_config if args.process_worker else None),
+        # 読み込みと出力のスタックを採取して、フレームグラフ用の折り畳み形式で出力する
+        is_profile=bool(args.profile),
+        # ボーンごとのフィッティング記録をCSVで出力する
+        is_trace_fitting=bool(args.trace_fitting),
+        # 左右対称なボーンは片側だけフィッティングして、もう片側は反転した値を使う
+        is_symmetric_fitting=bool(args.symmetric_fitting),
+    )
     frame.SetIcon(icon)
     frame.Show(True)
     app.MainLoop()
@@ -1,4 +1,5 @@
 import os
+import sys
 from typing import Any, Optional
 
 import wx
@@ -7,22 +8,46 @@ from mlib.core.logger import MLogger
 from mlib.core.math import MVector3D
 from mlib.pmx.pmx_collection import PmxModel
 from mlib.service.form.notebook_frame import NotebookFrame
-from mlib.utils.file_utils import save_histories
+from mlib.utils.file_utils import get_root_dir, save_histories
 from mlib.vmd.vmd_collection import VmdMotion
 from mlib.vmd.vmd_part import VmdMorphFrame
 from service.form.panel.config_panel import ConfigPanel
 from service.form.panel.file_panel import FilePanel
-from service.usecase.dress_bone_setting import DRESS_BONE_FITTING_NAME, DRESS_VERTEX_FITTING_NAME
+from service.usecase.dress_bone_adjustment import DressBoneAdjustments
+from service.usecase.dress_bone_setting import DRESS_BONE_ADJUST_NAME, DRESS_BONE_FITTING_NAME, DRESS_VERTEX_FITTING_NAME
+from service.usecase.material_transparent import MATERIAL_TRANSPARENT_NAME, MaterialTransparents
+from service.usecase.model_cache import ModelCache
+from service.usecase.preview_mesh import PreviewMeshes
 from service.worker.load_motion_worker import LoadMotionWorker
 from service.worker.load_worker import LoadWorker
+from service.worker.log_sink import LOG_FILE_NAME, LogSink
 from service.worker.save_worker import SaveWorker
 
 logger = MLogger(os.path.basename(__file__))
 __ = logger.get_text
 
 
+CONSOLE_MAX_LINES = 3000
+"""コンソールに残す最近の行数（古い行はログファイルにだけ残す）"""
+
+CONSOLE_TRIM_MS = 1000
+"""コンソールの行数を確認する間隔(ミリ秒)"""
+
+
 class MainFrame(NotebookFrame):
-    def __init__(self, app: wx.App, title: str, size: wx.Size, is_saving: bool, *args, **kw) -> None:
+    def __init__(
+        self,
+        app: wx.App,
+        title: str,
+        size: wx.Size,
+        is_saving: bool,
+        process_logger_config: Optional[dict[str, Any]] = None,
+        is_profile: bool = False,
+        is_trace_fitting: bool = False,
+        is_symmetric_fitting: bool = False,
+        *args,
+        **kw,
+    ) -> None:
         super().__init__(
             app,
             history_keys=["model_pmx", "dress_pmx", "motion_vmd"],
@@ -30,12 +55,44 @@ class MainFrame(NotebookFrame):
             size=size,
             is_saving=is_saving,
         )
+        # 読み込みと出力を子プロセスで実行する場合の子プロセスのロガー設定
+        self.process_logger_config = process_logger_config
+        # 読み込みと出力の処理中のスタックを採取する
+        self.is_profile = is_profile
+        # ボーンフィッティングの記録を出力する
+        self.is_trace_fitting = is_trace_fitting
+        # 左右対称なボーンは片側だけフィッティングする
+        self.is_symmetric_fitting = is_symmetric_fitting
 
         # ファイルタブ
         self.file_panel = FilePanel(self, 0)
         self.notebook.AddPage(self.file_panel, __("ファイル"), False)
+
+        # ログは出力されるたびにファイルに書き出し、コンソールには最近の行だけ残す
+        self.log_sink = LogSink(self.file_panel.console_ctrl, os.path.join(get_root_dir(), LOG_FILE_NAME))
+        # 画面を閉じる時に戻す
+        self.original_stdout = sys.stdout
+        sys.stdout = self.log_sink
+        self.console_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_console_timer, self.console_timer)
+        self.console_timer.Start(CONSOLE_TRIM_MS)
+
         self.model_motion: Optional[VmdMotion] = None
         self.dress_motion: Optional[VmdMotion] = None
+        self.dress_bone_adjustments: Optional[DressBoneAdjustments] = None
+        # モーションに適用済みのモーフ値
+        self.model_morph_ratios: dict[str, float] = {}
+        self.dress_morph_ratios: dict[str, float] = {}
+        self.model_material_transparents: Optional[MaterialTransparents] = None
+        self.dress_material_transparents: Optional[MaterialTransparents] = None
+        # 操作中に表示する衣装の間引きメッシュ
+        self.preview_meshes = PreviewMeshes()
+        self.dress_preview_model: Optional[PmxModel] = None
+        self.is_preview = False
+        # 作成済みの衣装の描画セット（元のメッシュと間引きメッシュを入れ替えても、描画用のメッシュは作り直さない）
+        self.dress_model_sets: list[Any] = []
+        # 最近読み込んだ人物と衣装の組み合わせ
+        self.model_cache = ModelCache()
 
         # 設定タブ
         self.config_panel = ConfigPanel(self, 1)
@@ -47,6 +104,36 @@ class MainFrame(NotebookFrame):
 
         self.file_panel.exec_btn_ctrl.exec_worker = self.save_worker
 
+        # Escキーで読み込みと出力を中断する
+        self.Bind(wx.EVT_CHAR_HOOK, self.on_char_hook)
+        # 閉じるのを取り消される場合もあるので、画面が破棄される時に後始末する
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.on_destroy)
+
+    def on_destroy(self, event: wx.WindowDestroyEvent) -> None:
+        """画面を破棄する時に、標準出力を元に戻してログファイルを閉じる"""
+        if event.GetEventObject() is self:
+            self.console_timer.Stop()
+            sys.stdout = self.original_stdout
+            self.log_sink.close()
+        event.Skip()
+
+    def on_console_timer(self, event: wx.Event) -> None:
+        # ワーカーからの出力と順番に処理されるよう、イベントキューに積んでから捨てる
+        wx.CallAfter(self.trim_console)
+
+    def trim_console(self) -> None:
+        """コンソールの古い行を捨てる"""
+        text_ctrl: wx.TextCtrl = self.file_panel.console_ctrl.text_ctrl
+        line_count = text_ctrl.GetNumberOfLines()
+        if CONSOLE_MAX_LINES < line_count:
+            text_ctrl.Remove(0, text_ctrl.XYToPosition(0, line_count - CONSOLE_MAX_LINES))
+
+    def on_char_hook(self, event: wx.KeyEvent) -> None:
+        if event.GetKeyCode() == wx.WXK_ESCAPE:
+            self.load_worker.cancel_token.cancel()
+            self.save_worker.cancel_token.cancel()
+        event.Skip()
+
     def on_change_tab(self, event: wx.Event) -> None:
         if self.notebook.GetSelection() == self.config_panel.tab_idx:
             self.notebook.ChangeSelection(self.file_panel.tab_idx)
@@ -88,10 +175,10 @@ class MainFrame(NotebookFrame):
     def on_result(
         self,
         result: bool,
-        data: Optional[tuple[PmxModel, PmxModel, PmxModel, PmxModel, VmdMotion, list[str], list[list[int]]]],
+        data: Optional[tuple[PmxModel, PmxModel, PmxModel, PmxModel, VmdMotion, list[str], list[list[int]], Optional[PmxModel]]],
         elapsed_time: str,
     ) -> None:
-        self.file_panel.console_ctrl.write(f"\n----------------\n{elapsed_time}")
+        self.log_sink.write(f"\n----------------\n{elapsed_time}")
 
         if not (result and data):
             self.file_panel.Enable(True)
@@ -101,7 +188,18 @@ class MainFrame(NotebookFrame):
 
         logger.info("描画準備開始", decoration=MLogger.Decoration.BOX)
 
-        original_model, model, original_dress, dress, motion, individual_morph_names, individual_target_bone_indexes = data
+        (
+            original_model,
+            model,
+            original_dress,
+            dress,
+            motion,
+            individual_morph_names,
+            individual_target_bone_indexes,
+            self.dress_preview_model,
+        ) = data
+        self.is_preview = False
+        self.dress_model_sets = []
 
         self.file_panel.model_ctrl.original_data = original_model
         self.file_panel.model_ctrl.data = model
@@ -117,6 +215,14 @@ class MainFrame(NotebookFrame):
         # モデルとドレスのボーンの縮尺を合わせる
         self.model_motion = motion
         self.dress_motion = motion.copy()
+        self.model_morph_ratios = {}
+        self.dress_morph_ratios = {}
+
+        # 個別調整の変形テーブル
+        self.dress_bone_adjustments = DressBoneAdjustments(dress, individual_morph_names)
+        # 材質別の非透過度
+        self.model_material_transparents = MaterialTransparents(model)
+        self.dress_material_transparents = MaterialTransparents(dress)
 
         # 衣装モーションにモーフを適用
         self.set_dress_motion_morphs()
@@ -156,7 +262,7 @@ class MainFrame(NotebookFrame):
         self.on_sound()
 
     def on_motion_result(self, result: bool, data: Optional[VmdMotion], elapsed_time: str) -> None:
-        self.file_panel.console_ctrl.write(f"\n----------------\n{elapsed_time}")
+        self.log_sink.write(f"\n----------------\n{elapsed_time}")
 
         if not (result and data):
             self.file_panel.Enable(True)
@@ -171,11 +277,16 @@ class MainFrame(NotebookFrame):
         # モデルとドレスのボーンの縮尺を合わせる
         self.model_motion = motion
         self.dress_motion = motion.copy()
+        self.model_morph_ratios = {}
+        self.dress_morph_ratios = {}
+        self.is_preview = False
+        self.dress_model_sets = []
 
         # 既存のモーフを適用
-        self.set_model_motion_morphs(self.config_panel.model_material_ctrl.alphas)
+        self.set_model_motion_morphs(self.config_panel.model_material_ctrl.alphas, self.config_panel.model_morph_ctrl.ratios)
         self.set_dress_motion_morphs(
             self.config_panel.dress_material_ctrl.alphas,
+            self.config_panel.dress_morph_ctrl.ratios,
             self.config_panel.dress_bone_ctrl.scales,
             self.config_panel.dress_bone_ctrl.degrees,
             self.config_panel.dress_bone_ctrl.positions,
@@ -208,31 +319,28 @@ class MainFrame(NotebookFrame):
         self.file_panel.Enable(True)
         self.on_sound()
 
-    def set_model_motion_morphs(self, material_alphas: dict[str, float] = {}, morph_ratios: dict[str, float] = {}) -> None:
+    def set_model_motion_morphs(self, material_alphas: dict[str, float] = {}, morph_ratios: dict[str, float] = {}) -> bool:
+        """人物モーションにモーフを適用する。前回から変わったモーフが無い場合はFalse"""
         if self.model_motion is None:
-            return
+            return False
 
-        model: PmxModel = self.file_panel.model_ctrl.data
+        is_changed = False
 
-        for material in model.materials:
-            mf = VmdMorphFrame(0, f"{material.name}TR")
-            mf.ratio = abs(material_alphas.get(material.name, 1.0) - 1)
-            self.model_motion.morphs[mf.name].append(mf)
+        if self.model_material_transparents:
+            # 材質の非透過度は材質透過モーフのオフセットに反映する
+            is_changed |= self.model_material_transparents.update(material_alphas)
+            is_changed |= self.set_morph_frame(self.model_motion, self.model_morph_ratios, MATERIAL_TRANSPARENT_NAME, 1)
 
         for morph_name, ratio in morph_ratios.items():
-            mf = VmdMorphFrame(0, morph_name)
-            mf.ratio = ratio
-            self.model_motion.morphs[mf.name].append(mf)
-
-        mf = VmdMorphFrame(0, "全材質TR")
-        mf.ratio = abs(material_alphas.get(__("全材質"), 1.0) - 1)
-        self.model_motion.morphs[mf.name].append(mf)
+            is_changed |= self.set_morph_frame(self.model_motion, self.model_morph_ratios, morph_name, ratio)
 
         # self.file_panel.create_output_path()
 
+        return is_changed
+
     def clear_model_opacity(self):
-        if self.model_motion and self.model_motion.morphs:
-            del self.model_motion.morphs["全材質TR"]
+        if self.model_material_transparents:
+            self.model_material_transparents.update_all(1.0)
 
     def set_dress_motion_morphs(
         self,
@@ -241,55 +349,29 @@ class MainFrame(NotebookFrame):
         bone_scales: dict[str, MVector3D] = {},
         bone_degrees: dict[str, MVector3D] = {},
         bone_positions: dict[str, MVector3D] = {},
-    ) -> None:
+    ) -> bool:
+        """衣装モーションにモーフを適用する。前回から変わったモーフが無い場合はFalse"""
         if self.dress_motion is None:
-            return
-
-        # model: PmxModel = self.file_panel.model_ctrl.data
-        dress: PmxModel = self.file_panel.dress_ctrl.data
+            return False
 
         self.dress_motion.path = "fit motion"
 
         # フィッティングモーフは常に適用
-        bmf = VmdMorphFrame(0, DRESS_BONE_FITTING_NAME)
-        bmf.ratio = 1
-        self.dress_motion.morphs[bmf.name].append(bmf)
-
-        vmf = VmdMorphFrame(0, DRESS_VERTEX_FITTING_NAME)
-        vmf.ratio = 1
-        self.dress_motion.morphs[vmf.name].append(vmf)
+        is_changed = self.set_morph_frame(self.dress_motion, self.dress_morph_ratios, DRESS_BONE_FITTING_NAME, 1)
+        is_changed |= self.set_morph_frame(self.dress_motion, self.dress_morph_ratios, DRESS_VERTEX_FITTING_NAME, 1)
 
-        for material in dress.materials:
-            mf = VmdMorphFrame(0, f"{material.name}TR")
-            mf.ratio = abs(material_alphas.get(material.name, 1.0) - 1)
-            self.dress_motion.morphs[mf.name].append(mf)
-
-        mf = VmdMorphFrame(0, "全材質TR")
-        mf.ratio = abs(material_alphas.get(__("全材質"), 1.0) - 1)
-        self.dress_motion.morphs[mf.name].append(mf)
+        if self.dress_material_transparents:
+            # 材質の非透過度は材質透過モーフのオフセットに反映する
+            is_changed |= self.dress_material_transparents.update(material_alphas)
+            is_changed |= self.set_morph_frame(self.dress_motion, self.dress_morph_ratios, MATERIAL_TRANSPARENT_NAME, 1)
 
         for morph_name, ratio in morph_ratios.items():
-            mf = VmdMorphFrame(0, morph_name)
-            mf.ratio = ratio
-            self.dress_motion.morphs[mf.name].append(mf)
-
-        for morph_name, scale, degree, position in zip(
-            bone_scales.keys(), bone_scales.values(), bone_degrees.values(), bone_positions.values()
-        ):
-            for ratio, axis_name, origin in (
-                (scale.x, "SX", 1),
-                (scale.y, "SY", 1),
-                (scale.z, "SZ", 1),
-                (degree.x, "RX", 0),
-                (degree.y, "RY", 0),
-                (degree.z, "RZ", 0),
-                (position.x, "MX", 0),
-                (position.y, "MY", 0),
-                (position.z, "MZ", 0),
-            ):
-                mf = VmdMorphFrame(0, f"調整:{morph_name}:{axis_name}")
-                mf.ratio = ratio - origin
-                self.dress_motion.morphs[mf.name].append(mf)
+            is_changed |= self.set_morph_frame(self.dress_motion, self.dress_morph_ratios, morph_name, ratio)
+
+        if self.dress_bone_adjustments:
+            # 個別調整は調整テーブルからまとめたモーフを作り直して、そのモーフだけ適用する
+            is_changed |= self.dress_bone_adjustments.update(bone_scales, bone_degrees, bone_positions)
+            is_changed |= self.set_morph_frame(self.dress_motion, self.dress_morph_ratios, DRESS_BONE_ADJUST_NAME, 1)
 
             # # 再フィットは倍率は常に1（実際に与える値の方で調整する）
             # mf = VmdMorphFrame(0, f"調整:{__(bone_type_name)}:Refit")
@@ -298,6 +380,20 @@ class MainFrame(NotebookFrame):
 
         # self.file_panel.create_output_path()
 
+        return is_changed
+
+    def set_morph_frame(self, motion: VmdMotion, applied_ratios: dict[str, float], morph_name: str, ratio: float) -> bool:
+        """前回適用した値から変わったモーフだけキーフレを登録する"""
+        if morph_name in applied_ratios and applied_ratios[morph_name] == ratio:
+            return False
+
+        mf = VmdMorphFrame(0, morph_name)
+        mf.ratio = ratio
+        motion.morphs[mf.name].append(mf)
+        applied_ratios[morph_name] = ratio
+
+        return True
+
     def fit_model_motion(self, bone_alpha: float = 1.0, is_bone_deform: bool = True) -> None:
         self.config_panel.canvas.model_sets[0].motion = self.model_motion
         self.config_panel.canvas.model_sets[0].bone_alpha = bone_alpha
@@ -308,6 +404,50 @@ class MainFrame(NotebookFrame):
         self.config_panel.canvas.model_sets[1].bone_alpha = bone_alpha
         self.config_panel.canvas.change_motion(wx.SpinEvent(), is_bone_deform, 1)
 
+    def start_preview(self) -> None:
+        """操作中は衣装を間引きメッシュで表示する"""
+        if self.is_preview or not self.dress_preview_model or not self.file_panel.model_ctrl.data:
+            return
+
+        self.is_preview = True
+        self.change_dress_model_set(self.dress_preview_model)
+
+    def end_preview(self) -> None:
+        """操作が止まったら衣装を元のメッシュに戻す"""
+        if not self.is_preview or not self.file_panel.model_ctrl.data or not self.file_panel.dress_ctrl.data:
+            return
+
+        self.is_preview = False
+        self.change_dress_model_set(self.file_panel.dress_ctrl.data)
+
+    def change_dress_model_set(self, dress: PmxModel) -> None:
+        """表示する衣装モデルを入れ替える（作成済みの描画セットがある場合、メッシュは作り直さずに差し替える）"""
+        dress_bone_alpha = self.config_panel.canvas.model_sets[1].bone_alpha
+        selected_bone_indexes = self.config_panel.canvas.animations[1].selected_bone_indexes
+        is_show_bone_weight = self.config_panel.canvas.animations[1].is_show_bone_weight
+
+        # 表示中の衣装の描画セットは外しても捨てずに残しておく
+        current_model_set = self.config_panel.canvas.model_sets[1]
+        if not any(model_set is current_model_set for model_set in self.dress_model_sets):
+            self.dress_model_sets.append(current_model_set)
+
+        dress_model_set = next((model_set for model_set in self.dress_model_sets if model_set.model is dress), None)
+        if dress_model_set:
+            # 人物モデルは描画中のものをそのまま使い、衣装の描画セットだけ差し替える
+            dress_model_set.motion = self.dress_motion
+            dress_model_set.bone_alpha = dress_bone_alpha
+            self.config_panel.canvas.model_sets[1] = dress_model_set
+        else:
+            # 初めて表示する衣装モデルの場合だけ、描画セットを作る
+            del self.config_panel.canvas.model_sets[1:]
+            del self.config_panel.canvas.animations[1:]
+            self.config_panel.canvas.append_model_set(dress, self.dress_motion, bone_alpha=dress_bone_alpha)
+            self.dress_model_sets.append(self.config_panel.canvas.model_sets[1])
+        self.config_panel.canvas.animations[1].selected_bone_indexes = selected_bone_indexes
+        self.config_panel.canvas.animations[1].is_show_bone_weight = is_show_bone_weight
+
+        self.fit_dress_motion(dress_bone_alpha)
+
     def change_bone(self, selected_bone_indexes: list[int]) -> None:
         self.config_panel.canvas.animations[1].selected_bone_indexes = selected_bone_indexes
         self.config_panel.canvas.Refresh()
@@ -1,12 +1,15 @@
 import os
+from threading import Thread
 from typing import Optional
 
 import wx
 
 from mlib.core.logger import MLogger
-from mlib.pmx.canvas import CanvasPanel
+from mlib.pmx.canvas import CanvasPanel, MotionSet
+from mlib.pmx.pmx_collection import PmxModel
 from mlib.service.form.notebook_frame import NotebookFrame
 from mlib.service.form.widgets.spin_ctrl import WheelSpinCtrl
+from mlib.vmd.vmd_collection import VmdMotion
 from service.form.widgets.bone_ctrl_set import BoneCtrlSet
 from service.form.widgets.material_ctrl_set import MaterialCtrlSet
 from service.form.widgets.morph_ctrl_set import MorphCtrlSet
@@ -14,6 +17,19 @@ from service.form.widgets.morph_ctrl_set import MorphCtrlSet
 logger = MLogger(os.path.basename(__file__), level=1)
 __ = logger.get_text
 
+# スライダー変更を反映する間隔(ms)
+CHANGE_INTERVAL_MS = 16
+# 操作が止まってから元のメッシュに戻すまでの間隔(ms)
+PREVIEW_IDLE_MS = 300
+
+
+def is_deform_required(is_bone_deform: bool, is_morph_changed: bool, bone_alpha: float, applied_bone_alpha: float) -> bool:
+    """
+    変形し直す必要があるか
+    モーフもボーンラインも変わっていない場合に省略できるのは、ボーン変形を伴わない要求だけ
+    """
+    return is_bone_deform or is_morph_changed or bone_alpha != applied_bone_alpha
+
 
 class ConfigPanel(CanvasPanel):
     def __init__(self, frame: NotebookFrame, tab_idx: int, *args, **kw) -> None:
@@ -121,6 +137,16 @@ class ConfigPanel(CanvasPanel):
 
     def _initialize_event(self) -> None:
         self.play_ctrl.Bind(wx.EVT_BUTTON, self.on_play)
+
+        # スライダー変更は溜めておいて、最新の状態だけを反映する
+        self.pending_change: Optional[tuple[bool, Optional[str], bool, bool]] = None
+        self.change_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_change_timer, self.change_timer)
+        # ボーン変形は別スレッドで行い、変形中に来た要求は変形が終わってから反映する
+        self.is_deforming = False
+        # 操作中は間引きメッシュで表示する
+        self.preview_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_preview_timer, self.preview_timer)
         # self.model_material_choice_ctrl.Bind(wx.EVT_LISTBOX, self.on_change)
         # self.dress_material_choice_ctrl.Bind(wx.EVT_LISTBOX, self.on_change)
 
@@ -178,16 +204,71 @@ class ConfigPanel(CanvasPanel):
         self.dress_bone_ctrl.Enable(enable)
 
     def on_frame_change(self, event: wx.Event) -> None:
+        self.request_preview()
         self.Enable(False)
         self.frame.fit_model_motion(self.model_material_ctrl.alphas.get(__("ボーンライン"), 0.5))
         self.frame.fit_dress_motion(self.dress_material_ctrl.alphas.get(__("ボーンライン"), 0.5))
         self.Enable(True)
 
     def on_change_morph(self, target_bone_name: Optional[str] = None) -> None:
-        self.change_motion(False, target_bone_name)
+        self.request_change(False, target_bone_name)
 
     def on_change(self, target_bone_name: Optional[str] = None, is_clear: bool = False) -> None:
-        self.change_motion(True, target_bone_name)
+        self.request_change(True, target_bone_name)
+
+    def request_change(self, is_bone_deform: bool, target_bone_name: Optional[str] = None, type_name: Optional[str] = None) -> None:
+        """
+        変更要求を溜めておき、一定間隔で最新の状態だけを反映する
+        type_name: 変更があった側（人物 or 衣装）。未指定の場合は両方
+        """
+        is_model_change = type_name in (None, "人物")
+        is_dress_change = type_name in (None, "衣装")
+
+        if self.pending_change:
+            # 溜まっている要求でボーン変形が必要な場合、ボーン変形ありで反映する
+            is_bone_deform = is_bone_deform or self.pending_change[0]
+            is_model_change = is_model_change or self.pending_change[2]
+            is_dress_change = is_dress_change or self.pending_change[3]
+        self.pending_change = (is_bone_deform, target_bone_name, is_model_change, is_dress_change)
+
+        if is_dress_change:
+            self.request_preview()
+
+        if not self.change_timer.IsRunning():
+            self.change_timer.StartOnce(CHANGE_INTERVAL_MS)
+
+    def request_preview(self) -> None:
+        """操作中は間引きメッシュで表示し、操作が止まったら元のメッシュに戻す"""
+        if self.canvas.playing:
+            # 再生中は描画モデルを入れ替えない
+            return
+
+        self.frame.start_preview()
+        # 操作が続いている間は戻すタイマーを延長する
+        self.preview_timer.StartOnce(PREVIEW_IDLE_MS)
+
+    def on_preview_timer(self, event: wx.Event) -> None:
+        if self.pending_change or self.is_deforming:
+            # 反映待ちの変更がある場合、反映後に戻す
+            self.preview_timer.StartOnce(PREVIEW_IDLE_MS)
+            return
+
+        self.Enable(False)
+        self.frame.end_preview()
+        self.Enable(True)
+
+    def on_change_timer(self, event: wx.Event) -> None:
+        if not self.pending_change or self.is_deforming:
+            # 変形中の場合、変形が終わってから最新の要求を反映する
+            return
+
+        # 反映中に来た要求は次のタイマーでまとめて反映する
+        is_bone_deform, target_bone_name, is_model_change, is_dress_change = self.pending_change
+        self.pending_change = None
+
+        self.Enable(False)
+        self.change_motion(is_bone_deform, target_bone_name, is_model_change, is_dress_change)
+        self.Enable(True)
 
     def show_bone_weight(self, is_show_bone_weight: bool) -> None:
         # 人物側も薄くする
@@ -204,11 +285,31 @@ class ConfigPanel(CanvasPanel):
     def change_bone(self, selected_bone_indexes: list[int]) -> None:
         self.frame.change_bone(selected_bone_indexes)
 
-    def change_motion(self, is_bone_deform: bool, target_bone_name: Optional[str] = None) -> None:
-        self.frame.set_model_motion_morphs(self.model_material_ctrl.alphas, self.model_morph_ctrl.ratios)
-        self.frame.fit_model_motion(self.model_material_ctrl.alphas.get(__("ボーンライン"), 0.5), is_bone_deform)
-
-        self.frame.set_dress_motion_morphs(
+    def change_motion(
+        self, is_bone_deform: bool, target_bone_name: Optional[str] = None, is_model_change: bool = True, is_dress_change: bool = True
+    ) -> None:
+        deform_sets: list[tuple[int, VmdMotion]] = []
+
+        if is_model_change:
+            model_bone_alpha = self.model_material_ctrl.alphas.get(__("ボーンライン"), 0.5)
+            is_changed = self.frame.set_model_motion_morphs(self.model_material_ctrl.alphas, self.model_morph_ctrl.ratios)
+            # ボーン変形を伴わず、適用済みのモーフから変わっていない場合、変形し直さない
+            if is_deform_required(is_bone_deform, is_changed, model_bone_alpha, self.canvas.model_sets[0].bone_alpha):
+                if is_bone_deform:
+                    self.canvas.model_sets[0].bone_alpha = model_bone_alpha
+                    deform_sets.append((0, self.frame.model_motion))
+                else:
+                    self.frame.fit_model_motion(model_bone_alpha, is_bone_deform)
+
+        if is_dress_change:
+            self.change_dress_motion(is_bone_deform, deform_sets)
+
+        if deform_sets:
+            self.start_deform(deform_sets)
+
+    def change_dress_motion(self, is_bone_deform: bool, deform_sets: list[tuple[int, VmdMotion]]) -> None:
+        dress_bone_alpha = self.dress_material_ctrl.alphas.get(__("ボーンライン"), 0.5)
+        is_changed = self.frame.set_dress_motion_morphs(
             self.dress_material_ctrl.alphas,
             self.dress_morph_ctrl.ratios,
             self.dress_bone_ctrl.scales,
@@ -218,7 +319,51 @@ class ConfigPanel(CanvasPanel):
         # self.frame.clear_refit()
         # if target_bone_name:
         #     self.frame.refit(target_bone_name)
-        self.frame.fit_dress_motion(self.dress_material_ctrl.alphas.get(__("ボーンライン"), 0.5), is_bone_deform)
+        if is_deform_required(is_bone_deform, is_changed, dress_bone_alpha, self.canvas.model_sets[1].bone_alpha):
+            if is_bone_deform:
+                self.canvas.model_sets[1].bone_alpha = dress_bone_alpha
+                deform_sets.append((1, self.frame.dress_motion))
+            else:
+                self.frame.fit_dress_motion(dress_bone_alpha, is_bone_deform)
+
+    def start_deform(self, deform_sets: list[tuple[int, VmdMotion]]) -> None:
+        """ボーン変形を別スレッドで行い、終わったら画面側で描画に反映する"""
+        self.is_deforming = True
+        deform_models: list[tuple[int, PmxModel, VmdMotion]] = []
+        for model_index, motion in deform_sets:
+            self.canvas.model_sets[model_index].motion = motion
+            deform_models.append((model_index, self.canvas.model_sets[model_index].model, motion))
+
+        Thread(target=self.deform, args=(deform_models, self.fno), daemon=True).start()
+
+    def deform(self, deform_models: list[tuple[int, PmxModel, VmdMotion]], fno: int) -> None:
+        """ボーン変形（別スレッド。描画には触らない）"""
+        animations: list[tuple[int, PmxModel, VmdMotion, MotionSet]] = []
+        try:
+            for model_index, model, motion in deform_models:
+                animations.append((model_index, model, motion, MotionSet(model, motion, fno)))
+        finally:
+            wx.CallAfter(self.on_deformed, animations)
+
+    def on_deformed(self, animations: list[tuple[int, PmxModel, VmdMotion, MotionSet]]) -> None:
+        self.is_deforming = False
+
+        for model_index, model, motion, animation in animations:
+            if (
+                len(self.canvas.model_sets) <= model_index
+                or self.canvas.model_sets[model_index].model is not model
+                or self.canvas.model_sets[model_index].motion is not motion
+            ):
+                # 変形中に表示モデルやモーションが入れ替わった場合、入れ替え後に変形し直しているので捨てる
+                continue
+            animation.selected_bone_indexes = self.canvas.animations[model_index].selected_bone_indexes
+            animation.is_show_bone_weight = self.canvas.animations[model_index].is_show_bone_weight
+            self.canvas.animations[model_index] = animation
+        self.canvas.Refresh()
+
+        if self.pending_change and not self.change_timer.IsRunning():
+            # 変形中に溜まった要求のうち、最新の状態だけを反映する
+            self.change_timer.StartOnce(CHANGE_INTERVAL_MS)
 
     def show_only_material(self, type_name: str, material_name: str) -> None:
         model_material_alphas: dict[str, float] = {}
@@ -244,8 +389,8 @@ class ConfigPanel(CanvasPanel):
 
         self.frame.set_dress_motion_morphs(
             dress_material_alphas,
-            self.dress_bone_ctrl.scales,
-            self.dress_bone_ctrl.degrees,
-            self.dress_bone_ctrl.positions,
+            bone_scales=self.dress_bone_ctrl.scales,
+            bone_degrees=self.dress_bone_ctrl.degrees,
+            bone_positions=self.dress_bone_ctrl.positions,
         )
         self.frame.fit_dress_motion(self.dress_material_ctrl.alphas.get(__("ボーンライン"), 0.5), False)
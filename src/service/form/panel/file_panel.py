@@ -8,8 +8,11 @@ from mlib.service.form.notebook_frame import NotebookFrame
 from mlib.service.form.notebook_panel import NotebookPanel
 from mlib.service.form.widgets.console_ctrl import ConsoleCtrl
 from mlib.service.form.widgets.exec_btn_ctrl import ExecButton
+from mlib.pmx.pmx_reader import PmxReader
 from mlib.service.form.widgets.file_ctrl import MPmxFilePickerCtrl, MVmdFilePickerCtrl
 from mlib.utils.file_utils import separate_path
+from mlib.vmd.vmd_reader import VmdReader
+from service.worker.prefetch_reader import PrefetchReader
 
 logger = MLogger(os.path.basename(__file__))
 __ = logger.get_text
@@ -19,6 +22,12 @@ class FilePanel(NotebookPanel):
     def __init__(self, frame: NotebookFrame, tab_idx: int, *args, **kw) -> None:
         super().__init__(frame, tab_idx, *args, **kw)
 
+        # ファイルパスが指定された時点で裏で読み込んでおく（子プロセスで読み込む場合は子プロセスで読み直すので先読みしない）
+        is_prefetch = not self.frame.process_logger_config
+        self.model_reader = PrefetchReader(PmxReader, is_prefetch)
+        self.dress_reader = PrefetchReader(PmxReader, is_prefetch)
+        self.motion_reader = PrefetchReader(VmdReader, is_prefetch)
+
         self._initialize_ui()
 
     def _initialize_ui(self) -> None:
@@ -103,6 +112,9 @@ class FilePanel(NotebookPanel):
         if self.model_ctrl.read_name():
             self.model_ctrl.read_digest()
             self.create_output_path()
+            self.model_reader.prefetch(self.model_ctrl.path)
+        else:
+            self.model_reader.clear()
         self.exec_btn_ctrl.Enable(False)
 
     def on_change_dress_pmx(self, event: wx.Event) -> None:
@@ -110,12 +122,18 @@ class FilePanel(NotebookPanel):
         if self.dress_ctrl.read_name():
             self.dress_ctrl.read_digest()
             self.create_output_path()
+            self.dress_reader.prefetch(self.dress_ctrl.path)
+        else:
+            self.dress_reader.clear()
         self.exec_btn_ctrl.Enable(False)
 
     def on_change_motion(self, event: wx.Event) -> None:
         self.motion_ctrl.unwrap()
         if self.motion_ctrl.read_name():
             self.motion_ctrl.read_digest()
+            self.motion_reader.prefetch(self.motion_ctrl.path)
+        else:
+            self.motion_reader.clear()
 
     def create_output_path(self) -> None:
         if self.model_ctrl.valid() and self.dress_ctrl.valid():
@@ -422,11 +422,10 @@ class BoneCtrlSet:
         self.positions[morph_name].z = self.position_z_slider.GetValue()
         self.bone_target_dress[morph_name] = self.bone_target_dress_check_ctrl.GetValue()
 
-        self.parent.Enable(False)
-        self.parent.on_change(morph_name)
+        # 変形は最新の状態だけ反映する(衣装側のみ)
+        self.parent.request_change(True, morph_name, "衣装")
         # ボーンハイライトを変更
         self.parent.change_bone(self.individual_target_bone_indexes[self.bone_choice_ctrl.GetSelection()])
-        self.parent.Enable(True)
 
     def on_show_bone_weight(self, event: wx.Event) -> None:
         self.parent.Enable(False)
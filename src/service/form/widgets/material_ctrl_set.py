@@ -286,9 +286,7 @@ class MaterialCtrlSet:
         material_name = self.material_choice_ctrl.GetStringSelection()
         self.alphas[material_name] = float(alpha)
 
-        self.parent.Enable(False)
-        self.parent.on_change_morph()
-        self.parent.Enable(True)
+        self.parent.request_change(False, type_name=self.type_name)
 
     def on_change_material_only(self, event: wx.Event) -> None:
         material_name = self.material_choice_ctrl.GetStringSelection()
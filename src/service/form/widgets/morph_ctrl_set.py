@@ -127,10 +127,8 @@ class MorphCtrlSet:
         morph_name = self.morph_choice_ctrl.GetStringSelection()
         self.ratios[morph_name] = float(ratio)
 
-        self.parent.Enable(False)
         # ボーンモーフが絡む可能性があるので、ボーン変形ありで動かす
-        self.parent.on_change()
-        self.parent.Enable(True)
+        self.parent.request_change(True, type_name=self.type_name)
 
     def on_change_morph_half(self, event: wx.Event) -> None:
         self.slider.SetValue(0.5)
@@ -0,0 +1,99 @@
+from typing import Iterable, Optional
+
+import numpy as np
+
+from mlib.pmx.pmx_collection import PmxModel
+
+
+class BoneStatistic:
+    """ボーン別頂点統計"""
+
+    def __init__(self, bone_index: int, vertex_indexes: list[int], positions: np.ndarray, weights: np.ndarray) -> None:
+        """
+        bone_index: ボーンINDEX
+        vertex_indexes: ボーンにウェイトが乗っている頂点INDEXリスト
+        positions: 頂点の初期位置 (N, 3)
+        weights: 頂点ごとのボーンのウェイト (N,)
+        """
+        self.bone_index = bone_index
+        self.vertex_indexes = vertex_indexes
+        self.positions = positions
+        self.weights = weights
+        self.count = len(vertex_indexes)
+
+        if self.count:
+            self.min_position: np.ndarray = np.min(positions, axis=0)
+            self.max_position: np.ndarray = np.max(positions, axis=0)
+            self.centroid: np.ndarray = np.mean(positions, axis=0)
+            self.weighted_centroid: np.ndarray = (
+                np.average(positions, axis=0, weights=weights) if 0 < np.sum(weights) else self.centroid.copy()
+            )
+        else:
+            self.min_position = np.zeros(3)
+            self.max_position = np.zeros(3)
+            self.centroid = np.zeros(3)
+            self.weighted_centroid = np.zeros(3)
+
+
+class BoneStatistics:
+    """
+    モデルのボーン別頂点統計（AABB、重心、頂点数、ウェイト付き重心）
+    初回参照時に計算して保持し、ウェイトが変わったボーンだけ破棄して計算し直す
+    """
+
+    def __init__(self, model: PmxModel) -> None:
+        self.model = model
+        self.data: dict[int, BoneStatistic] = {}
+
+    def __getitem__(self, bone_index: int) -> BoneStatistic:
+        if bone_index not in self.data:
+            self.data[bone_index] = self.calc(bone_index)
+        return self.data[bone_index]
+
+    def calc(self, bone_index: int) -> BoneStatistic:
+        vertex_indexes = sorted(set(self.model.vertices_by_bones.get(bone_index, [])))
+        if not vertex_indexes:
+            return BoneStatistic(bone_index, [], np.zeros((0, 3)), np.zeros(0))
+
+        positions = np.array([self.model.vertices[vertex_index].position.vector for vertex_index in vertex_indexes])
+        weights = np.array(
+            [
+                np.sum(self.model.vertices[vertex_index].deform.weights[self.model.vertices[vertex_index].deform.indexes == bone_index])
+                for vertex_index in vertex_indexes
+            ]
+        )
+
+        return BoneStatistic(bone_index, vertex_indexes, positions, weights)
+
+    def update(self, bone_indexes: Optional[Iterable[int]] = None) -> None:
+        """ウェイトが変わったボーンの統計を破棄する（未指定の場合は全ボーン）"""
+        if bone_indexes is None:
+            self.data.clear()
+            return
+
+        for bone_index in bone_indexes:
+            if bone_index in self.data:
+                del self.data[bone_index]
+
+    def get_bounds(self, bone_indexes: Iterable[int]) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """指定ボーン群の頂点全体のAABB（頂点が無い場合はNone）"""
+        statistics = [self[bone_index] for bone_index in bone_indexes if self[bone_index].count]
+        if not statistics:
+            return None
+
+        return (
+            np.min([statistic.min_position for statistic in statistics], axis=0),
+            np.max([statistic.max_position for statistic in statistics], axis=0),
+        )
+
+    def get_positions(self, bone_indexes: Iterable[int]) -> np.ndarray:
+        """指定ボーン群の頂点位置を連結したもの（複数ボーンに乗っている頂点はボーンの数だけ含む）"""
+        statistics = [self[bone_index] for bone_index in bone_indexes if self[bone_index].count]
+        if not statistics:
+            return np.zeros((0, 3))
+
+        return np.concatenate([statistic.positions for statistic in statistics])
+
+    def get_vertex_indexes(self, bone_indexes: Iterable[int]) -> set[int]:
+        """指定ボーン群にウェイトが乗っている頂点INDEX"""
+        return set([vertex_index for bone_index in bone_indexes for vertex_index in self[bone_index].vertex_indexes])
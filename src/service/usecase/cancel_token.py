@@ -0,0 +1,33 @@
+import os
+from threading import Event
+
+from mlib.core.exception import MApplicationException
+from mlib.core.logger import MLogger
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+class CancelToken:
+    """
+    読み込みや出力などの長い処理の中断要求
+    UI側から cancel を呼び、処理側は段階の区切りや大きなループの中で check を呼んで中断する
+    """
+
+    def __init__(self) -> None:
+        self.event = Event()
+
+    def cancel(self) -> None:
+        self.event.set()
+
+    def reset(self) -> None:
+        self.event.clear()
+
+    @property
+    def is_canceled(self) -> bool:
+        return self.event.is_set()
+
+    def check(self) -> None:
+        """中断要求があった場合、例外を投げて処理を抜ける"""
+        if self.is_canceled:
+            raise MApplicationException("処理を中断しました")
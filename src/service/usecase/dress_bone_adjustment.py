@@ -0,0 +1,133 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+from mlib.core.logger import MLogger
+from mlib.core.math import MQuaternion, MVector3D
+from mlib.pmx.pmx_collection import PmxModel
+from mlib.pmx.pmx_part import BoneMorphOffset
+from service.usecase.dress_bone_setting import DRESS_BONE_ADJUST_NAME
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+class DressBoneAdjustment:
+    """個別調整1軸分のボーン別単位変形量（回転は1軸1度分）"""
+
+    def __init__(self, offset: BoneMorphOffset) -> None:
+        self.bone_index = offset.bone_index
+        self.position: np.ndarray = offset.position.vector.copy()
+        self.degrees: np.ndarray = offset.rotation.qq.to_euler_degrees().vector.copy()
+        self.scale: np.ndarray = offset.scale.vector.copy()
+        self.local_degrees: np.ndarray = offset.local_rotation.qq.to_euler_degrees().vector.copy()
+        self.local_scale: np.ndarray = offset.local_scale.vector.copy()
+
+
+class DressBoneAdjustments:
+    """
+    衣装個別調整のボーン別変形テーブル
+    調整:{名前}:{軸} の9モーフ分の単位変形量を保持しておき、調整値からボーン別の変形量を求めて
+    ひとつのボーンモーフ（BoneAdjust）にまとめる。9モーフ自体は出力用にそのまま残しておく
+    """
+
+    def __init__(self, dress: PmxModel, morph_names: list[str]) -> None:
+        self.dress = dress
+        self.units: dict[str, dict[str, list[DressBoneAdjustment]]] = {}
+        # 最後に反映した調整値
+        self.values: dict[str, tuple[float, ...]] = {}
+        # 調整名別のボーン別変形量（[移動, 縮尺, ローカル縮尺], 回転, ローカル回転）
+        self.deforms: dict[str, dict[int, tuple[np.ndarray, MQuaternion, MQuaternion]]] = {}
+
+        for morph_name in morph_names:
+            self.units[morph_name] = {}
+            for axis_name in ("SX", "SY", "SZ", "RX", "RY", "RZ", "MX", "MY", "MZ"):
+                adjust_morph_name = f"調整:{morph_name}:{axis_name}"
+                if adjust_morph_name not in dress.morphs:
+                    continue
+                self.units[morph_name][axis_name] = [DressBoneAdjustment(offset) for offset in dress.morphs[adjust_morph_name].offsets]
+
+        # 読み込み済みの衣装を使い回す場合もあるので、前回の調整を消しておく
+        if DRESS_BONE_ADJUST_NAME in dress.morphs:
+            dress.morphs[DRESS_BONE_ADJUST_NAME].offsets = []
+
+    def update(
+        self,
+        bone_scales: dict[str, MVector3D],
+        bone_degrees: dict[str, MVector3D],
+        bone_positions: dict[str, MVector3D],
+    ) -> bool:
+        """調整値からボーン別の変形量を求め、まとめたボーンモーフのオフセットを作り直す。変更が無かった場合はFalse"""
+        if DRESS_BONE_ADJUST_NAME not in self.dress.morphs:
+            return False
+
+        # 調整値はスライダー側で直接書き換えられるので、値をコピーして比較する
+        values = dict(
+            [
+                (morph_name, (*scale.vector, *degree.vector, *position.vector))
+                for morph_name, scale, degree, position in zip(
+                    bone_scales.keys(), bone_scales.values(), bone_degrees.values(), bone_positions.values()
+                )
+                if morph_name in self.units
+            ]
+        )
+        if values == self.values:
+            return False
+
+        # 調整値が変わった調整名の変形量だけ計算し直す
+        for morph_name in set(values.keys()) | set(self.values.keys()):
+            if values.get(morph_name) == self.values.get(morph_name):
+                continue
+            self.deforms[morph_name] = self.calc_deforms(morph_name, values.get(morph_name))
+        self.values = values
+
+        # 移動・縮尺は足し合わせ、回転は個別モーフを順番に掛けた時と同じ順で掛け合わせる
+        deforms: dict[int, tuple[np.ndarray, MQuaternion, MQuaternion]] = {}
+        for morph_name in self.units.keys():
+            for bone_index, (values_deform, qq, local_qq) in self.deforms.get(morph_name, {}).items():
+                if bone_index not in deforms:
+                    deforms[bone_index] = (np.zeros((3, 3)), MQuaternion(), MQuaternion())
+                total_values_deform, total_qq, total_local_qq = deforms[bone_index]
+                deforms[bone_index] = (total_values_deform + values_deform, total_qq * qq, total_local_qq * local_qq)
+
+        self.dress.morphs[DRESS_BONE_ADJUST_NAME].offsets = [
+            BoneMorphOffset(
+                bone_index,
+                position=MVector3D(*values_deform[0]),
+                qq=qq,
+                scale=MVector3D(*values_deform[1]),
+                local_qq=local_qq,
+                local_scale=MVector3D(*values_deform[2]),
+            )
+            for bone_index, (values_deform, qq, local_qq) in deforms.items()
+        ]
+
+        logger.debug(f"個別調整テーブル更新 [{len(deforms)}]")
+
+        return True
+
+    def calc_deforms(self, morph_name: str, value: Optional[tuple[float, ...]]) -> dict[int, tuple[np.ndarray, MQuaternion, MQuaternion]]:
+        """調整名1つ分のボーン別変形量（[移動, 縮尺, ローカル縮尺], 回転, ローカル回転）"""
+        deforms: dict[int, tuple[np.ndarray, MQuaternion, MQuaternion]] = {}
+        if not value:
+            return deforms
+
+        for ratio, axis_name, origin in zip(value, ("SX", "SY", "SZ", "RX", "RY", "RZ", "MX", "MY", "MZ"), (1, 1, 1, 0, 0, 0, 0, 0, 0)):
+            value_ratio = ratio - origin
+            if not value_ratio or axis_name not in self.units[morph_name]:
+                continue
+
+            for unit in self.units[morph_name][axis_name]:
+                if unit.bone_index not in deforms:
+                    deforms[unit.bone_index] = (np.zeros((3, 3)), MQuaternion(), MQuaternion())
+                values_deform, qq, local_qq = deforms[unit.bone_index]
+
+                # 回転は1軸1度単位のモーフ値なので、その軸の角度を調整値倍した回転を掛け合わせる（軸をまたいで角度を足すと結果が変わる）
+                deforms[unit.bone_index] = (
+                    values_deform + np.array([unit.position, unit.scale, unit.local_scale]) * value_ratio,
+                    qq * MQuaternion.from_euler_degrees(*(unit.degrees * value_ratio)),
+                    local_qq * MQuaternion.from_euler_degrees(*(unit.local_degrees * value_ratio)),
+                )
+
+        return deforms
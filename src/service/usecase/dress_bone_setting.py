@@ -641,6 +641,9 @@ DRESS_BONE_FITTING_NAME = "BoneFitting"
 DRESS_VERTEX_FITTING_NAME = "VertexFitting"
 """衣装フィッティング用ボーン"""
 
+DRESS_BONE_ADJUST_NAME = "BoneAdjust"
+"""衣装個別調整用ボーンモーフ名（調整値が変わるたびにオフセットを作り直す）"""
+
 DRESS_STANDARD_BONE_NAMES: dict[str, DressBoneSetting] = dict([(bs.value.name, bs.value) for bs in DressBoneSettings])
 """衣装用準標準ボーン名前とEnumのキーの辞書"""
 
@@ -0,0 +1,116 @@
+import csv
+import os
+from time import perf_counter
+from typing import Any, Optional
+
+from mlib.core.logger import MLogger
+from mlib.core.math import MQuaternion
+from mlib.pmx.pmx_part import Bone
+from service.usecase.stage_timer import SUMMARY_COUNT
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+# 出力する列（ベクトル値は x,y,z の3列に分ける）
+FITTING_TRACE_COLUMNS = (
+    "attempt",
+    "phase",
+    "bone_index",
+    "bone_name",
+    "branch",
+    "length_branch",
+    "length_scale",
+    "position_x",
+    "position_y",
+    "position_z",
+    "rotation_x",
+    "rotation_y",
+    "rotation_z",
+    "scale_x",
+    "scale_y",
+    "scale_z",
+    "local_scale_x",
+    "local_scale_y",
+    "local_scale_z",
+    "vertex_count",
+    "elapsed",
+)
+
+
+class FittingTrace:
+    """
+    ボーンフィッティングの記録（ボーンごとに、通った分岐・求めた移動/回転/縮尺・参照した頂点数・処理時間）
+    有効にした時だけ記録し、列ごとに揃えたCSVで出力する
+    """
+
+    def __init__(self, is_enabled: bool = False) -> None:
+        self.is_enabled = is_enabled
+        # 左右非対称でやり直した回数
+        self.attempt = 0
+        self.rows: list[dict[str, Any]] = []
+        self.row: Optional[dict[str, Any]] = None
+        self.start_time = 0.0
+
+    def start(self, phase: str, bone: Bone) -> None:
+        """ボーンの記録を始める（記録中のボーンがあれば終わらせる）"""
+        if not self.is_enabled:
+            return
+
+        self.end()
+        self.row = {"attempt": self.attempt, "phase": phase, "bone_index": bone.index, "bone_name": bone.name}
+        self.start_time = perf_counter()
+
+    def set(self, **values: Any) -> None:
+        """
+        記録中のボーンに値を設定する
+        ベクトルは x,y,z の列に、クォータニオンはオイラー角(度)にして設定する（後で元の値が変わっても影響しないようにその場で展開する）
+        None の値は設定しない
+        """
+        if not (self.is_enabled and self.row is not None):
+            return
+
+        for key, value in values.items():
+            if value is None:
+                continue
+            if isinstance(value, MQuaternion):
+                value = value.to_euler_degrees()
+            if hasattr(value, "vector"):
+                self.row[f"{key}_x"], self.row[f"{key}_y"], self.row[f"{key}_z"] = (float(v) for v in value.vector)
+            else:
+                self.row[key] = value
+
+    def end(self) -> None:
+        """記録中のボーンを終わらせる"""
+        if not (self.is_enabled and self.row is not None):
+            return
+
+        self.row["elapsed"] = perf_counter() - self.start_time
+        self.rows.append(self.row)
+        self.row = None
+
+    def save(self, output_path: str) -> None:
+        self.end()
+
+        with open(output_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FITTING_TRACE_COLUMNS, restval="")
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+    def output_summary(self, count: int = SUMMARY_COUNT) -> None:
+        """処理時間の長いボーンをコンソールに出力する（段階をまたいで合計する）"""
+        self.end()
+
+        bone_elapsed_times: dict[str, float] = {}
+        for row in self.rows:
+            bone_elapsed_times[row["bone_name"]] = bone_elapsed_times.get(row["bone_name"], 0.0) + row["elapsed"]
+        if not bone_elapsed_times:
+            return
+
+        summary = sorted(bone_elapsed_times.items(), key=lambda item: item[1], reverse=True)[:count]
+        logger.info(
+            "ボーンフィッティング時間の内訳（上位{c}件）\n{s}",
+            c=len(summary),
+            s="\n".join([f"  {elapsed:8.3f}s {bone_name}" for bone_name, elapsed in summary]),
+            decoration=MLogger.Decoration.LINE,
+        )
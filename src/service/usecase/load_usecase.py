@@ -1,4 +1,5 @@
 import os
+from typing import Iterable, Optional
 
 import numpy as np
 
@@ -7,7 +8,6 @@ from mlib.core.math import (
     MMatrix4x4,
     MQuaternion,
     MVector3D,
-    MVector4D,
     MVectorDict,
     calc_local_positions,
     align_triangle,
@@ -19,27 +19,68 @@ from mlib.pmx.pmx_part import (
     Bdef2,
     Bone,
     BoneMorphOffset,
-    MaterialMorphCalcMode,
-    MaterialMorphOffset,
     Morph,
     MorphType,
 )
 from mlib.vmd.vmd_collection import VmdMotion
 from mlib.vmd.vmd_part import VmdMorphFrame
 from mlib.vmd.vmd_tree import VmdBoneFrameTrees
+from service.usecase.bone_statistics import BoneStatistics
+from service.usecase.cancel_token import CancelToken
 from service.usecase.dress_bone_setting import (
+    DRESS_BONE_ADJUST_NAME,
     DRESS_STANDARD_BONE_NAMES,
     DRESS_BONE_FITTING_NAME,
     DRESS_VERTEX_FITTING_NAME,
     DressBoneSetting,
     FIT_INDIVIDUAL_MORPH_NAMES,
 )
+from service.usecase.fitting_trace import FittingTrace
+from service.usecase.material_transparent import MATERIAL_TRANSPARENT_NAME
+from service.usecase.progress import Progress
+from service.usecase.stage_timer import StageTimer
 
 logger = MLogger(os.path.basename(__file__), level=1)
 __ = logger.get_text
 
 
 class LoadUsecase:
+    def __init__(self, cancel_token: Optional[CancelToken] = None) -> None:
+        # モデルごとのボーン別頂点統計（キー: モデルのパスとハッシュ）
+        self.bone_statistics: dict[tuple[str, str], BoneStatistics] = {}
+        # 中断要求
+        self.cancel_token = cancel_token or CancelToken()
+        # 段階ごとの処理時間
+        self.timer = StageTimer()
+        # ループ中の進捗
+        self.progress = Progress()
+        # ボーンフィッティングの記録（有効にした時だけ記録する）
+        self.trace = FittingTrace()
+        # 左右対称なボーンは片側だけフィッティングして、もう片側は反転した値を使う
+        self.is_symmetric_fitting = False
+
+    def get_bone_statistics(self, model: PmxModel) -> BoneStatistics:
+        """ボーン別頂点統計を取得する（モデルごとに初回だけ生成）"""
+        key = (model.path, model.digest)
+        if key not in self.bone_statistics or self.bone_statistics[key].model is not model:
+            # 同じファイルを読み直したモデルの場合も、前のモデルの統計は使わない
+            self.bone_statistics[key] = BoneStatistics(model)
+        return self.bone_statistics[key]
+
+    def update_bone_statistics(self, model: PmxModel, bone_names: Optional[Iterable[str]] = None) -> None:
+        """ウェイトが変わったボーンの頂点統計を破棄する（未指定の場合は全ボーン）"""
+        key = (model.path, model.digest)
+        if key not in self.bone_statistics or self.bone_statistics[key].model is not model:
+            return
+        if bone_names is None:
+            self.bone_statistics[key].update()
+        else:
+            self.bone_statistics[key].update([model.bones[bone_name].index for bone_name in bone_names if bone_name in model.bones])
+
+    def clear_bone_statistics(self) -> None:
+        """新しくモデルを読み込む時に、前のモデルの統計を捨てる"""
+        self.bone_statistics.clear()
+
     def valid_model(self, model: PmxModel, type_name: str) -> None:
         """フィッティングに最低限必要なボーンで不足しているボーンリストを取得する"""
         pass
@@ -182,6 +223,7 @@ class LoadUsecase:
             logger.info("人物: 再セットアップ")
 
         model.update_vertices_by_bone()
+        self.update_bone_statistics(model)
 
         model_inserted_bust_bone_names = []
         for bone_name in ("左胸", "右胸"):
@@ -196,6 +238,7 @@ class LoadUsecase:
             logger.info("人物: 再セットアップ")
 
             model.update_vertices_by_bone()
+            self.update_bone_statistics(model)
 
         # ------------------------------------------------------
         logger.info("衣装: 初期姿勢計算")
@@ -218,6 +261,7 @@ class LoadUsecase:
             logger.info("衣装: 再セットアップ")
 
         dress.update_vertices_by_bone()
+        self.update_bone_statistics(dress)
 
         # dress_inserted_bust_bone_names = []
         # for bone_name in ("左胸", "右胸"):
@@ -330,34 +374,31 @@ class LoadUsecase:
         parent_bone = model.bones[model.bones["首根元"].parent_index]
         to_tail_y = model.bones["首根元"].position.y - parent_bone.position.y
         model.separate_weights(parent_bone.name, "首根元", "首", 0.3, 0.0, (parent_bone.name,), to_tail_pos=MVector3D(0, to_tail_y, 0))
+        self.update_bone_statistics(model, (parent_bone.name, "首根元"))
 
     def insert_bust(self, model: PmxModel, bust_bone_name: str) -> bool:
         """胸ボーンの追加"""
         # 上半身1, 2, 3 のウェイト位置取得
-        upper_vertices: list[int] = []
+        upper_bone_indexes: list[int] = []
         parent_upper_name: str = ""
         for upper_bone_name in ("上半身", "上半身2", "上半身3"):
             if upper_bone_name not in model.bones:
                 break
-            upper_vertices += model.vertices_by_bones.get(model.bones[upper_bone_name].index, [])
+            upper_bone_indexes.append(model.bones[upper_bone_name].index)
             parent_upper_name = upper_bone_name
 
-        if not parent_upper_name or not upper_vertices:
+        upper_positions = self.get_bone_statistics(model).get_positions(upper_bone_indexes)
+
+        if not parent_upper_name or not len(upper_positions):
             # 登録対象となりうる親ボーンが見つからなかった場合、スルー
             return False
 
-        upper_vertex_positions: list[np.ndarray] = []
-        for vertex_index in upper_vertices:
-            # 左右に分けて前方向の位置を取得
-            if (
-                ("左" in bust_bone_name and 0 > model.vertices[vertex_index].position.x)
-                or ("右" in bust_bone_name and 0 < model.vertices[vertex_index].position.x)
-                or 0 < model.vertices[vertex_index].position.z
-            ):
-                continue
-            upper_vertex_positions.append(model.vertices[vertex_index].position.vector)
+        # 左右に分けて前方向の位置を取得
+        upper_vertex_positions = upper_positions[
+            (upper_positions[:, 0] >= 0 if "左" in bust_bone_name else upper_positions[:, 0] <= 0) & (upper_positions[:, 2] <= 0)
+        ]
 
-        if not upper_vertex_positions:
+        if not len(upper_vertex_positions):
             # 登録対象となりうる親ボーンが見つからなかった場合、スルー
             return False
 
@@ -375,6 +416,9 @@ class LoadUsecase:
 
         model.insert_bone(bust_bone)
 
+        # ボーンINDEXがずれるので統計は全て破棄
+        self.update_bone_statistics(model)
+
         return True
 
     def replace_lower(self, model: PmxModel, dress: PmxModel) -> list[str]:
@@ -517,6 +561,8 @@ class LoadUsecase:
             dress.bones["左肩P"].position = dress.bones["左肩"].position.copy()
             replaced_bone_names.append("左肩P")
 
+        self.cancel_token.check()
+
         # 元ボーン-置換ボーン ベースで求めた時の腕の位置 ---------------
         # 肩は再計算した位置を使用する
 
@@ -644,6 +690,9 @@ class LoadUsecase:
         """
         衣装のボーン位置を人物ボーン位置に合わせて配置を変える
         """
+        # 置き換えはボーンごとに中断できるようにする
+        self.cancel_token.check()
+
         if not (model.bones.exists([from_name, to_name, replace_name]) and dress.bones.exists([from_name, to_name, replace_name])):
             # ボーンが足りなかったら追加しない
             return False, MVector3D()
@@ -675,49 +724,10 @@ class LoadUsecase:
         return True, dress_replace_diff_pos
 
     def create_material_transparent_morphs(self, model: PmxModel) -> None:
-        """材質OFFモーフ追加"""
-        for material in model.materials:
-            morph = Morph(name=f"{material.name}TR")
-            morph.is_system = True
-            morph.morph_type = MorphType.MATERIAL
-            offsets: list[MaterialMorphOffset] = [
-                MaterialMorphOffset(
-                    material.index,
-                    MaterialMorphCalcMode.ADDITION,
-                    MVector4D(0.0, 0.0, 0.0, -1.0),
-                    MVector3D(0.0, 0.0, 0.0),
-                    0.0,
-                    MVector3D(0.0, 0.0, 0.0),
-                    MVector4D(0.0, 0.0, 0.0, 0.0),
-                    0.0,
-                    MVector4D(0.0, 0.0, 0.0, 0.0),
-                    MVector4D(0.0, 0.0, 0.0, 0.0),
-                    MVector4D(0.0, 0.0, 0.0, 0.0),
-                )
-            ]
-            morph.offsets = offsets
-            model.morphs.append(morph)
-
-        # 全材質透明化
-        morph = Morph(name="全材質TR")
+        """材質透過モーフ追加（オフセットは非透過度の変更時に作り直す）"""
+        morph = Morph(name=MATERIAL_TRANSPARENT_NAME)
         morph.is_system = True
         morph.morph_type = MorphType.MATERIAL
-        offsets = [
-            MaterialMorphOffset(
-                -1,
-                MaterialMorphCalcMode.ADDITION,
-                MVector4D(0.0, 0.0, 0.0, -1.0),
-                MVector3D(0.0, 0.0, 0.0),
-                0.0,
-                MVector3D(0.0, 0.0, 0.0),
-                MVector4D(0.0, 0.0, 0.0, 0.0),
-                0.0,
-                MVector4D(0.0, 0.0, 0.0, 0.0),
-                MVector4D(0.0, 0.0, 0.0, 0.0),
-                MVector4D(0.0, 0.0, 0.0, 0.0),
-            )
-        ]
-        morph.offsets = offsets
         model.morphs.append(morph)
 
     def create_dress_individual_bone_morphs(self, dress: PmxModel) -> tuple[list[str], list[list[int]]]:
@@ -919,6 +929,12 @@ class LoadUsecase:
 
             individual_target_bone_indexes.append(target_bone_indexes)
 
+        # 個別調整をまとめて適用するボーンモーフ（オフセットは調整値から都度作り直す）
+        adjust_morph = Morph(name=DRESS_BONE_ADJUST_NAME)
+        adjust_morph.is_system = True
+        adjust_morph.morph_type = MorphType.BONE
+        dress.morphs.append(adjust_morph)
+
         return individual_morph_names, individual_target_bone_indexes
 
     def create_dress_fit_morphs(
@@ -929,8 +945,13 @@ class LoadUsecase:
         model_out_standard_positions: MVectorDict,
         dress_standard_positions: MVectorDict,
         dress_out_standard_positions: MVectorDict,
+        is_symmetric: bool = False,
     ):
-        """衣装フィッティング用ボーンモーフを作成"""
+        """
+        衣装フィッティング用ボーンモーフを作成
+        is_symmetric: 左右対称なボーンは片側だけフィッティングして、もう片側は反転した値を使う
+            （反転結果が人物に合わない場合は、反転したボーンとその子ボーンだけフィッティングし直す）
+        """
 
         # ルート調整用ボーンモーフ追加
         model_root_morph = Morph(name="Root:Adjust")
@@ -959,15 +980,17 @@ class LoadUsecase:
         model_matrixes = VmdMotion().animate_bone([0], model)
 
         logger.info("ボーンフィッティング", decoration=MLogger.Decoration.LINE)
-        dress_local_scales, dress_global_scales, dress_offset_positions, dress_offset_qqs = self.fit_dress_bone_morph(
-            model,
-            dress,
-            model_matrixes,
-            model_standard_positions,
-            model_out_standard_positions,
-            dress_standard_positions,
-            dress_out_standard_positions,
-        )
+        with self.timer.stage("fit_dress_bone_morph"):
+            dress_local_scales, dress_global_scales, dress_offset_positions, dress_offset_qqs = self.fit_dress_bone_morph(
+                model,
+                dress,
+                model_matrixes,
+                model_standard_positions,
+                model_out_standard_positions,
+                dress_standard_positions,
+                dress_out_standard_positions,
+                is_symmetric,
+            )
 
         dress_part_offset_positions: dict[str, list[np.ndarray]] = {}
         dress_part_offset_degrees: dict[str, list[np.ndarray]] = {}
@@ -979,6 +1002,8 @@ class LoadUsecase:
         dress_fixed_offset_positions: dict[str, MVector3D] = {}
         dress_fixed_offset_qqs: dict[str, MQuaternion] = {}
 
+        self.cancel_token.check()
+
         # 一旦クリア
         dress.morphs[DRESS_BONE_FITTING_NAME].offsets = []
 
@@ -1019,6 +1044,8 @@ class LoadUsecase:
             ):
                 continue
 
+            self.trace.start("ボーンフィッティング設定", dress_bone)
+
             dress_local_scale = dress_local_scales.get(dress_bone.index, MVector3D())
             dress_global_scale = dress_global_scales.get(dress_bone.index, MVector3D())
             dress_offset_position = dress_offset_positions.get(dress_bone.index, MVector3D())
@@ -1051,6 +1078,10 @@ class LoadUsecase:
                 )
             )
 
+            self.trace.set(
+                position=dress_offset_position, rotation=dress_offset_qq, scale=dress_global_scale, local_scale=dress_local_scale
+            )
+
             dress_fixed_length_local_scales[dress_bone.index] = MVector3D(dress_local_scale.x, 0, 0)
             dress_fixed_depth_local_scales[dress_bone.index] = MVector3D(0, dress_local_scale.y, dress_local_scale.z)
             dress_fixed_offset_positions[dress_bone.index] = dress_offset_position
@@ -1065,6 +1096,8 @@ class LoadUsecase:
                 l=dress_local_scale + MVector3D(1, 1, 1),
             )
 
+        self.trace.end()
+
     def get_bone_positions(self, model: PmxModel) -> tuple[MVectorDict, MVectorDict]:
         # 準標準のボーン位置
         standard_positions = MVectorDict()
@@ -1084,41 +1117,60 @@ class LoadUsecase:
         model_matrixes: VmdBoneFrameTrees,
         model_standard_positions: MVectorDict,
         model_out_standard_positions: MVectorDict,
-        model_local_positions: dict[str, dict[str, np.ndarray]],
-        dress_standard_bone_name: str,
+        dress_standard_bone_names: Iterable[str],
     ) -> dict[str, dict[str, np.ndarray]]:
-        # 人物の頂点ローカル位置を計算
-        if dress_standard_bone_name in model.bones:
+        """人物の頂点ローカル位置をまとめて計算する"""
+        model_local_positions: dict[str, dict[str, np.ndarray]] = {}
+
+        # 準標準ボーン名ごとに、ほぼ同じ位置にある人物ボーンを収集する（同じボーン名は一度だけ）
+        model_target_bones: dict[str, list[Bone]] = {}
+        model_target_vertices: set[int] = set()
+        for dress_standard_bone_name in dress_standard_bone_names:
+            if dress_standard_bone_name in model_target_bones or dress_standard_bone_name not in model.bones:
+                continue
+
             model_standard_bone = model.bones[dress_standard_bone_name]
-            bone_setting = DRESS_STANDARD_BONE_NAMES[model_standard_bone.name]
-
-            for model_standard_bone_index in model_standard_positions.nearest_all_keys(model_standard_bone.position):
-                model_bone = model.bones[model_standard_bone_index]
-                if np.isclose(model_standard_bone.position.vector, model_bone.position.vector, atol=1e-2, rtol=1e-2).all():
-                    # ほぼ同じ位置にある準標準ボーンを全てローカル位置を取得
-                    model_vertices = set(model.vertices_by_bones.get(model_bone.index, []))
-                    if model_vertices:
-                        model_deformed_local_positions = self.get_deformed_local_positions(
-                            model, model_bone, bone_setting, model_vertices, model_matrixes
-                        )
-                        if bone_setting.category not in model_local_positions:
-                            model_local_positions[bone_setting.category] = {}
-
-                        model_local_positions[bone_setting.category][model_bone.name] = model_deformed_local_positions
-
-            for model_out_standard_bone_index in model_out_standard_positions.nearest_all_keys(model_standard_bone.position):
-                model_bone = model.bones[model_out_standard_bone_index]
-                if np.isclose(model_standard_bone.position.vector, model_bone.position.vector, atol=1e-2, rtol=1e-2).all():
-                    # ほぼ同じ位置にある準標準外ボーンがあれば、それも含めて調べる
-                    model_vertices = set(model.vertices_by_bones.get(model_bone.index, []))
-                    if model_vertices:
-                        model_deformed_local_positions = self.get_deformed_local_positions(
-                            model, model_bone, bone_setting, model_vertices, model_matrixes
-                        )
-                        if bone_setting.category not in model_local_positions:
-                            model_local_positions[bone_setting.category] = {}
+            model_target_bones[dress_standard_bone_name] = []
 
-                        model_local_positions[bone_setting.category][model_bone.name] = model_deformed_local_positions
+            for model_bone_index in list(model_standard_positions.nearest_all_keys(model_standard_bone.position)) + list(
+                model_out_standard_positions.nearest_all_keys(model_standard_bone.position)
+            ):
+                model_bone = model.bones[model_bone_index]
+                if (
+                    np.isclose(model_standard_bone.position.vector, model_bone.position.vector, atol=1e-2, rtol=1e-2).all()
+                    and model_bone.index in model.vertices_by_bones
+                ):
+                    # ほぼ同じ位置にある準標準ボーン・準標準外ボーンを全てローカル位置を取得
+                    model_target_bones[dress_standard_bone_name].append(model_bone)
+                    model_target_vertices |= set(model.vertices_by_bones[model_bone.index])
+
+        if not model_target_vertices:
+            return model_local_positions
+
+        # 対象頂点を一括で変形する
+        model_vertex_indexes = sorted(model_target_vertices)
+        model_vertex_map = dict([(vertex_index, i) for i, vertex_index in enumerate(model_vertex_indexes)])
+        model_deformed_positions = self.get_deformed_positions(model, model_vertex_indexes, model_matrixes)
+
+        # 人物ボーン名別のローカル位置（フィッティング中は同じボーンを再計算しない）
+        model_bone_local_positions: dict[str, np.ndarray] = {}
+
+        for dress_standard_bone_name, model_bones in model_target_bones.items():
+            bone_setting = DRESS_STANDARD_BONE_NAMES[dress_standard_bone_name]
+
+            for model_bone in model_bones:
+                if model_bone.name not in model_bone_local_positions:
+                    model_bone_vertex_indexes = [
+                        model_vertex_map[vertex_index] for vertex_index in set(model.vertices_by_bones[model_bone.index])
+                    ]
+                    model_bone_local_positions[model_bone.name] = self.get_local_positions(
+                        model_bone, model_deformed_positions[model_bone_vertex_indexes], model_matrixes
+                    )
+
+                if bone_setting.category not in model_local_positions:
+                    model_local_positions[bone_setting.category] = {}
+
+                model_local_positions[bone_setting.category][model_bone.name] = model_bone_local_positions[model_bone.name]
 
         return model_local_positions
 
@@ -1131,8 +1183,12 @@ class LoadUsecase:
         model_out_standard_positions: MVectorDict,
         dress_standard_positions: MVectorDict,
         dress_out_standard_positions: MVectorDict,
+        is_symmetric: bool = False,
     ) -> tuple[dict[int, MVector3D], dict[int, MVector3D], dict[int, MVector3D], dict[int, MQuaternion]]:
-        """衣装との距離比率を元に、X方向のローカルスケーリングを行う"""
+        """
+        衣装との距離比率を元に、X方向のローカルスケーリングを行う
+        is_symmetric: 左右対称なボーンは片側だけフィッティングして、もう片側は反転した値を使う
+        """
 
         # 衣装の初期姿勢を求める
         logger.info("衣装初期姿勢計算")
@@ -1147,23 +1203,23 @@ class LoadUsecase:
         dress_offset_positions: dict[int, MVector3D] = {}
         dress_offset_qqs: dict[int, MQuaternion] = {}
 
-        model_local_positions: dict[str, dict[str, np.ndarray]] = {}
         dress_local_positions: dict[str, dict[str, np.ndarray]] = {}
         dress_category_local_x_scales: dict[str, list[float]] = {}
+        # 人物の頂点ローカル位置を求める準標準ボーン名（順番を保持したまま重複を除く）
+        model_local_target_bone_names: dict[str, None] = {}
 
         logger.info("ボーン距離比率")
 
+        # 距離比率計算中はフィッティングモーフを更新しないので、衣装の初期姿勢は一度だけ求める
+        dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
+
+        self.progress.start("ボーン距離比率", dress_bone_count)
         for i, dress_bone in enumerate(dress.bones):
-            logger.count(
-                "ボーン距離比率",
-                index=i,
-                total_index_count=dress_bone_count,
-                display_block=10,
-            )
+            self.cancel_token.check()
+            self.progress.update(i)
+            self.trace.start("ボーン距離比率", dress_bone)
 
             if dress_bone.is_standard:
-                dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
-
                 bone_setting = DRESS_STANDARD_BONE_NAMES[dress_bone.name]
                 if (bone_setting.global_scalable or bone_setting.local_x_scalable) and dress_bone.name in model.bones:
                     # X方向のスケーリングがOKで、人物に同名ボーンがある場合、比率を測る
@@ -1175,6 +1231,7 @@ class LoadUsecase:
                         and f"{dress_bone.name[0]}足" in dress.bones
                     ):
                         # 足IKの比率は足ボーンから足IKボーンまでの直線距離とする
+                        self.trace.set(length_branch="leg_ik")
                         dress_fit_length_scale = (model_bone.position - model.bones[f"{dress_bone.name[0]}足"].position).length() / (
                             (dress_bone.position - dress.bones[f"{dress_bone.name[0]}足"].position).length() or 1
                         )
@@ -1184,45 +1241,19 @@ class LoadUsecase:
                         and f"{dress_bone.name[0]}足ＩＫ" in dress.bones
                     ):
                         # つま先IKの比率はグローバルZ方向だけ合わせる
+                        self.trace.set(length_branch="toe_ik")
                         dress_fit_length_scale = (model_bone.position - model.bones[f"{dress_bone.name[0]}足ＩＫ"].position).length() / (
                             (dress_bone.position - dress.bones[f"{dress_bone.name[0]}足ＩＫ"].position).length() or 1
                         )
                     elif bone_setting.category == "足首":
-                        dress_ankle_bone_names = [
-                            dress_setting.name
-                            for dress_setting in DRESS_STANDARD_BONE_NAMES.values()
-                            if dress_setting.category == "足首" and dress_setting.name[0] == dress_bone.name[0]
-                        ]
-                        dress_ankle_vertices = set(
-                            [
-                                vertex_index
-                                for bname in dress_ankle_bone_names
-                                if bname in dress.bones
-                                for vertex_index in dress.vertices_by_bones.get(dress.bones[bname].index, [])
-                            ]
-                        )
-                        model_ankle_vertices = set(
-                            [
-                                vertex_index
-                                for bname in dress_ankle_bone_names
-                                if bname in model.bones
-                                for vertex_index in model.vertices_by_bones.get(model.bones[bname].index, [])
-                            ]
-                        )
-                        if dress_ankle_vertices and model_ankle_vertices:
+                        ankle_length_scale = self.get_ankle_length_scale(model, dress, dress_bone.name[0])
+                        if ankle_length_scale is not None:
                             # 足のスケールは足底の長さで決める
-                            dress_ankle_vertex_positions = np.array([dress.vertices[vidx].position.vector for vidx in dress_ankle_vertices])
-                            dress_ankle_vertex_min_positions = np.min(dress_ankle_vertex_positions, axis=0)
-                            dress_ankle_vertex_max_positions = np.max(dress_ankle_vertex_positions, axis=0)
-                            model_ankle_vertex_positions = np.array([model.vertices[vidx].position.vector for vidx in model_ankle_vertices])
-                            model_ankle_vertex_min_positions = np.min(model_ankle_vertex_positions, axis=0)
-                            model_ankle_vertex_max_positions = np.max(model_ankle_vertex_positions, axis=0)
-                            dress_fit_length_scale = float(
-                                (model_ankle_vertex_max_positions[2] - model_ankle_vertex_min_positions[2])
-                                / (dress_ankle_vertex_max_positions[2] - dress_ankle_vertex_min_positions[2])
-                            )
+                            self.trace.set(length_branch="ankle_sole")
+                            dress_fit_length_scale = ankle_length_scale
                         elif f"{dress_bone.name[0]}つま先ＩＫ" in model.bones and f"{dress_bone.name[0]}つま先ＩＫ" in dress.bones:
                             # つま先ＩＫがある場合、そこまでの長さ
+                            self.trace.set(length_branch="ankle_toe_ik")
                             dress_fit_length_scale = (
                                 model_bone.position - model.bones[model.bones[f"{dress_bone.name[0]}つま先ＩＫ"].ik.bone_index].position
                             ).length() / (
@@ -1232,9 +1263,11 @@ class LoadUsecase:
                                 or 1
                             )
                         else:
+                            self.trace.set(length_branch="ankle_default")
                             dress_fit_length_scale = 1.0
                     elif dress_bone.name in ("首根元", "首") and "上半身2" in dress.bones:
                         # 首根元は上半身2のスケールを流用する
+                        self.trace.set(length_branch="neck")
                         dress_fit_length_scale = (dress_local_scales[dress.bones["上半身2"].index].x / 0.98) + 1
                     # elif dress_bone.name == "上半身2" and "上半身3" not in dress.bones:
                     #     # 上半身2はウェイトを全体的に覆ってるので、肩までの高さとする
@@ -1246,6 +1279,7 @@ class LoadUsecase:
                     #         dress_fit_length_scale = 1.0
                     elif "手首" in dress_bone.name:
                         # 手首の比率は手首ボーンから各指１ボーンまでの直線距離の最小とする
+                        self.trace.set(length_branch="wrist")
                         finger_lengths: list[float] = []
                         for finger_name in ("親指０", "人指１", "中指１", "薬指１", "小指１"):
                             finger_bone_name = f"{dress_bone.name[0]}{finger_name}"
@@ -1266,6 +1300,7 @@ class LoadUsecase:
                         ]
 
                         if tail_far_bone_names and "指先" not in tail_far_bone_names[0]:
+                            self.trace.set(length_branch="tail")
                             model_bone_position = model_matrixes[0, dress_bone.name].position
                             model_tail_position = model_matrixes[0, tail_far_bone_names[0]].position
 
@@ -1277,6 +1312,7 @@ class LoadUsecase:
                             )
                         elif dress_bone.parent_index in dress_local_scales:
                             # 先がボーンが見つからない場合、親ボーンの比率と親ボーンとの長さ比から求め直す
+                            self.trace.set(length_branch="parent")
                             dress_parent_fit_length_scale = dress_local_scales[dress_bone.parent_index].x + 1
 
                             dress_fit_length_scale = (
@@ -1290,6 +1326,7 @@ class LoadUsecase:
 
                     # ちょっとだけ縮める
                     dress_fit_length_scale *= 0.98
+                    self.trace.set(length_scale=float(dress_fit_length_scale))
 
                     if bone_setting.category not in dress_category_local_x_scales:
                         dress_category_local_x_scales[bone_setting.category] = []
@@ -1303,10 +1340,12 @@ class LoadUsecase:
                         dress_local_scales[dress_bone.index] = MVector3D(dress_fit_length_scale - 1, 0, 0)
 
                     logger.debug(f"ボーン距離比率 [{dress_bone.name}][{dress_fit_length_scale:.3f}]")
+                    self.trace.set(scale=dress_global_scales.get(dress_bone.index), local_scale=dress_local_scales.get(dress_bone.index))
 
                 if bone_setting.local_scalable:
                     # 衣装の頂点ローカル位置を計算
                     dress_vertices = set(dress.vertices_by_bones.get(dress_bone.index, []))
+                    self.trace.set(vertex_count=len(dress_vertices))
                     if dress_vertices:
                         dress_deformed_local_positions = self.get_deformed_local_positions(
                             dress, dress_bone, bone_setting, dress_vertices, dress_matrixes
@@ -1320,15 +1359,8 @@ class LoadUsecase:
 
                             logger.debug(f"ボーン厚み比率 [{dress_bone.name}({bone_setting.category})][{dress_deformed_local_positions[0]}]")
 
-                    # 人物の頂点ローカル位置を計算
-                    model_local_positions = self.get_model_local_positions(
-                        model,
-                        model_matrixes,
-                        model_standard_positions,
-                        model_out_standard_positions,
-                        model_local_positions,
-                        dress_bone.name,
-                    )
+                    # 人物の頂点ローカル位置の計算対象
+                    model_local_target_bone_names[dress_bone.name] = None
             else:
                 # 該当ボーンが準標準では無い場合
                 if (
@@ -1341,10 +1373,9 @@ class LoadUsecase:
                     bone_setting = DRESS_STANDARD_BONE_NAMES[dress_parent_bone.name]
 
                     if bone_setting.local_scalable:
-                        dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
-
                         # 衣装の頂点ローカル位置を計算
                         dress_vertices = set(dress.vertices_by_bones.get(dress_bone.index, []))
+                        self.trace.set(vertex_count=len(dress_vertices))
                         if dress_vertices:
                             dress_deformed_local_positions = self.get_deformed_local_positions(
                                 dress, dress_bone, bone_setting, dress_vertices, dress_matrixes
@@ -1358,15 +1389,8 @@ class LoadUsecase:
 
                                 logger.debug(f"ボーン厚み比率 [{dress_bone.name}({bone_setting.category})][{dress_deformed_local_positions[0]}]")
 
-                        # 人物の頂点ローカル位置を計算
-                        model_local_positions = self.get_model_local_positions(
-                            model,
-                            model_matrixes,
-                            model_standard_positions,
-                            model_out_standard_positions,
-                            model_local_positions,
-                            dress_parent_bone.name,
-                        )
+                        # 人物の頂点ローカル位置の計算対象
+                        model_local_target_bone_names[dress_parent_bone.name] = None
                 else:
                     out_standard_dress_position = dress_out_standard_positions[dress_bone.index]
 
@@ -1382,10 +1406,9 @@ class LoadUsecase:
                             bone_setting = DRESS_STANDARD_BONE_NAMES[nearest_dress_bone.name]
 
                             if bone_setting.local_scalable:
-                                dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
-
                                 # 衣装の頂点ローカル位置を計算
                                 dress_vertices = set(dress.vertices_by_bones.get(dress_bone.index, []))
+                                self.trace.set(vertex_count=len(dress_vertices))
                                 if dress_vertices:
                                     dress_deformed_local_positions = self.get_deformed_local_positions(
                                         dress, dress_bone, bone_setting, dress_vertices, dress_matrixes
@@ -1402,15 +1425,20 @@ class LoadUsecase:
                                             + f"[{dress_deformed_local_positions[0]}]"
                                         )
 
-                                # 人物の頂点ローカル位置を計算
-                                model_local_positions = self.get_model_local_positions(
-                                    model,
-                                    model_matrixes,
-                                    model_standard_positions,
-                                    model_out_standard_positions,
-                                    model_local_positions,
-                                    nearest_dress_bone.name,
-                                )
+                                # 人物の頂点ローカル位置の計算対象
+                                model_local_target_bone_names[nearest_dress_bone.name] = None
+
+        self.progress.finish()
+        self.trace.end()
+
+        # 人物の頂点ローカル位置を一括で計算
+        model_local_positions = self.get_model_local_positions(
+            model,
+            model_matrixes,
+            model_standard_positions,
+            model_out_standard_positions,
+            model_local_target_bone_names.keys(),
+        )
 
         # # dress_category_global_scales: dict[str, MVector3D] = {}
         dress_category_local_scales: dict[str, MVector3D] = {}
@@ -1468,6 +1496,9 @@ class LoadUsecase:
                     if dress_bone.index in dress_offset_positions or not model_matrixes.exists(0, bone_name):
                         continue
 
+                    self.trace.start("ボーンフィッティング", dress_bone)
+                    self.trace.set(branch="toe_ik_tree")
+
                     dress_matrixes = dress_motion.animate_bone([0], dress, [tail_bone_name], append_ik=False)
 
                     dress_bone_fit_position = model_matrixes[0, bone_name].position
@@ -1485,6 +1516,7 @@ class LoadUsecase:
                         )
                     )
                     dress_offset_positions[dress_bone.index] = dress_offset_position
+                    self.trace.set(position=dress_offset_position)
 
                     logger.debug(
                         f"-- -- 移動オフセット[{dress_bone.name}][{dress_offset_position}]"
@@ -1504,647 +1536,727 @@ class LoadUsecase:
                             )
                         )
 
-        # 変形順序に合わせて、フィッティングを行う
-        for i, dress_bone_index in enumerate(dress.bones.bone_link_indexes):
-            logger.count(
-                "ボーンフィッティング",
-                index=i,
-                total_index_count=dress_bone_count,
-                display_block=10,
-            )
+        self.trace.end()
 
-            dress_bone = dress.bones[dress_bone_index]
-            bone_name = dress_bone.name
+        # 左右対称のボーンペア
+        dress_mirror_bone_indexes = self.get_mirror_bone_indexes(model, dress) if is_symmetric else {}
+        # フィッティングループで処理済みのボーン
+        dress_fitted_bone_indexes: set[int] = set()
+        # 反転して求めたボーン（反転先: 反転元）
+        dress_mirrored_bone_indexes: dict[int, int] = {}
 
-            if dress_bone.index in dress_offset_positions or dress_bone.index in dress_offset_qqs:
-                # 既に計算済みの場合、スルー
-                continue
+        # フィッティングループに入る前の値（左右非対称でやり直すボーンを元に戻すために取っておく）
+        dress_fit_offset_count = len(dress.morphs[DRESS_BONE_FITTING_NAME].offsets)
+        dress_initial_values = [
+            dict([(bone_index, value.copy()) for bone_index, value in values.items()])
+            for values in (dress_local_scales, dress_global_scales, dress_offset_positions, dress_offset_qqs)
+        ]
 
-            # 自分までのボーンツリーの中で準標準である最後のボーン
-            parent_standard_bones = [
-                b for b in dress.bone_trees[bone_name].get_standard() if b.name in model.bones and b.index != dress_bone.index
-            ]
+        # 変形順序に合わせて、フィッティングを行う
+        dress_fit_bone_indexes = list(dress.bones.bone_link_indexes)
+        while True:
+            self.progress.start("ボーンフィッティング", len(dress_fit_bone_indexes))
+            for i, dress_bone_index in enumerate(dress_fit_bone_indexes):
+                self.cancel_token.check()
+                self.progress.update(i)
+
+                dress_bone = dress.bones[dress_bone_index]
+                bone_name = dress_bone.name
+
+                if dress_bone.index in dress_offset_positions or dress_bone.index in dress_offset_qqs:
+                    # 既に計算済みの場合、スルー
+                    continue
 
-            if not parent_standard_bones:
-                # 準標準にまったく紐付いてない場合スルー
-                continue
+                dress_fitted_bone_indexes.add(dress_bone.index)
+                self.trace.start("ボーンフィッティング", dress_bone)
 
-            dress_parent_standard_bone = parent_standard_bones[-1]
-            dress_parent_bone_setting = DRESS_STANDARD_BONE_NAMES[dress_parent_standard_bone.name]
-
-            # dress_bone_parent_scale = MVector3D()
-
-            # 準標準の子ボーン名
-            standard_child_names = [b.name for b in dress.bone_trees.get_standard_children(dress_bone.name) if b.name in model.bones]
-
-            # if not dress_bone.is_standard and not standard_child_names:
-            #     # 準標準では無く、子どもに準標準がいない場合、親のスケールをそのまま流用
-            #     dress_local_thick_scale_value = dress_category_local_scales.get(dress_parent_bone_setting.category, 0.0)
-
-            #     # ローカルスケール自体はひとまとめにしたもの
-            #     dress_local_scale = dress_local_scales.get(dress_bone.index, MVector3D())
-            #     dress_local_scale.y = dress_local_thick_scale_value
-            #     dress_local_scale.z = dress_local_thick_scale_value
-            #     dress_local_scales[dress_bone.index] = dress_local_scale
-
-            #     # ローカルスケールYZだけ付与（ローカルXは距離比率時に与えている）
-            #     dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
-            #         BoneMorphOffset(
-            #             dress_bone.index,
-            #             local_scale=MVector3D(0, dress_local_thick_scale_value, dress_local_thick_scale_value),
-            #         )
-            #     )
-
-            if dress_bone.is_standard and bone_name in dress.bones and bone_name in model.bones:
-                # 現在の衣装ボーン位置を求める
-                dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
-
-                # 準標準かつ人物・衣装の両方にボーンがある場合、準標準フィッティング
-                bone_setting = DRESS_STANDARD_BONE_NAMES[bone_name]
-                model_bone = model.bones[bone_name]
-
-                tail_far_bone_names = [
-                    tail_bone_name
-                    for tail_bone_name in bone_setting.tails
-                    if tail_bone_name in dress.bones
-                    and tail_bone_name in model.bones
-                    and 0.0001 < dress.bones[tail_bone_name].position.distance(dress_bone.position)
+                if dress_mirror_bone_indexes.get(dress_bone.index, -1) in dress_fitted_bone_indexes:
+                    # 反対側のボーンが計算済みの場合、その結果を反転して使う
+                    self.mirror_fitting_offsets(
+                        dress,
+                        dress_mirror_bone_indexes[dress_bone.index],
+                        dress_bone.index,
+                        dress_fit_offset_count,
+                        dress_local_scales,
+                        dress_global_scales,
+                        dress_offset_positions,
+                        dress_offset_qqs,
+                    )
+                    dress_mirrored_bone_indexes[dress_bone.index] = dress_mirror_bone_indexes[dress_bone.index]
+                    self.trace.set(
+                        branch="mirror",
+                        position=dress_offset_positions.get(dress_bone.index),
+                        rotation=dress_offset_qqs.get(dress_bone.index),
+                        scale=dress_global_scales.get(dress_bone.index),
+                        local_scale=dress_local_scales.get(dress_bone.index),
+                    )
+                    continue
+
+                # 自分までのボーンツリーの中で準標準である最後のボーン
+                parent_standard_bones = [
+                    b for b in dress.bone_trees[bone_name].get_standard() if b.name in model.bones and b.index != dress_bone.index
                 ]
 
-                # parent_far_bone_names = [
-                #     parent_bone_name
-                #     for parent_bone_name in bone_setting.parents
-                #     if parent_bone_name in dress.bones
-                #     and parent_bone_name in model.bones
-                #     and 0.0001 < dress.bones[parent_bone_name].position.distance(dress_bone.position)
-                # ]
-
-                if bone_setting.translatable:
-                    # 移動計算 ------------------
-
-                    if "ひざ" in bone_name:
-                        leg_bone_name = f"{bone_name[0]}足"
-                        leg_ik_bone_name = f"{bone_name[0]}足ＩＫ"
-
-                        model_leg_position = model_matrixes[0, leg_bone_name].position
-                        model_knee_position = model_matrixes[0, bone_name].position
-                        model_ankle_position = model_matrixes[0, leg_ik_bone_name].position
-
-                        dress_leg_position = dress_matrixes[0, leg_bone_name].position
-                        dress_knee_position = dress_matrixes[0, bone_name].position
-                        dress_leg_ik_position = dress_matrixes[0, leg_ik_bone_name].position
-
-                        knee_new_position = align_triangle(
-                            model_leg_position,
-                            model_ankle_position,
-                            model_knee_position,
-                            dress_leg_position,
-                            dress_leg_ik_position,
-                        )
+                if not parent_standard_bones:
+                    # 準標準にまったく紐付いてない場合スルー
+                    self.trace.set(branch="no_standard")
+                    continue
 
-                        # # XY位置は人物側のひざ位置に合わせる
-                        # knee_new_position.y = model.bones[bone_name].position.y
-
-                        # # Z位置は少し手前に出す
-                        # knee_new_position.z -= dress_leg_position.distance(dress_leg_ik_position) * 0.03
-
-                        dress_bone_fit_position = knee_new_position
-                        dress_bone_position = dress_knee_position
-                    elif "足首" in bone_name:
-                        leg_ik_bone_name = f"{bone_name[0]}足ＩＫ"
-
-                        dress_bone_fit_position = dress_matrixes[0, leg_ik_bone_name].position
-                        dress_bone_position = dress_matrixes[0, bone_name].position
-                    elif "足先EX" in bone_name:
-                        leg_ik_bone_name = f"{bone_name[0]}足ＩＫ"
-                        toe_ik_bone_name = f"{bone_name[0]}つま先ＩＫ"
-
-                        dress_leg_ik_position = dress_matrixes[0, leg_ik_bone_name].position
-                        dress_toe_ik_position = dress_matrixes[0, toe_ik_bone_name].position
-                        dress_bone_position = dress_matrixes[0, bone_name].position
-
-                        dress_bone_fit_position = align_triangle(
-                            dress.bones[leg_ik_bone_name].position,
-                            dress.bones[toe_ik_bone_name].position,
-                            dress.bones[bone_name].position,
-                            dress_leg_ik_position,
-                            dress_toe_ik_position,
-                        )
+                dress_parent_standard_bone = parent_standard_bones[-1]
+                dress_parent_bone_setting = DRESS_STANDARD_BONE_NAMES[dress_parent_standard_bone.name]
 
-                    elif "つま先" in bone_name and f"{bone_name[0]}つま先ＩＫ" in dress.bones:
-                        toe_ik_bone_name = f"{bone_name[0]}つま先ＩＫ"
-
-                        dress_bone_fit_position = dress_matrixes[0, toe_ik_bone_name].position
-                        dress_bone_position = dress_matrixes[0, bone_name].position
-                    elif bone_name in ("右肩", "左肩") and f"{bone_name[0]}肩P" in dress.bones:
-                        dress_bone_fit_position = dress_matrixes[0, f"{bone_name}P"].position
-                        dress_bone_position = dress_matrixes[0, bone_name].position
-                    elif bone_name in ("右腕", "左腕") and f"{bone_name[0]}肩C" in dress.bones:
-                        dress_bone_fit_position = dress_matrixes[0, f"{bone_name[0]}肩C"].position
-                        dress_bone_position = dress_matrixes[0, bone_name].position
-                    # elif parent_far_bone_names and tail_far_bone_names:
-                    #     tail_bone_name = tail_far_bone_names[0]
-                    #     parent_bone_name = parent_far_bone_names[0]
-
-                    #     model_tail_position = model_matrixes[0, tail_bone_name].position
-                    #     model_target_position = model_matrixes[0, bone_name].position
-                    #     model_parent_position = model_matrixes[0, parent_bone_name].position
-
-                    #     dress_bone_position = dress_matrixes[0, bone_name].position
-                    #     dress_parent_position = dress_matrixes[0, parent_bone_name].position
-
-                    #     dress_bone_fit_position = align_triangle(
-                    #         model_tail_position,
-                    #         model_parent_position,
-                    #         model_target_position,
-                    #         model_tail_position,
-                    #         dress_parent_position,
-                    #     )
-                    else:
-                        dress_bone_fit_position = model_matrixes[0, bone_name].position
-                        dress_bone_position = dress_matrixes[0, bone_name].position
-                        # dress_bone_fit_position = (
-                        #     dress_matrixes[0, bone_name].global_matrix.inverse() * model_matrixes[0, bone_name].position
-                        # )
-                        # dress_bone_position = MVector3D()
+                # dress_bone_parent_scale = MVector3D()
 
-                    dress_offset_position = dress_bone_fit_position - dress_bone_position
+                # 準標準の子ボーン名
+                standard_child_names = [b.name for b in dress.bone_trees.get_standard_children(dress_bone.name) if b.name in model.bones]
 
-                    if bone_setting.category == "体幹":
-                        # 体幹の移動Xは動かさない
-                        dress_offset_position.x = 0.0
+                # if not dress_bone.is_standard and not standard_child_names:
+                #     # 準標準では無く、子どもに準標準がいない場合、親のスケールをそのまま流用
+                #     dress_local_thick_scale_value = dress_category_local_scales.get(dress_parent_bone_setting.category, 0.0)
 
-                    dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
-                        BoneMorphOffset(
-                            dress_bone.index,
-                            position=dress_offset_position,
-                        )
-                    )
-                    dress_offset_positions[dress_bone.index] = dress_offset_position
+                #     # ローカルスケール自体はひとまとめにしたもの
+                #     dress_local_scale = dress_local_scales.get(dress_bone.index, MVector3D())
+                #     dress_local_scale.y = dress_local_thick_scale_value
+                #     dress_local_scale.z = dress_local_thick_scale_value
+                #     dress_local_scales[dress_bone.index] = dress_local_scale
 
-                    logger.debug(
-                        f"-- -- 移動オフセット[{dress_bone.name}][{dress_offset_position}]"
-                        + f"[fit={dress_bone_fit_position}][dress={dress_bone_position}]"
-                    )
+                #     # ローカルスケールYZだけ付与（ローカルXは距離比率時に与えている）
+                #     dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
+                #         BoneMorphOffset(
+                #             dress_bone.index,
+                #             local_scale=MVector3D(0, dress_local_thick_scale_value, dress_local_thick_scale_value),
+                #         )
+                #     )
 
-                if bone_setting.rotatable:
-                    # 回転計算 ------------------
-                    # if bone_name in ("右腕", "左腕") and f"{bone_name[0]}手首" in dress.bones and f"{bone_name[0]}手首" in model.bones:
-                    #     # 腕だけは手首を参照する（直線角度を測る）
-                    #     tail_far_bone_names = [f"{bone_name[0]}手首"]
+                if dress_bone.is_standard and bone_name in dress.bones and bone_name in model.bones:
+                    # 現在の衣装ボーン位置を求める
+                    dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
 
-                    dress_offset_qq = MQuaternion()
+                    # 準標準かつ人物・衣装の両方にボーンがある場合、準標準フィッティング
+                    self.trace.set(branch="standard")
+                    bone_setting = DRESS_STANDARD_BONE_NAMES[bone_name]
+                    model_bone = model.bones[bone_name]
+
+                    tail_far_bone_names = [
+                        tail_bone_name
+                        for tail_bone_name in bone_setting.tails
+                        if tail_bone_name in dress.bones
+                        and tail_bone_name in model.bones
+                        and 0.0001 < dress.bones[tail_bone_name].position.distance(dress_bone.position)
+                    ]
 
-                    # モデルのボーンの向きに衣装を合わせる
-                    if bone_setting.rotate_cancel:
-                        # キャンセルする場合は自分より親を逆回転させる
-                        for tree_bone_index in reversed(dress.bone_trees[bone_name].indexes[:-1]):
-                            dress_offset_qq *= dress_offset_qqs.get(tree_bone_index, MQuaternion()).inverse()
-                    else:
-                        # キャンセルしない場合、角度差を補正する
-                        dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
+                    # parent_far_bone_names = [
+                    #     parent_bone_name
+                    #     for parent_bone_name in bone_setting.parents
+                    #     if parent_bone_name in dress.bones
+                    #     and parent_bone_name in model.bones
+                    #     and 0.0001 < dress.bones[parent_bone_name].position.distance(dress_bone.position)
+                    # ]
+
+                    if bone_setting.translatable:
+                        # 移動計算 ------------------
+
+                        if "ひざ" in bone_name:
+                            self.trace.set(branch="knee")
+                            leg_bone_name = f"{bone_name[0]}足"
+                            leg_ik_bone_name = f"{bone_name[0]}足ＩＫ"
+
+                            model_leg_position = model_matrixes[0, leg_bone_name].position
+                            model_knee_position = model_matrixes[0, bone_name].position
+                            model_ankle_position = model_matrixes[0, leg_ik_bone_name].position
+
+                            dress_leg_position = dress_matrixes[0, leg_bone_name].position
+                            dress_knee_position = dress_matrixes[0, bone_name].position
+                            dress_leg_ik_position = dress_matrixes[0, leg_ik_bone_name].position
+
+                            knee_new_position = align_triangle(
+                                model_leg_position,
+                                model_ankle_position,
+                                model_knee_position,
+                                dress_leg_position,
+                                dress_leg_ik_position,
+                            )
 
-                        model_bone_position = model_matrixes[0, bone_name].position
-                        dress_bone_position = dress_matrixes[0, bone_name].position
+                            # # XY位置は人物側のひざ位置に合わせる
+                            # knee_new_position.y = model.bones[bone_name].position.y
 
-                        if tail_far_bone_names:
-                            dress_tail_offset_qqs: list[MQuaternion] = []
+                            # # Z位置は少し手前に出す
+                            # knee_new_position.z -= dress_leg_position.distance(dress_leg_ik_position) * 0.03
 
-                            for i, tail_bone_name in enumerate(tail_far_bone_names):
-                                model_tail_vector = model_matrixes[0, tail_bone_name].position - model_bone_position
-                                dress_tail_vector = dress_matrixes[0, tail_bone_name].position - dress_bone_position
+                            dress_bone_fit_position = knee_new_position
+                            dress_bone_position = dress_knee_position
+                        elif "足首" in bone_name:
+                            self.trace.set(branch="ankle")
+                            leg_ik_bone_name = f"{bone_name[0]}足ＩＫ"
 
-                                if 0 < model_tail_vector.length() and 0 < dress_tail_vector.length():
-                                    # 衣装：自分の方向
-                                    dress_slope_qq = dress_tail_vector.to_local_matrix4x4().to_quaternion()
+                            dress_bone_fit_position = dress_matrixes[0, leg_ik_bone_name].position
+                            dress_bone_position = dress_matrixes[0, bone_name].position
+                        elif "足先EX" in bone_name:
+                            self.trace.set(branch="toe_ex")
+                            leg_ik_bone_name = f"{bone_name[0]}足ＩＫ"
+                            toe_ik_bone_name = f"{bone_name[0]}つま先ＩＫ"
 
-                                    # 人物：自分の方向
-                                    model_slope_qq = model_tail_vector.to_local_matrix4x4().to_quaternion()
+                            dress_leg_ik_position = dress_matrixes[0, leg_ik_bone_name].position
+                            dress_toe_ik_position = dress_matrixes[0, toe_ik_bone_name].position
+                            dress_bone_position = dress_matrixes[0, bone_name].position
 
-                                    dress_offset_qq = model_slope_qq * dress_slope_qq.inverse()
+                            dress_bone_fit_position = align_triangle(
+                                dress.bones[leg_ik_bone_name].position,
+                                dress.bones[toe_ik_bone_name].position,
+                                dress.bones[bone_name].position,
+                                dress_leg_ik_position,
+                                dress_toe_ik_position,
+                            )
 
-                                    _, _, _, dress_offset_yz_qq = dress_offset_qq.separate_by_axis(dress_bone.local_axis)
+                        elif "つま先" in bone_name and f"{bone_name[0]}つま先ＩＫ" in dress.bones:
+                            self.trace.set(branch="toe")
+                            toe_ik_bone_name = f"{bone_name[0]}つま先ＩＫ"
+
+                            dress_bone_fit_position = dress_matrixes[0, toe_ik_bone_name].position
+                            dress_bone_position = dress_matrixes[0, bone_name].position
+                        elif bone_name in ("右肩", "左肩") and f"{bone_name[0]}肩P" in dress.bones:
+                            self.trace.set(branch="shoulder_p")
+                            dress_bone_fit_position = dress_matrixes[0, f"{bone_name}P"].position
+                            dress_bone_position = dress_matrixes[0, bone_name].position
+                        elif bone_name in ("右腕", "左腕") and f"{bone_name[0]}肩C" in dress.bones:
+                            self.trace.set(branch="arm_c")
+                            dress_bone_fit_position = dress_matrixes[0, f"{bone_name[0]}肩C"].position
+                            dress_bone_position = dress_matrixes[0, bone_name].position
+                        # elif parent_far_bone_names and tail_far_bone_names:
+                        #     tail_bone_name = tail_far_bone_names[0]
+                        #     parent_bone_name = parent_far_bone_names[0]
+
+                        #     model_tail_position = model_matrixes[0, tail_bone_name].position
+                        #     model_target_position = model_matrixes[0, bone_name].position
+                        #     model_parent_position = model_matrixes[0, parent_bone_name].position
 
-                                    if bone_setting.category == "体幹":
-                                        # 体幹は回転X以外は動かさない
-                                        dress_offset_yz_qq = MQuaternion.from_euler_degrees(dress_offset_yz_qq.to_euler_degrees().x, 0, 0)
+                        #     dress_bone_position = dress_matrixes[0, bone_name].position
+                        #     dress_parent_position = dress_matrixes[0, parent_bone_name].position
+
+                        #     dress_bone_fit_position = align_triangle(
+                        #         model_tail_position,
+                        #         model_parent_position,
+                        #         model_target_position,
+                        #         model_tail_position,
+                        #         dress_parent_position,
+                        #     )
+                        else:
+                            dress_bone_fit_position = model_matrixes[0, bone_name].position
+                            dress_bone_position = dress_matrixes[0, bone_name].position
+                            # dress_bone_fit_position = (
+                            #     dress_matrixes[0, bone_name].global_matrix.inverse() * model_matrixes[0, bone_name].position
+                            # )
+                            # dress_bone_position = MVector3D()
 
-                                    # X軸（捩り）成分を除去した値のみ保持
-                                    dress_tail_offset_qqs.append(dress_offset_yz_qq)
+                        dress_offset_position = dress_bone_fit_position - dress_bone_position
 
-                                    if "手首" not in bone_name:
-                                        # 手首以外は最初の一件だけで終了
-                                        break
+                        if bone_setting.category == "体幹":
+                            # 体幹の移動Xは動かさない
+                            dress_offset_position.x = 0.0
 
-                            if dress_tail_offset_qqs:
-                                dress_offset_qq = dress_tail_offset_qqs[0]
-                                for qq in dress_tail_offset_qqs[1:]:
-                                    dress_offset_qq = MQuaternion.slerp(dress_offset_qq, qq, 0.5)
+                        dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
+                            BoneMorphOffset(
+                                dress_bone.index,
+                                position=dress_offset_position,
+                            )
+                        )
+                        dress_offset_positions[dress_bone.index] = dress_offset_position
+                        self.trace.set(position=dress_offset_position)
 
-                        # if tail_far_bone_names:
-                        #     dress_bone_position = dress_matrixes[0, bone_name].position
+                        logger.debug(
+                            f"-- -- 移動オフセット[{dress_bone.name}][{dress_offset_position}]"
+                            + f"[fit={dress_bone_fit_position}][dress={dress_bone_position}]"
+                        )
 
-                        #     if "手首" in bone_name:
-                        #         dress_tail_offset_qqs: list[MQuaternion] = []
+                    if bone_setting.rotatable:
+                        # 回転計算 ------------------
+                        # if bone_name in ("右腕", "左腕") and f"{bone_name[0]}手首" in dress.bones and f"{bone_name[0]}手首" in model.bones:
+                        #     # 腕だけは手首を参照する（直線角度を測る）
+                        #     tail_far_bone_names = [f"{bone_name[0]}手首"]
 
-                        #         for tail_bone_name in tail_far_bone_names:
-                        #             model_tail_position = model_matrixes[0, tail_bone_name].position
-                        #             dress_tail_position = dress_matrixes[0, tail_bone_name].position
+                        dress_offset_qq = MQuaternion()
 
-                        #             model_tail_vector = model_tail_position - model_bone_position
-                        #             dress_tail_vector = dress_tail_position - dress_bone_position
+                        # モデルのボーンの向きに衣装を合わせる
+                        if bone_setting.rotate_cancel:
+                            # キャンセルする場合は自分より親を逆回転させる
+                            for tree_bone_index in reversed(dress.bone_trees[bone_name].indexes[:-1]):
+                                dress_offset_qq *= dress_offset_qqs.get(tree_bone_index, MQuaternion()).inverse()
+                        else:
+                            # キャンセルしない場合、角度差を補正する
+                            dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
 
-                        #             if 0 < model_tail_vector.length() and 0 < dress_tail_vector.length():
-                        #                 # 衣装：自分の方向
-                        #                 dress_slope_qq = (dress_tail_position - dress_bone_position).to_local_matrix4x4().to_quaternion()
+                            model_bone_position = model_matrixes[0, bone_name].position
+                            dress_bone_position = dress_matrixes[0, bone_name].position
 
-                        #                 # 人物：自分の方向
-                        #                 model_slope_qq = (model_tail_position - model_bone_position).to_local_matrix4x4().to_quaternion()
+                            if tail_far_bone_names:
+                                dress_tail_offset_qqs: list[MQuaternion] = []
 
-                        #                 dress_offset_qq = model_slope_qq * dress_slope_qq.inverse()
+                                for i, tail_bone_name in enumerate(tail_far_bone_names):
+                                    model_tail_vector = model_matrixes[0, tail_bone_name].position - model_bone_position
+                                    dress_tail_vector = dress_matrixes[0, tail_bone_name].position - dress_bone_position
 
-                        #                 dress_tail_offset_qqs.append(dress_offset_qq)
+                                    if 0 < model_tail_vector.length() and 0 < dress_tail_vector.length():
+                                        # 衣装：自分の方向
+                                        dress_slope_qq = dress_tail_vector.to_local_matrix4x4().to_quaternion()
 
-                        #         if dress_tail_offset_qqs:
-                        #             dress_offset_qq = dress_tail_offset_qqs[0]
-                        #             for qq in dress_tail_offset_qqs[1:]:
-                        #                 dress_offset_qq = MQuaternion.slerp(dress_offset_qq, qq, 0.5)
-                        #     else:
-                        #         model_tail_position = model_matrixes[0, tail_far_bone_names[0]].position
-                        #         dress_tail_position = dress_matrixes[0, tail_far_bone_names[0]].position
-                        # else:
-                        #     dress_bone_position = dress_matrixes[0, bone_name].position
-                        #     dress_tail_position = dress_matrixes[0, bone_name].global_matrix * dress_bone.tail_relative_position
+                                        # 人物：自分の方向
+                                        model_slope_qq = model_tail_vector.to_local_matrix4x4().to_quaternion()
 
-                        #     model_tail_position = model_matrixes[0, bone_name].global_matrix * model_bone.tail_relative_position
+                                        dress_offset_qq = model_slope_qq * dress_slope_qq.inverse()
 
-                        # model_tail_vector = model_tail_position - model_bone_position
-                        # dress_tail_vector = dress_tail_position - dress_bone_position
+                                        _, _, _, dress_offset_yz_qq = dress_offset_qq.separate_by_axis(dress_bone.local_axis)
 
-                        # if 0 < model_tail_vector.length() and 0 < dress_tail_vector.length():
-                        #     # 衣装：自分の方向
-                        #     dress_slope_qq = (dress_tail_position - dress_bone_position).to_local_matrix4x4().to_quaternion()
+                                        if bone_setting.category == "体幹":
+                                            # 体幹は回転X以外は動かさない
+                                            dress_offset_yz_qq = MQuaternion.from_euler_degrees(
+                                                dress_offset_yz_qq.to_euler_degrees().x, 0, 0
+                                            )
 
-                        #     # 人物：自分の方向
-                        #     model_slope_qq = (model_tail_position - model_bone_position).to_local_matrix4x4().to_quaternion()
+                                        # X軸（捩り）成分を除去した値のみ保持
+                                        dress_tail_offset_qqs.append(dress_offset_yz_qq)
 
-                        #     dress_offset_qq = model_slope_qq * dress_slope_qq.inverse()
+                                        if "手首" not in bone_name:
+                                            # 手首以外は最初の一件だけで終了
+                                            break
 
-                    dress_offset_qqs[dress_bone.index] = dress_offset_qq
+                                if dress_tail_offset_qqs:
+                                    dress_offset_qq = dress_tail_offset_qqs[0]
+                                    for qq in dress_tail_offset_qqs[1:]:
+                                        dress_offset_qq = MQuaternion.slerp(dress_offset_qq, qq, 0.5)
 
-                    dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
-                        BoneMorphOffset(
-                            dress_bone.index,
-                            qq=dress_offset_qq,
-                        )
-                    )
+                            # if tail_far_bone_names:
+                            #     dress_bone_position = dress_matrixes[0, bone_name].position
 
-                    logger.debug(f"-- -- 回転オフセット[{dress_bone.name}][{dress_offset_qq.to_euler_degrees()}]")
+                            #     if "手首" in bone_name:
+                            #         dress_tail_offset_qqs: list[MQuaternion] = []
 
-                if (bone_setting.global_scalable or bone_setting.local_x_scalable) and dress_bone.name in model.bones:
-                    # X方向のスケーリングがOKで、人物に同名ボーンがある場合、比率を測る
-                    dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
-                    model_bone = model.bones[dress_bone.name]
+                            #         for tail_bone_name in tail_far_bone_names:
+                            #             model_tail_position = model_matrixes[0, tail_bone_name].position
+                            #             dress_tail_position = dress_matrixes[0, tail_bone_name].position
 
-                    if (
-                        bone_setting.category == "足ＩＫ"
-                        and f"{dress_bone.name[0]}足" in model.bones
-                        and f"{dress_bone.name[0]}足" in dress.bones
-                    ):
-                        # 足IKの比率は足ボーンから足IKボーンまでの直線距離とする
-                        dress_fit_length_scale = (model_bone.position - model.bones[f"{dress_bone.name[0]}足"].position).length() / (
-                            (dress_bone.position - dress.bones[f"{dress_bone.name[0]}足"].position).length() or 1
-                        )
-                    elif (
-                        bone_setting.category == "つま先ＩＫ"
-                        and f"{dress_bone.name[0]}足ＩＫ" in model.bones
-                        and f"{dress_bone.name[0]}足ＩＫ" in dress.bones
-                    ):
-                        # つま先IKの比率はグローバルZ方向だけ合わせる
-                        dress_fit_length_scale = (model_bone.position - model.bones[f"{dress_bone.name[0]}足ＩＫ"].position).length() / (
-                            (dress_bone.position - dress.bones[f"{dress_bone.name[0]}足ＩＫ"].position).length() or 1
-                        )
-                    elif bone_setting.category == "足首":
-                        dress_ankle_bone_names = [
-                            dress_setting.name
-                            for dress_setting in DRESS_STANDARD_BONE_NAMES.values()
-                            if dress_setting.category == "足首" and dress_setting.name[0] == dress_bone.name[0]
-                        ]
-                        dress_ankle_vertices = set(
-                            [
-                                vertex_index
-                                for bname in dress_ankle_bone_names
-                                if bname in dress.bones
-                                for vertex_index in dress.vertices_by_bones.get(dress.bones[bname].index, [])
-                            ]
-                        )
-                        model_ankle_vertices = set(
-                            [
-                                vertex_index
-                                for bname in dress_ankle_bone_names
-                                if bname in model.bones
-                                for vertex_index in model.vertices_by_bones.get(model.bones[bname].index, [])
-                            ]
-                        )
-                        if dress_ankle_vertices and model_ankle_vertices:
-                            # 足のスケールは足底の長さで決める
-                            dress_ankle_vertex_positions = np.array([dress.vertices[vidx].position.vector for vidx in dress_ankle_vertices])
-                            dress_ankle_vertex_min_positions = np.min(dress_ankle_vertex_positions, axis=0)
-                            dress_ankle_vertex_max_positions = np.max(dress_ankle_vertex_positions, axis=0)
-                            model_ankle_vertex_positions = np.array([model.vertices[vidx].position.vector for vidx in model_ankle_vertices])
-                            model_ankle_vertex_min_positions = np.min(model_ankle_vertex_positions, axis=0)
-                            model_ankle_vertex_max_positions = np.max(model_ankle_vertex_positions, axis=0)
-                            dress_fit_length_scale = float(
-                                (model_ankle_vertex_max_positions[2] - model_ankle_vertex_min_positions[2])
-                                / (dress_ankle_vertex_max_positions[2] - dress_ankle_vertex_min_positions[2])
-                            )
-                        elif f"{dress_bone.name[0]}つま先ＩＫ" in model.bones and f"{dress_bone.name[0]}つま先ＩＫ" in dress.bones:
-                            # つま先ＩＫがある場合、そこまでの長さ
-                            dress_fit_length_scale = (
-                                model_bone.position - model.bones[model.bones[f"{dress_bone.name[0]}つま先ＩＫ"].ik.bone_index].position
-                            ).length() / (
-                                (
-                                    dress_bone.position - dress.bones[dress.bones[f"{dress_bone.name[0]}つま先ＩＫ"].ik.bone_index].position
-                                ).length()
-                                or 1
-                            )
-                        else:
-                            dress_fit_length_scale = 1.0
-                    elif dress_bone.name in ("首根元", "首") and "上半身2" in dress.bones:
-                        # 首根元は上半身2のスケールを流用する
-                        dress_fit_length_scale = (dress_local_scales[dress.bones["上半身2"].index].x / 0.98) + 1
-                    elif "手首" in dress_bone.name:
-                        # 手首の比率は手首ボーンから各指１ボーンまでの直線距離の最大とする
-                        finger_lengths: list[float] = []
-                        for finger_name in ("親指２", "人指３", "中指３", "薬指３", "小指３"):
-                            finger_bone_name = f"{dress_bone.name[0]}{finger_name}"
-                            if finger_bone_name in model.bones and finger_bone_name in dress.bones:
-                                finger_lengths.append(
-                                    (model_bone.position - model.bones[finger_bone_name].position).length()
-                                    / ((dress_bone.position - dress.bones[finger_bone_name].position).length() or 1)
-                                )
+                            #             model_tail_vector = model_tail_position - model_bone_position
+                            #             dress_tail_vector = dress_tail_position - dress_bone_position
 
-                        dress_fit_length_scale = 1.0 if not finger_lengths else np.max(finger_lengths)
-                    else:
-                        tail_far_bone_names = [
-                            tail_bone_name
-                            for tail_bone_name in bone_setting.tails
-                            if tail_bone_name in dress.bones
-                            and tail_bone_name in model.bones
-                            and 0.0001 < dress.bones[tail_bone_name].position.distance(dress_bone.position)
-                        ]
+                            #             if 0 < model_tail_vector.length() and 0 < dress_tail_vector.length():
+                            #                 # 衣装：自分の方向
+                            #                 dress_slope_qq = (dress_tail_position - dress_bone_position).to_local_matrix4x4().to_quaternion()
 
-                        if tail_far_bone_names and "指先" not in tail_far_bone_names[0]:
-                            model_bone_position = model_matrixes[0, dress_bone.name].position
-                            model_tail_position = model_matrixes[0, tail_far_bone_names[0]].position
+                            #                 # 人物：自分の方向
+                            #                 model_slope_qq = (model_tail_position - model_bone_position).to_local_matrix4x4().to_quaternion()
 
-                            dress_bone_position = dress_matrixes[0, dress_bone.name].position
-                            dress_tail_position = dress_matrixes[0, tail_far_bone_names[0]].position
+                            #                 dress_offset_qq = model_slope_qq * dress_slope_qq.inverse()
 
-                            dress_fit_length_scale = (model_tail_position - model_bone_position).length() / (
-                                (dress_tail_position - dress_bone_position).length() or 1
-                            )
-                        elif dress_bone.parent_index in dress_local_scales:
-                            # 先がボーンが見つからない場合、親ボーンの比率と親ボーンとの長さ比から求め直す
-                            dress_parent_fit_length_scale = dress_local_scales[dress_bone.parent_index].x + 1
+                            #                 dress_tail_offset_qqs.append(dress_offset_qq)
 
-                            dress_fit_length_scale = (
-                                dress_parent_fit_length_scale
-                                * dress_bone.tail_relative_position.length()
-                                / dress.bones[dress_bone.parent_index].tail_relative_position.length()
-                            )
+                            #         if dress_tail_offset_qqs:
+                            #             dress_offset_qq = dress_tail_offset_qqs[0]
+                            #             for qq in dress_tail_offset_qqs[1:]:
+                            #                 dress_offset_qq = MQuaternion.slerp(dress_offset_qq, qq, 0.5)
+                            #     else:
+                            #         model_tail_position = model_matrixes[0, tail_far_bone_names[0]].position
+                            #         dress_tail_position = dress_matrixes[0, tail_far_bone_names[0]].position
+                            # else:
+                            #     dress_bone_position = dress_matrixes[0, bone_name].position
+                            #     dress_tail_position = dress_matrixes[0, bone_name].global_matrix * dress_bone.tail_relative_position
 
-                    if np.isclose(dress_fit_length_scale, 0.0):
-                        dress_fit_length_scale = 1.0
+                            #     model_tail_position = model_matrixes[0, bone_name].global_matrix * model_bone.tail_relative_position
 
-                    # ちょっとだけ縮める
-                    dress_fit_length_scale *= 0.98
-                    dress_local_thick_scale = dress_category_local_scales.get(bone_setting.category, MVector3D())
+                            # model_tail_vector = model_tail_position - model_bone_position
+                            # dress_tail_vector = dress_tail_position - dress_bone_position
 
-                    if bone_setting.global_scalable:
-                        dress_global_scales[dress_bone.index] = (
-                            MVector3D(dress_fit_length_scale, dress_fit_length_scale, dress_fit_length_scale) - 1
-                        )
+                            # if 0 < model_tail_vector.length() and 0 < dress_tail_vector.length():
+                            #     # 衣装：自分の方向
+                            #     dress_slope_qq = (dress_tail_position - dress_bone_position).to_local_matrix4x4().to_quaternion()
+
+                            #     # 人物：自分の方向
+                            #     model_slope_qq = (model_tail_position - model_bone_position).to_local_matrix4x4().to_quaternion()
+
+                            #     dress_offset_qq = model_slope_qq * dress_slope_qq.inverse()
+
+                        dress_offset_qqs[dress_bone.index] = dress_offset_qq
+                        self.trace.set(rotation=dress_offset_qq)
 
                         dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
                             BoneMorphOffset(
                                 dress_bone.index,
-                                scale=dress_global_scales[dress_bone.index],
+                                qq=dress_offset_qq,
                             )
                         )
 
-                        logger.debug(f"ボーングローバル距離比率 [{dress_bone.name}][{dress_global_scales[dress_bone.index]}]")
-                    else:
-                        if bone_setting.category == "指":
-                            # 指は厚みと同じだけの長さスケールにする
-                            dress_local_scales[dress_bone.index] = MVector3D(
-                                dress_local_thick_scale.y, dress_local_thick_scale.y, dress_local_thick_scale.y
+                        logger.debug(f"-- -- 回転オフセット[{dress_bone.name}][{dress_offset_qq.to_euler_degrees()}]")
+
+                    if (bone_setting.global_scalable or bone_setting.local_x_scalable) and dress_bone.name in model.bones:
+                        # X方向のスケーリングがOKで、人物に同名ボーンがある場合、比率を測る
+                        dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
+                        model_bone = model.bones[dress_bone.name]
+
+                        if (
+                            bone_setting.category == "足ＩＫ"
+                            and f"{dress_bone.name[0]}足" in model.bones
+                            and f"{dress_bone.name[0]}足" in dress.bones
+                        ):
+                            # 足IKの比率は足ボーンから足IKボーンまでの直線距離とする
+                            self.trace.set(length_branch="leg_ik")
+                            dress_fit_length_scale = (model_bone.position - model.bones[f"{dress_bone.name[0]}足"].position).length() / (
+                                (dress_bone.position - dress.bones[f"{dress_bone.name[0]}足"].position).length() or 1
                             )
+                        elif (
+                            bone_setting.category == "つま先ＩＫ"
+                            and f"{dress_bone.name[0]}足ＩＫ" in model.bones
+                            and f"{dress_bone.name[0]}足ＩＫ" in dress.bones
+                        ):
+                            # つま先IKの比率はグローバルZ方向だけ合わせる
+                            self.trace.set(length_branch="toe_ik")
+                            dress_fit_length_scale = (
+                                model_bone.position - model.bones[f"{dress_bone.name[0]}足ＩＫ"].position
+                            ).length() / ((dress_bone.position - dress.bones[f"{dress_bone.name[0]}足ＩＫ"].position).length() or 1)
+                        elif bone_setting.category == "足首":
+                            ankle_length_scale = self.get_ankle_length_scale(model, dress, dress_bone.name[0])
+                            if ankle_length_scale is not None:
+                                # 足のスケールは足底の長さで決める
+                                self.trace.set(length_branch="ankle_sole")
+                                dress_fit_length_scale = ankle_length_scale
+                            elif f"{dress_bone.name[0]}つま先ＩＫ" in model.bones and f"{dress_bone.name[0]}つま先ＩＫ" in dress.bones:
+                                # つま先ＩＫがある場合、そこまでの長さ
+                                self.trace.set(length_branch="ankle_toe_ik")
+                                dress_fit_length_scale = (
+                                    model_bone.position - model.bones[model.bones[f"{dress_bone.name[0]}つま先ＩＫ"].ik.bone_index].position
+                                ).length() / (
+                                    (
+                                        dress_bone.position
+                                        - dress.bones[dress.bones[f"{dress_bone.name[0]}つま先ＩＫ"].ik.bone_index].position
+                                    ).length()
+                                    or 1
+                                )
+                            else:
+                                self.trace.set(length_branch="ankle_default")
+                                dress_fit_length_scale = 1.0
+                        elif dress_bone.name in ("首根元", "首") and "上半身2" in dress.bones:
+                            # 首根元は上半身2のスケールを流用する
+                            self.trace.set(length_branch="neck")
+                            dress_fit_length_scale = (dress_local_scales[dress.bones["上半身2"].index].x / 0.98) + 1
+                        elif "手首" in dress_bone.name:
+                            # 手首の比率は手首ボーンから各指１ボーンまでの直線距離の最大とする
+                            self.trace.set(length_branch="wrist")
+                            finger_lengths: list[float] = []
+                            for finger_name in ("親指２", "人指３", "中指３", "薬指３", "小指３"):
+                                finger_bone_name = f"{dress_bone.name[0]}{finger_name}"
+                                if finger_bone_name in model.bones and finger_bone_name in dress.bones:
+                                    finger_lengths.append(
+                                        (model_bone.position - model.bones[finger_bone_name].position).length()
+                                        / ((dress_bone.position - dress.bones[finger_bone_name].position).length() or 1)
+                                    )
+
+                            dress_fit_length_scale = 1.0 if not finger_lengths else np.max(finger_lengths)
                         else:
-                            dress_local_scales[dress_bone.index] = MVector3D(
-                                dress_fit_length_scale - 1, dress_local_thick_scale.y, dress_local_thick_scale.z
-                            )
+                            tail_far_bone_names = [
+                                tail_bone_name
+                                for tail_bone_name in bone_setting.tails
+                                if tail_bone_name in dress.bones
+                                and tail_bone_name in model.bones
+                                and 0.0001 < dress.bones[tail_bone_name].position.distance(dress_bone.position)
+                            ]
 
-                        dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
-                            BoneMorphOffset(
-                                dress_bone.index,
-                                local_scale=dress_local_scales[dress_bone.index],
-                            )
-                        )
+                            if tail_far_bone_names and "指先" not in tail_far_bone_names[0]:
+                                self.trace.set(length_branch="tail")
+                                model_bone_position = model_matrixes[0, dress_bone.name].position
+                                model_tail_position = model_matrixes[0, tail_far_bone_names[0]].position
 
-                        logger.debug(f"ボーンローカル距離比率 [{dress_bone.name}][{dress_local_scales[dress_bone.index]}]")
+                                dress_bone_position = dress_matrixes[0, dress_bone.name].position
+                                dress_tail_position = dress_matrixes[0, tail_far_bone_names[0]].position
 
-                # if bone_setting.local_x_scalable or bone_setting.local_scalable:
-                #     dress_local_thick_scale = dress_category_local_scales.get(bone_setting.category, MVector3D())
+                                dress_fit_length_scale = (model_tail_position - model_bone_position).length() / (
+                                    (dress_tail_position - dress_bone_position).length() or 1
+                                )
+                            elif dress_bone.parent_index in dress_local_scales:
+                                # 先がボーンが見つからない場合、親ボーンの比率と親ボーンとの長さ比から求め直す
+                                self.trace.set(length_branch="parent")
+                                dress_parent_fit_length_scale = dress_local_scales[dress_bone.parent_index].x + 1
+
+                                dress_fit_length_scale = (
+                                    dress_parent_fit_length_scale
+                                    * dress_bone.tail_relative_position.length()
+                                    / dress.bones[dress_bone.parent_index].tail_relative_position.length()
+                                )
 
-                #     if bone_setting.category == "指":
-                #         # 指は厚みと同じだけの長さスケールにする
-                #         dress_local_scale = MVector3D(dress_local_thick_scale.y, dress_local_thick_scale.y, dress_local_thick_scale.y)
-                #     else:
-                #         # ローカルスケール自体はひとまとめにしたもの
-                #         dress_local_scale = dress_local_scales.get(dress_bone.index, MVector3D()) + dress_local_thick_scale
-                #     dress_local_scales[dress_bone.index] = dress_local_scale
+                        if np.isclose(dress_fit_length_scale, 0.0):
+                            dress_fit_length_scale = 1.0
 
-                #     dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
-                #         BoneMorphOffset(
-                #             dress_bone.index,
-                #             local_scale=dress_local_scale,
-                #         )
-                #     )
+                        # ちょっとだけ縮める
+                        dress_fit_length_scale *= 0.98
+                        self.trace.set(length_scale=float(dress_fit_length_scale))
+                        dress_local_thick_scale = dress_category_local_scales.get(bone_setting.category, MVector3D())
 
-                # if bone_setting.global_scalable:
-                #     dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
-                #         BoneMorphOffset(
-                #             dress_bone.index,
-                #             scale=dress_global_scales.get(dress_bone.index, MVector3D()),
-                #         )
-                #     )
-            else:
-                # 準標準外、もしくは準標準でもボーンが揃ってない場合、準標準外フィッティング
-                if f"{dress_bone.name[0]}手首" in dress.bone_trees[dress_bone.name].names[:-1]:
-                    # 手首から先は無視(握り拡散とか)
-                    continue
+                        if bone_setting.global_scalable:
+                            dress_global_scales[dress_bone.index] = (
+                                MVector3D(dress_fit_length_scale, dress_fit_length_scale, dress_fit_length_scale) - 1
+                            )
 
-                model_deformed_position = MVector3D()
-                dress_offset_position = MVector3D()
-                dress_offset_qq = MQuaternion()
-                dress_global_offset_scale = MVector3D()
-                dress_local_offset_scale = MVector3D()
-                parent_index = [bidx for bidx in dress.bone_trees[dress_bone.name].indexes[:-1] if not dress.bones[bidx].is_system][-1]
+                            dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
+                                BoneMorphOffset(
+                                    dress_bone.index,
+                                    scale=dress_global_scales[dress_bone.index],
+                                )
+                            )
 
-                is_same_standard = False
-                out_standard_dress_position = dress_out_standard_positions[dress_bone.index] or dress_standard_positions[dress_bone.index]
+                            logger.debug(f"ボーングローバル距離比率 [{dress_bone.name}][{dress_global_scales[dress_bone.index]}]")
+                            self.trace.set(scale=dress_global_scales[dress_bone.index])
+                        else:
+                            if bone_setting.category == "指":
+                                # 指は厚みと同じだけの長さスケールにする
+                                dress_local_scales[dress_bone.index] = MVector3D(
+                                    dress_local_thick_scale.y, dress_local_thick_scale.y, dress_local_thick_scale.y
+                                )
+                            else:
+                                dress_local_scales[dress_bone.index] = MVector3D(
+                                    dress_fit_length_scale - 1, dress_local_thick_scale.y, dress_local_thick_scale.z
+                                )
 
-                if out_standard_dress_position is not None:
-                    # 同じ位置にある準標準ボーン
-                    nearest_dress_standard_bone_indexes = [
-                        ni for ni in dress_standard_positions.nearest_all_keys(out_standard_dress_position)
-                    ]
-                    if 0 < len(nearest_dress_standard_bone_indexes):
-                        # ウェイトを持っているボーンがあれば、それを優先させる
-                        nearest_dress_bone_index = nearest_dress_standard_bone_indexes[
-                            np.argmax([len(dress.vertices_by_bones.get(i, [])) for i in nearest_dress_standard_bone_indexes])
-                        ]
-                        if set(dress.bone_trees[dress_bone.name].indexes) & set(nearest_dress_standard_bone_indexes):
-                            # 自分の親に同位置準標準ボーンがある場合、その最後尾を採用する
-                            nearest_dress_bone_index = [
-                                i for i in dress.bone_trees[dress_bone.name].indexes if i in nearest_dress_standard_bone_indexes
-                            ][-1]
-                        nearest_dress_bone_position = dress_standard_positions[nearest_dress_bone_index]
-                        nearest_dress_bone_name = dress.bones[nearest_dress_bone_index].name
-                        if (
-                            nearest_dress_bone_name in model.bones
-                            and np.isclose(
-                                nearest_dress_bone_position.vector, out_standard_dress_position.vector, atol=1e-2, rtol=1e-2
-                            ).all()
-                        ):
-                            # ほぼ同じ位置に準標準がある場合、そのボーンの位置に合わせる
-                            dress_position = dress_matrixes[0, dress_bone.name].position
-                            dress_offset_position = model_matrixes[0, nearest_dress_bone_name].position - dress_position
-                            bone_setting = DRESS_STANDARD_BONE_NAMES[nearest_dress_bone_name]
-
-                            # 角度・縮尺は準標準の縮尺に合わせる
-                            dress_local_offset_scale = dress_local_scales.get(nearest_dress_bone_index, MVector3D()).copy()
-                            dress_local_thick_scale = dress_category_local_scales.get(bone_setting.category, MVector3D())
-                            dress_local_offset_scale.y = dress_local_thick_scale.y
-                            dress_local_offset_scale.z = dress_local_thick_scale.z
-
-                            if 0 > dress_bone.effect_index:
-                                # 付与が入ってなければ回転を準標準に合わせる
-                                dress_offset_qq = dress_offset_qqs.get(nearest_dress_bone_index, MQuaternion()).copy()
-
-                            is_same_standard = True
-
-                if not is_same_standard:
-                    if dress.bones[dress_bone.parent_index].is_standard or (
-                        dress_bone.effect_index in dress.bones and dress.bones[dress_bone.effect_index].is_standard
-                    ):
-                        if (
-                            dress_bone.effect_index in dress.bones
-                            and dress.bones[dress_bone.effect_index].is_standard
-                            and dress.bones[dress_bone.effect_index].name in model.bones
-                        ):
-                            # 付与親が準標準である場合、それを参照する
-                            parent_index = dress_bone.effect_index
-                            dress_parent_standard_bone = dress.bones[dress_bone.effect_index]
+                            dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
+                                BoneMorphOffset(
+                                    dress_bone.index,
+                                    local_scale=dress_local_scales[dress_bone.index],
+                                )
+                            )
 
-                        # 現在の衣装ボーン位置を求める
-                        dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
+                            logger.debug(f"ボーンローカル距離比率 [{dress_bone.name}][{dress_local_scales[dress_bone.index]}]")
+                            self.trace.set(local_scale=dress_local_scales[dress_bone.index])
 
-                        # 子ボーン
-                        tail_far_bone_names = (
-                            [
-                                tail_bone_name
-                                for tail_bone_name in dress_parent_bone_setting.tails
-                                if tail_bone_name in dress.bones and tail_bone_name in model.bones
-                            ]
-                            if not standard_child_names
-                            else standard_child_names
-                        )
+                    # if bone_setting.local_x_scalable or bone_setting.local_scalable:
+                    #     dress_local_thick_scale = dress_category_local_scales.get(bone_setting.category, MVector3D())
 
-                        dress_parent_bone_position = dress_matrixes[0, dress_parent_standard_bone.name].position
-                        model_parent_bone_position = model_matrixes[0, dress_parent_standard_bone.name].position
+                    #     if bone_setting.category == "指":
+                    #         # 指は厚みと同じだけの長さスケールにする
+                    #         dress_local_scale = MVector3D(dress_local_thick_scale.y, dress_local_thick_scale.y, dress_local_thick_scale.y)
+                    #     else:
+                    #         # ローカルスケール自体はひとまとめにしたもの
+                    #         dress_local_scale = dress_local_scales.get(dress_bone.index, MVector3D()) + dress_local_thick_scale
+                    #     dress_local_scales[dress_bone.index] = dress_local_scale
+
+                    #     dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
+                    #         BoneMorphOffset(
+                    #             dress_bone.index,
+                    #             local_scale=dress_local_scale,
+                    #         )
+                    #     )
 
-                        dress_bone_position = dress_matrixes[0, dress_bone.name].position
-                        dress_relative_position = dress_bone_position - dress_parent_bone_position
+                    # if bone_setting.global_scalable:
+                    #     dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
+                    #         BoneMorphOffset(
+                    #             dress_bone.index,
+                    #             scale=dress_global_scales.get(dress_bone.index, MVector3D()),
+                    #         )
+                    #     )
+                else:
+                    # 準標準外、もしくは準標準でもボーンが揃ってない場合、準標準外フィッティング
+                    self.trace.set(branch="out_standard")
+                    if f"{dress_bone.name[0]}手首" in dress.bone_trees[dress_bone.name].names[:-1]:
+                        # 手首から先は無視(握り拡散とか)
+                        self.trace.set(branch="wrist_child")
+                        continue
 
-                        # 人物で親ボーンを基準として相対位置からどこにあるべきかを求め直す
-                        model_deformed_position = model_matrixes[0, dress_parent_standard_bone.name].global_matrix * dress_relative_position
+                    model_deformed_position = MVector3D()
+                    dress_offset_position = MVector3D()
+                    dress_offset_qq = MQuaternion()
+                    dress_global_offset_scale = MVector3D()
+                    dress_local_offset_scale = MVector3D()
+                    parent_index = [bidx for bidx in dress.bone_trees[dress_bone.name].indexes[:-1] if not dress.bones[bidx].is_system][-1]
 
-                        if tail_far_bone_names:
-                            model_tail_position = model_matrixes[0, tail_far_bone_names[0]].position
-                            dress_tail_position = dress_matrixes[0, tail_far_bone_names[0]].position
-                        else:
-                            model_tail_position = model_matrixes[0, dress_parent_standard_bone.name].global_matrix * dress_relative_position
-                            dress_tail_position = dress_matrixes[0, dress_parent_standard_bone.name].global_matrix * dress_relative_position
+                    is_same_standard = False
+                    out_standard_dress_position = (
+                        dress_out_standard_positions[dress_bone.index] or dress_standard_positions[dress_bone.index]
+                    )
 
-                        if (
-                            np.isclose((dress_parent_bone_position - model_parent_bone_position).vector, 0, atol=1e-2, rtol=1e-2).any()
-                            and np.isclose((dress_tail_position - dress_tail_position).vector, 0, atol=1e-2, rtol=1e-2).any()
+                    if out_standard_dress_position is not None:
+                        # 同じ位置にある準標準ボーン
+                        nearest_dress_standard_bone_indexes = [
+                            ni for ni in dress_standard_positions.nearest_all_keys(out_standard_dress_position)
+                        ]
+                        if 0 < len(nearest_dress_standard_bone_indexes):
+                            # ウェイトを持っているボーンがあれば、それを優先させる
+                            nearest_dress_bone_index = nearest_dress_standard_bone_indexes[
+                                np.argmax([len(dress.vertices_by_bones.get(i, [])) for i in nearest_dress_standard_bone_indexes])
+                            ]
+                            if set(dress.bone_trees[dress_bone.name].indexes) & set(nearest_dress_standard_bone_indexes):
+                                # 自分の親に同位置準標準ボーンがある場合、その最後尾を採用する
+                                nearest_dress_bone_index = [
+                                    i for i in dress.bone_trees[dress_bone.name].indexes if i in nearest_dress_standard_bone_indexes
+                                ][-1]
+                            nearest_dress_bone_position = dress_standard_positions[nearest_dress_bone_index]
+                            nearest_dress_bone_name = dress.bones[nearest_dress_bone_index].name
+                            if (
+                                nearest_dress_bone_name in model.bones
+                                and np.isclose(
+                                    nearest_dress_bone_position.vector, out_standard_dress_position.vector, atol=1e-2, rtol=1e-2
+                                ).all()
+                            ):
+                                # ほぼ同じ位置に準標準がある場合、そのボーンの位置に合わせる
+                                dress_position = dress_matrixes[0, dress_bone.name].position
+                                dress_offset_position = model_matrixes[0, nearest_dress_bone_name].position - dress_position
+                                bone_setting = DRESS_STANDARD_BONE_NAMES[nearest_dress_bone_name]
+
+                                # 角度・縮尺は準標準の縮尺に合わせる
+                                dress_local_offset_scale = dress_local_scales.get(nearest_dress_bone_index, MVector3D()).copy()
+                                dress_local_thick_scale = dress_category_local_scales.get(bone_setting.category, MVector3D())
+                                dress_local_offset_scale.y = dress_local_thick_scale.y
+                                dress_local_offset_scale.z = dress_local_thick_scale.z
+
+                                if 0 > dress_bone.effect_index:
+                                    # 付与が入ってなければ回転を準標準に合わせる
+                                    dress_offset_qq = dress_offset_qqs.get(nearest_dress_bone_index, MQuaternion()).copy()
+
+                                is_same_standard = True
+                                self.trace.set(branch="same_standard")
+
+                    if not is_same_standard:
+                        if dress.bones[dress_bone.parent_index].is_standard or (
+                            dress_bone.effect_index in dress.bones and dress.bones[dress_bone.effect_index].is_standard
                         ):
-                            dress_bone_fit_position = dress_bone_position.copy()
-                            dress_offset_position = MVector3D()
-                        else:
-                            dress_bone_fit_position = align_triangle(
-                                dress_parent_bone_position,
-                                dress_tail_position,
-                                dress_bone_position,
-                                model_parent_bone_position,
-                                model_tail_position,
+                            if (
+                                dress_bone.effect_index in dress.bones
+                                and dress.bones[dress_bone.effect_index].is_standard
+                                and dress.bones[dress_bone.effect_index].name in model.bones
+                            ):
+                                # 付与親が準標準である場合、それを参照する
+                                parent_index = dress_bone.effect_index
+                                dress_parent_standard_bone = dress.bones[dress_bone.effect_index]
+
+                            self.trace.set(branch="parent_standard")
+
+                            # 現在の衣装ボーン位置を求める
+                            dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
+
+                            # 子ボーン
+                            tail_far_bone_names = (
+                                [
+                                    tail_bone_name
+                                    for tail_bone_name in dress_parent_bone_setting.tails
+                                    if tail_bone_name in dress.bones and tail_bone_name in model.bones
+                                ]
+                                if not standard_child_names
+                                else standard_child_names
                             )
 
-                            dress_offset_position = dress_bone_fit_position - model_deformed_position
+                            dress_parent_bone_position = dress_matrixes[0, dress_parent_standard_bone.name].position
+                            model_parent_bone_position = model_matrixes[0, dress_parent_standard_bone.name].position
 
-                        if dress_parent_bone_setting.category not in ("上半身", "下半身", "体幹", "首", "頭", "肩根元"):
-                            # 体幹以外は子ボーンの位置を合わせるよう回転させる
-                            original_slope_vector = dress_bone_fit_position - dress_parent_bone_position
-                            deformed_slope_vector = model_deformed_position - dress_parent_bone_position
+                            dress_bone_position = dress_matrixes[0, dress_bone.name].position
+                            dress_relative_position = dress_bone_position - dress_parent_bone_position
 
-                            if 0.1 < original_slope_vector.length() and 0.1 < deformed_slope_vector.length():
-                                # 子ボーンとの距離がある場合のみ、回転補正
-                                original_slope_qq = original_slope_vector.to_local_matrix4x4().to_quaternion()
-                                deformed_slope_qq = deformed_slope_vector.to_local_matrix4x4().to_quaternion()
-                                dress_offset_qq = original_slope_qq * deformed_slope_qq.inverse()
-                        else:
-                            # 角度は元々の向きと同じにする
-                            for tree_bone_index in reversed(dress.bone_trees[dress_bone.name].indexes[:-1]):
-                                dress_offset_qq *= dress_offset_qqs.get(tree_bone_index, MQuaternion()).inverse()
+                            # 人物で親ボーンを基準として相対位置からどこにあるべきかを求め直す
+                            model_deformed_position = (
+                                model_matrixes[0, dress_parent_standard_bone.name].global_matrix * dress_relative_position
+                            )
 
-                        # # スケールはシステムではない親を引き継ぐ
-                        # dress_local_offset_scale = dress_local_scales.get(parent_index, MVector3D()).copy()
+                            if tail_far_bone_names:
+                                model_tail_position = model_matrixes[0, tail_far_bone_names[0]].position
+                                dress_tail_position = dress_matrixes[0, tail_far_bone_names[0]].position
+                            else:
+                                model_tail_position = (
+                                    model_matrixes[0, dress_parent_standard_bone.name].global_matrix * dress_relative_position
+                                )
+                                dress_tail_position = (
+                                    dress_matrixes[0, dress_parent_standard_bone.name].global_matrix * dress_relative_position
+                                )
 
-                        # # 親ボーンのローカル軸をコピーしておく（軸がずれると形状がズレる）
-                        # dress.bones[dress_bone.index].local_axis = dress.bones[parent_index].local_axis.copy()
+                            if (
+                                np.isclose((dress_parent_bone_position - model_parent_bone_position).vector, 0, atol=1e-2, rtol=1e-2).any()
+                                and np.isclose((dress_tail_position - dress_tail_position).vector, 0, atol=1e-2, rtol=1e-2).any()
+                            ):
+                                dress_bone_fit_position = dress_bone_position.copy()
+                                dress_offset_position = MVector3D()
+                            else:
+                                dress_bone_fit_position = align_triangle(
+                                    dress_parent_bone_position,
+                                    dress_tail_position,
+                                    dress_bone_position,
+                                    model_parent_bone_position,
+                                    model_tail_position,
+                                )
 
-                    elif dress.bones[dress_bone.parent_index].is_standard and dress_bone.parent_index in dress_local_scales:
-                        # 準標準ではない子ボーンのスケールはローカルが親にある場合のみローカルXを引き継ぐ（準標準の子である準標準外）
-                        dress_parent_scale = dress_local_scales[parent_index]
-                        dress_global_offset_scale = MVector3D(dress_parent_scale.x, dress_parent_scale.x, dress_parent_scale.x)
+                                dress_offset_position = dress_bone_fit_position - model_deformed_position
 
-                logger.debug(
-                    f"-- -- 移動オフセット[{dress_bone.name}][{dress_offset_position}]"
-                    + f"[fit={dress_bone_fit_position}][dress={model_deformed_position}]"
-                )
-                logger.debug(f"-- -- 回転オフセット[{dress_bone.name}][{dress_offset_qq.to_euler_degrees()}]")
-                logger.debug(f"-- -- グローバル縮尺オフセット[{dress_bone.name}][{dress_global_offset_scale}]")
-                logger.debug(f"-- -- ローカル縮尺オフセット[{dress_bone.name}][{dress_local_offset_scale}]")
-
-                dress_offset_positions[dress_bone.index] = dress_offset_position
-                dress_offset_qqs[dress_bone.index] = dress_offset_qq
-                if 0 < dress_global_offset_scale.length():
-                    dress_global_scales[dress_bone.index] = dress_global_offset_scale
-                if 0 < dress_local_offset_scale.length():
-                    dress_local_scales[dress_bone.index] = dress_local_offset_scale
-
-                dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
-                    BoneMorphOffset(
-                        dress_bone.index,
+                            if dress_parent_bone_setting.category not in ("上半身", "下半身", "体幹", "首", "頭", "肩根元"):
+                                # 体幹以外は子ボーンの位置を合わせるよう回転させる
+                                original_slope_vector = dress_bone_fit_position - dress_parent_bone_position
+                                deformed_slope_vector = model_deformed_position - dress_parent_bone_position
+
+                                if 0.1 < original_slope_vector.length() and 0.1 < deformed_slope_vector.length():
+                                    # 子ボーンとの距離がある場合のみ、回転補正
+                                    original_slope_qq = original_slope_vector.to_local_matrix4x4().to_quaternion()
+                                    deformed_slope_qq = deformed_slope_vector.to_local_matrix4x4().to_quaternion()
+                                    dress_offset_qq = original_slope_qq * deformed_slope_qq.inverse()
+                            else:
+                                # 角度は元々の向きと同じにする
+                                for tree_bone_index in reversed(dress.bone_trees[dress_bone.name].indexes[:-1]):
+                                    dress_offset_qq *= dress_offset_qqs.get(tree_bone_index, MQuaternion()).inverse()
+
+                            # # スケールはシステムではない親を引き継ぐ
+                            # dress_local_offset_scale = dress_local_scales.get(parent_index, MVector3D()).copy()
+
+                            # # 親ボーンのローカル軸をコピーしておく（軸がずれると形状がズレる）
+                            # dress.bones[dress_bone.index].local_axis = dress.bones[parent_index].local_axis.copy()
+
+                        elif dress.bones[dress_bone.parent_index].is_standard and dress_bone.parent_index in dress_local_scales:
+                            # 準標準ではない子ボーンのスケールはローカルが親にある場合のみローカルXを引き継ぐ（準標準の子である準標準外）
+                            dress_parent_scale = dress_local_scales[parent_index]
+                            dress_global_offset_scale = MVector3D(dress_parent_scale.x, dress_parent_scale.x, dress_parent_scale.x)
+                            self.trace.set(branch="parent_scale")
+
+                    logger.debug(
+                        f"-- -- 移動オフセット[{dress_bone.name}][{dress_offset_position}]"
+                        + f"[fit={dress_bone_fit_position}][dress={model_deformed_position}]"
+                    )
+                    logger.debug(f"-- -- 回転オフセット[{dress_bone.name}][{dress_offset_qq.to_euler_degrees()}]")
+                    logger.debug(f"-- -- グローバル縮尺オフセット[{dress_bone.name}][{dress_global_offset_scale}]")
+                    logger.debug(f"-- -- ローカル縮尺オフセット[{dress_bone.name}][{dress_local_offset_scale}]")
+                    self.trace.set(
                         position=dress_offset_position,
-                        qq=dress_offset_qq,
+                        rotation=dress_offset_qq,
                         scale=dress_global_offset_scale,
                         local_scale=dress_local_offset_scale,
                     )
-                )
+
+                    dress_offset_positions[dress_bone.index] = dress_offset_position
+                    dress_offset_qqs[dress_bone.index] = dress_offset_qq
+                    if 0 < dress_global_offset_scale.length():
+                        dress_global_scales[dress_bone.index] = dress_global_offset_scale
+                    if 0 < dress_local_offset_scale.length():
+                        dress_local_scales[dress_bone.index] = dress_local_offset_scale
+
+                    dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
+                        BoneMorphOffset(
+                            dress_bone.index,
+                            position=dress_offset_position,
+                            qq=dress_offset_qq,
+                            scale=dress_global_offset_scale,
+                            local_scale=dress_local_offset_scale,
+                        )
+                    )
+
+            self.progress.finish()
+            self.trace.end()
+
+            if not dress_mirrored_bone_indexes or self.is_valid_mirror_fitting(
+                model, dress, model_matrixes, dress_motion, dress_mirrored_bone_indexes
+            ):
+                break
+
+            # 反転した結果が人物と合わない場合、左右非対称とみなして、反転したボーンとその子ボーンだけフィッティングし直す
+            # （反転元の側と中央のボーンはそのまま使う）
+            logger.info("左右非対称のため、反転したボーンをフィッティングし直します")
+            dress_fit_bone_indexes = self.get_descendant_bone_indexes(dress, dress_mirrored_bone_indexes.keys())
+            self.reset_fitting_offsets(
+                dress,
+                dress_fit_bone_indexes,
+                dress_fit_offset_count,
+                dress_initial_values,
+                (dress_local_scales, dress_global_scales, dress_offset_positions, dress_offset_qqs),
+            )
+            dress_fitted_bone_indexes -= set(dress_fit_bone_indexes)
+            dress_mirror_bone_indexes = {}
+            dress_mirrored_bone_indexes = {}
+            self.trace.attempt += 1
 
         # # ----- 変形結果 -------------
         # from datetime import datetime
@@ -2173,10 +2285,189 @@ class LoadUsecase:
 
         return dress_local_scales, dress_global_scales, dress_offset_positions, dress_offset_qqs
 
+    def get_mirror_bone_indexes(self, model: PmxModel, dress: PmxModel) -> dict[int, int]:
+        """左右の名前と左右反転した位置を持つ衣装ボーンのペア（人物にある場合は人物側も左右反転していること）"""
+        mirror_bone_indexes: dict[int, int] = {}
+
+        for dress_bone in dress.bones:
+            if "右" in dress_bone.name and "左" not in dress_bone.name:
+                mirror_bone_name = dress_bone.name.replace("右", "左")
+            elif "左" in dress_bone.name and "右" not in dress_bone.name:
+                mirror_bone_name = dress_bone.name.replace("左", "右")
+            else:
+                continue
+
+            if mirror_bone_name not in dress.bones:
+                continue
+
+            if not np.isclose(
+                dress_bone.position.vector * np.array([-1, 1, 1]), dress.bones[mirror_bone_name].position.vector, atol=1e-2, rtol=1e-2
+            ).all():
+                # 衣装の位置が左右対称ではない場合、対象外
+                continue
+
+            if dress_bone.name in model.bones or mirror_bone_name in model.bones:
+                if not (dress_bone.name in model.bones and mirror_bone_name in model.bones):
+                    # 人物に片側しかない場合、対象外
+                    continue
+
+                if not np.isclose(
+                    model.bones[dress_bone.name].position.vector * np.array([-1, 1, 1]),
+                    model.bones[mirror_bone_name].position.vector,
+                    atol=1e-2,
+                    rtol=1e-2,
+                ).all():
+                    # 人物の位置が左右対称ではない場合、対象外
+                    continue
+
+            mirror_bone_indexes[dress_bone.index] = dress.bones[mirror_bone_name].index
+
+        return mirror_bone_indexes
+
+    def mirror_fitting_offsets(
+        self,
+        dress: PmxModel,
+        from_bone_index: int,
+        to_bone_index: int,
+        start_offset_index: int,
+        dress_local_scales: dict[int, MVector3D],
+        dress_global_scales: dict[int, MVector3D],
+        dress_offset_positions: dict[int, MVector3D],
+        dress_offset_qqs: dict[int, MQuaternion],
+    ) -> None:
+        """
+        反対側のボーンのフィッティング結果を左右反転してコピーする
+        start_offset_index: フィッティングループで追加したオフセットの開始位置（それより前は両側とも自分で求めているのでコピーしない）
+        """
+        for offset in [o for o in dress.morphs[DRESS_BONE_FITTING_NAME].offsets[start_offset_index:] if o.bone_index == from_bone_index]:
+            offset_degrees = offset.rotation.qq.to_euler_degrees()
+            dress.morphs[DRESS_BONE_FITTING_NAME].offsets.append(
+                BoneMorphOffset(
+                    to_bone_index,
+                    position=MVector3D(-offset.position.x, offset.position.y, offset.position.z),
+                    qq=MQuaternion.from_euler_degrees(offset_degrees.x, -offset_degrees.y, -offset_degrees.z),
+                    scale=offset.scale.copy(),
+                    local_scale=offset.local_scale.copy(),
+                )
+            )
+
+        if from_bone_index in dress_offset_positions:
+            offset_position = dress_offset_positions[from_bone_index]
+            dress_offset_positions[to_bone_index] = MVector3D(-offset_position.x, offset_position.y, offset_position.z)
+        if from_bone_index in dress_offset_qqs:
+            offset_degrees = dress_offset_qqs[from_bone_index].to_euler_degrees()
+            dress_offset_qqs[to_bone_index] = MQuaternion.from_euler_degrees(offset_degrees.x, -offset_degrees.y, -offset_degrees.z)
+        if from_bone_index in dress_local_scales:
+            dress_local_scales[to_bone_index] = dress_local_scales[from_bone_index].copy()
+        if from_bone_index in dress_global_scales:
+            dress_global_scales[to_bone_index] = dress_global_scales[from_bone_index].copy()
+
+        logger.debug(f"-- -- 左右反転[{dress.bones[from_bone_index].name} -> {dress.bones[to_bone_index].name}]")
+
+    def get_descendant_bone_indexes(self, dress: PmxModel, bone_indexes: Iterable[int]) -> list[int]:
+        """指定ボーンとその子孫ボーンのINDEX（変形順序）"""
+        target_bone_indexes = set(bone_indexes)
+        descendant_bone_indexes: list[int] = []
+        for bone_index in dress.bones.bone_link_indexes:
+            parent_index = bone_index
+            # 親を辿って、指定ボーンに行き着くか調べる（循環している場合に備えて、辿ったボーンは覚えておく）
+            visited_bone_indexes: set[int] = set()
+            while 0 <= parent_index and parent_index not in visited_bone_indexes:
+                if parent_index in target_bone_indexes:
+                    descendant_bone_indexes.append(bone_index)
+                    break
+                visited_bone_indexes.add(parent_index)
+                parent_index = dress.bones[parent_index].parent_index
+        return descendant_bone_indexes
+
+    def reset_fitting_offsets(
+        self,
+        dress: PmxModel,
+        bone_indexes: list[int],
+        start_offset_index: int,
+        initial_values: list[dict],
+        values: tuple[dict, ...],
+    ) -> None:
+        """
+        指定ボーンのフィッティング結果を、フィッティングループに入る前の状態に戻す
+        start_offset_index: フィッティングループで追加したオフセットの開始位置
+        initial_values: フィッティングループに入る前の values の複製
+        """
+        target_bone_indexes = set(bone_indexes)
+        offsets = dress.morphs[DRESS_BONE_FITTING_NAME].offsets
+        dress.morphs[DRESS_BONE_FITTING_NAME].offsets = offsets[:start_offset_index] + [
+            offset for offset in offsets[start_offset_index:] if offset.bone_index not in target_bone_indexes
+        ]
+
+        for initial_value, value in zip(initial_values, values):
+            for bone_index in target_bone_indexes:
+                if bone_index in initial_value:
+                    value[bone_index] = initial_value[bone_index].copy()
+                elif bone_index in value:
+                    del value[bone_index]
+
+    def is_valid_mirror_fitting(
+        self,
+        model: PmxModel,
+        dress: PmxModel,
+        model_matrixes: VmdBoneFrameTrees,
+        dress_motion: VmdMotion,
+        dress_mirrored_bone_indexes: dict[int, int],
+    ) -> bool:
+        """反転して求めたボーンが、反転元と同程度に人物に合っているか"""
+        dress_matrixes = dress_motion.animate_bone([0], dress, append_ik=False)
+
+        for to_bone_index, from_bone_index in dress_mirrored_bone_indexes.items():
+            to_bone_name = dress.bones[to_bone_index].name
+            from_bone_name = dress.bones[from_bone_index].name
+
+            dress_to_position = dress_matrixes[0, to_bone_name].position
+            dress_from_position = dress_matrixes[0, from_bone_name].position
+
+            if not np.isclose(dress_from_position.vector * np.array([-1, 1, 1]), dress_to_position.vector, atol=1e-1, rtol=1e-1).all():
+                # フィッティング後の衣装が左右対称になっていない
+                logger.debug(f"左右反転残差 [{from_bone_name}][{dress_from_position}] -> [{to_bone_name}][{dress_to_position}]")
+                return False
+
+            if model_matrixes.exists(0, to_bone_name) and model_matrixes.exists(0, from_bone_name):
+                to_residual = dress_to_position.distance(model_matrixes[0, to_bone_name].position)
+                from_residual = dress_from_position.distance(model_matrixes[0, from_bone_name].position)
+
+                if to_residual > from_residual + 0.1:
+                    # 反転元より人物とのズレが大きい
+                    logger.debug(f"左右反転残差 [{from_bone_name}][{from_residual:.3f}] -> [{to_bone_name}][{to_residual:.3f}]")
+                    return False
+
+        return True
+
+    def get_ankle_length_scale(self, model: PmxModel, dress: PmxModel, direction: str) -> Optional[float]:
+        """足底の長さ(Z方向)の比率を求める（足首系ボーンにウェイトが乗っていない場合はNone）"""
+        ankle_bone_names = [
+            bone_setting.name
+            for bone_setting in DRESS_STANDARD_BONE_NAMES.values()
+            if bone_setting.category == "足首" and bone_setting.name[0] == direction
+        ]
+        dress_ankle_bounds = self.get_bone_statistics(dress).get_bounds(
+            [dress.bones[bname].index for bname in ankle_bone_names if bname in dress.bones]
+        )
+        model_ankle_bounds = self.get_bone_statistics(model).get_bounds(
+            [model.bones[bname].index for bname in ankle_bone_names if bname in model.bones]
+        )
+        if dress_ankle_bounds is None or model_ankle_bounds is None:
+            return None
+
+        dress_ankle_vertex_min_positions, dress_ankle_vertex_max_positions = dress_ankle_bounds
+        model_ankle_vertex_min_positions, model_ankle_vertex_max_positions = model_ankle_bounds
+
+        return float(
+            (model_ankle_vertex_max_positions[2] - model_ankle_vertex_min_positions[2])
+            / (dress_ankle_vertex_max_positions[2] - dress_ankle_vertex_min_positions[2])
+        )
+
     def get_deformed_positions(
         self,
         model: PmxModel,
-        model_vertices: set[int],
+        model_vertices: Iterable[int],
         matrixes: VmdBoneFrameTrees,
     ) -> np.ndarray:
         model_deformed_vertices: list[np.ndarray] = []
@@ -2203,6 +2494,17 @@ class LoadUsecase:
     ) -> np.ndarray:
         model_deformed_vertices = self.get_deformed_positions(model, model_vertices, matrixes)
 
+        return self.get_local_positions(bone, model_deformed_vertices, matrixes, is_filter, is_z_positive)
+
+    def get_local_positions(
+        self,
+        bone: Bone,
+        model_deformed_vertices: np.ndarray,
+        matrixes: VmdBoneFrameTrees,
+        is_filter: bool = False,
+        is_z_positive: bool = False,
+    ) -> np.ndarray:
+        """変形済み頂点位置をボーンのローカル位置に変換する"""
         if is_z_positive:
             # Z方向が＋のもののみ対象とする場合、抽出
             model_deformed_vertices = model_deformed_vertices[model_deformed_vertices[..., 2] >= 0]
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+
+from mlib.core.logger import MLogger
+from mlib.core.math import MVector3D, MVector4D
+from mlib.pmx.pmx_collection import PmxModel
+from mlib.pmx.pmx_part import MaterialMorphCalcMode, MaterialMorphOffset
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+MATERIAL_TRANSPARENT_NAME = "MaterialTR"
+"""材質透過用モーフ名（非透過度が変わるたびにオフセットを作り直す）"""
+
+
+class MaterialTransparents:
+    """
+    材質別の非透過度
+    材質ごとの透過モーフは作らず、非透過度が1ではない材質だけを材質透過用モーフ1つにまとめる
+    """
+
+    def __init__(self, model: PmxModel) -> None:
+        self.model = model
+        self.alphas = np.ones(len(model.materials))
+        self.all_alpha = 1.0
+        # 読み込み済みのモデルを使い回す場合もあるので、前回の透過状態を消しておく
+        self.apply()
+
+    def update(self, material_alphas: dict[str, float]) -> bool:
+        """材質名別の非透過度を反映する（指定が無い材質は1とみなす）。変更が無かった場合はFalse"""
+        alphas = np.array([material_alphas.get(material.name, 1.0) for material in self.model.materials])
+        all_alpha = material_alphas.get(__("全材質"), 1.0)
+        if np.array_equal(alphas, self.alphas) and all_alpha == self.all_alpha:
+            return False
+
+        self.alphas = alphas
+        self.all_alpha = all_alpha
+        self.apply()
+
+        return True
+
+    def update_all(self, all_alpha: float) -> bool:
+        """全材質の非透過度だけを反映する。変更が無かった場合はFalse"""
+        if all_alpha == self.all_alpha:
+            return False
+
+        self.all_alpha = all_alpha
+        self.apply()
+
+        return True
+
+    def apply(self) -> None:
+        """材質透過用モーフのオフセットを作り直す"""
+        if MATERIAL_TRANSPARENT_NAME not in self.model.morphs:
+            return
+
+        offsets: list[MaterialMorphOffset] = [
+            self.create_offset(int(material_index), float(self.alphas[material_index]))
+            for material_index in np.where(self.alphas != 1.0)[0]
+        ]
+        if self.all_alpha != 1.0:
+            # 全材質透明化
+            offsets.append(self.create_offset(-1, self.all_alpha))
+
+        self.model.morphs[MATERIAL_TRANSPARENT_NAME].offsets = offsets
+
+    def create_offset(self, material_index: int, alpha: float) -> MaterialMorphOffset:
+        return MaterialMorphOffset(
+            material_index,
+            MaterialMorphCalcMode.ADDITION,
+            MVector4D(0.0, 0.0, 0.0, -abs(alpha - 1)),
+            MVector3D(0.0, 0.0, 0.0),
+            0.0,
+            MVector3D(0.0, 0.0, 0.0),
+            MVector4D(0.0, 0.0, 0.0, 0.0),
+            0.0,
+            MVector4D(0.0, 0.0, 0.0, 0.0),
+            MVector4D(0.0, 0.0, 0.0, 0.0),
+            MVector4D(0.0, 0.0, 0.0, 0.0),
+        )
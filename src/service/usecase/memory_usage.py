@@ -0,0 +1,61 @@
+import os
+from functools import lru_cache
+
+from PIL import Image
+
+from mlib.core.logger import MLogger
+from mlib.pmx.pmx_collection import PmxModel
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+# 要素ごとの推定メモリ量（Pythonオブジェクトとしての概算）
+VERTEX_BYTES = 800
+FACE_BYTES = 200
+BONE_BYTES = 3000
+MORPH_OFFSET_BYTES = 300
+
+# テクスチャを展開した時の1ピクセルあたりのバイト数（RGBA）
+TEXTURE_PIXEL_BYTES = 4
+
+
+def get_model_bytes(model: PmxModel, is_texture: bool = True) -> dict[str, int]:
+    """
+    モデルの種類別の推定メモリ量
+    is_texture: テクスチャ画像のサイズも見る（画像ごとに一度だけヘッダを読み、展開はしない）
+    """
+    model_bytes = {
+        "vertices": len(model.vertices) * VERTEX_BYTES,
+        "faces": len(model.faces) * FACE_BYTES,
+        "bones": len(model.bones) * BONE_BYTES,
+        "morphs": sum([len(morph.offsets) for morph in model.morphs]) * MORPH_OFFSET_BYTES,
+    }
+
+    if is_texture:
+        model_bytes["textures"] = sum([get_texture_bytes(texture.path) for texture in model.textures if texture.valid])
+
+    return model_bytes
+
+
+@lru_cache(maxsize=1024)
+def get_texture_bytes(texture_path: str) -> int:
+    """
+    テクスチャを展開した時の推定メモリ量（読めない画像は0）
+    段階の区切りごとに全モデル分を見るので、画像ごとに一度だけ読んで覚えておく
+    """
+    try:
+        with Image.open(texture_path) as image:
+            return image.size[0] * image.size[1] * TEXTURE_PIXEL_BYTES
+    except Exception:
+        return 0
+
+
+def get_rss_bytes() -> int:
+    """プロセスの物理メモリ使用量（psutilが無い環境では0）"""
+    try:
+        import psutil
+    except ImportError:
+        return 0
+
+    return int(psutil.Process().memory_info().rss)
@@ -0,0 +1,89 @@
+import os
+from collections import OrderedDict
+from typing import Optional
+
+from mlib.core.logger import MLogger
+from mlib.pmx.pmx_collection import PmxModel
+from service.usecase.memory_usage import get_model_bytes
+from service.usecase.model_layer import copy_model_layers
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+MODEL_CACHE_BYTES = 2 * 1024**3
+"""保持するモデルの推定メモリ量の上限"""
+
+
+class ModelCache:
+    """
+    最近読み込んだモデル（読み込み・フィッティング済み）の保持
+    推定メモリ量の上限を超えたら、最後に使ったのが古いものから捨てる
+    保持する時は読み込んだモデルをそのまま持ち、返す時だけ複製する
+    （画面操作で書き換わるのは調整・透過用のモーフだけで、モデルを使い始める時に作り直している）
+    """
+
+    def __init__(self, max_bytes: int = MODEL_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.data: OrderedDict[tuple, tuple[tuple, int]] = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        if key not in self.data:
+            return None
+
+        self.data.move_to_end(key)
+        return copy_model_layers(self.data[key][0])
+
+    def put(self, key: tuple, value: tuple, *models: Optional[PmxModel]) -> None:
+        """値をそのまま保持する。メモリ量はmodelsから推定する"""
+        if key in self.data:
+            self.total_bytes -= self.data.pop(key)[1]
+
+        # 読み込み時に作ったモデルは面を元モデルと共有しているので、同じ面は一度だけ数える
+        nbytes = 0
+        face_ids: set[int] = set()
+        for model in models:
+            if not model:
+                continue
+            nbytes += self.estimate_bytes(model, id(model.faces) in face_ids)
+            face_ids.add(id(model.faces))
+        if self.max_bytes < nbytes:
+            # 単体で上限を超える場合は保持しない
+            return
+
+        self.data[key] = (value, nbytes)
+        self.total_bytes += nbytes
+
+        while self.max_bytes < self.total_bytes:
+            _, (_, removed_bytes) = self.data.popitem(last=False)
+            self.total_bytes -= removed_bytes
+
+        logger.debug(f"モデルキャッシュ [{len(self.data)}][{self.total_bytes / 1024 ** 2:.1f}MB]")
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.total_bytes = 0
+
+    @staticmethod
+    def estimate_bytes(model: PmxModel, is_shared_faces: bool = False) -> int:
+        """
+        モデルの推定メモリ量（テクスチャはモデルに持たないので数えない）
+        is_shared_faces: 面を他のモデルと共有している場合、面は数えない
+        """
+        model_bytes = get_model_bytes(model, is_texture=False)
+        if is_shared_faces:
+            model_bytes["faces"] = 0
+        return sum(model_bytes.values())
+
+    @staticmethod
+    def get_file_key(*paths: str) -> tuple:
+        """
+        ファイルの組み合わせのキー（パス・サイズ・更新日時）
+        読み込み前に引けるように、ファイルの中身ではなく更新日時で同一性を判断する
+        """
+        keys = []
+        for path in paths:
+            stat = os.stat(path)
+            keys.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+        return tuple(keys)
@@ -0,0 +1,68 @@
+import os
+from copy import deepcopy
+from typing import Any
+
+from mlib.core.logger import MLogger
+from mlib.pmx.pmx_collection import PmxModel
+from mlib.pmx.pmx_part import MorphType
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+SHARED_SECTION_NAMES = ("faces", "textures", "joints")
+"""元モデルと共有する（読み込み・フィッティング中に書き換えない）区分"""
+
+SHARED_MORPH_TYPES = (
+    MorphType.VERTEX,
+    MorphType.UV,
+    MorphType.EXTENDED_UV1,
+    MorphType.EXTENDED_UV2,
+    MorphType.EXTENDED_UV3,
+    MorphType.EXTENDED_UV4,
+)
+"""オフセットを元モデルと共有するモーフ（頂点INDEXだけを持ち、ボーン追加でINDEXが変わらない）"""
+
+
+def create_model_layer(base: PmxModel) -> PmxModel:
+    """
+    元モデルを土台にして、書き換える部分だけを複製したモデルを作る
+    ボーン・頂点のウェイト・材質・モーフ（の一覧）・剛体・表示枠は複製し、
+    面・テクスチャ・ジョイント・頂点の位置/法線/UV・頂点/UVモーフのオフセットは元モデルと同じものを参照する
+    ※ 共有した部分は元モデル・複製したモデルのどちらからも書き換えないこと（書き換える場合は、その部分を copy してから差し替える）
+    """
+    return deepcopy(base, create_shared_memo(base))
+
+
+def copy_model_layers(values: tuple) -> tuple:
+    """
+    values に含まれるモデルを、create_model_layer と同じ部分を共有したまままとめて複製する
+    まとめて複製するので、モデル同士で参照しているもの（間引きメッシュと衣装のモーフなど）の関係はそのまま保たれる
+    """
+    return deepcopy(values, create_shared_memo(*[value for value in values if isinstance(value, PmxModel)]))
+
+
+def create_shared_memo(*models: PmxModel) -> dict[int, Any]:
+    """共有する部分を登録した deepcopy の memo（memo に自分自身を登録しておくと、複製せずにそのまま参照される）"""
+    memo: dict[int, Any] = {}
+
+    def share(value: Any) -> None:
+        if value is not None:
+            memo[id(value)] = value
+
+    for model in models:
+        for section_name in SHARED_SECTION_NAMES:
+            share(getattr(model, section_name))
+
+        for vertex in model.vertices:
+            share(vertex.position)
+            share(vertex.normal)
+            share(vertex.uv)
+            share(vertex.extended_uvs)
+
+        for morph in model.morphs:
+            if morph.morph_type in SHARED_MORPH_TYPES:
+                for offset in morph.offsets:
+                    share(offset)
+
+    return memo
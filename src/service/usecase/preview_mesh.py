@@ -0,0 +1,156 @@
+import os
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from mlib.core.logger import MLogger
+from mlib.pmx.pmx_collection import PmxModel
+from mlib.pmx.pmx_part import Face, Morph, MorphType, VertexMorphOffset
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+PREVIEW_VERTEX_COUNT = 100000
+"""間引きメッシュを作る頂点数（これ未満の衣装はそのまま表示する）"""
+
+PREVIEW_VERTEX_RATIO = 0.2
+"""間引きメッシュで残す頂点の割合（目安）"""
+
+PREVIEW_MESH_COUNT = 3
+"""保持する間引きメッシュの数（古いものから捨てる）"""
+
+
+class PreviewMesh:
+    """間引きメッシュ（残す元頂点INDEXと、材質別の元頂点INDEXでの面）"""
+
+    def __init__(self, vertex_indexes: np.ndarray, material_faces: list[np.ndarray]) -> None:
+        self.vertex_indexes = vertex_indexes
+        self.material_faces = material_faces
+
+
+class PreviewMeshes:
+    """
+    操作中に表示する衣装の間引きメッシュ
+    間引き結果は衣装のハッシュ別に直近 PREVIEW_MESH_COUNT 件まで保持し、頂点やモーフは読み込みのたびに衣装から写し直す
+    """
+
+    def __init__(self, count: int = PREVIEW_MESH_COUNT) -> None:
+        self.count = count
+        self.meshes: OrderedDict[str, PreviewMesh] = OrderedDict()
+
+    def create_model(self, dress: PmxModel) -> Optional[PmxModel]:
+        """間引きメッシュの衣装モデルを作る（頂点数が少ない場合はNone）"""
+        if len(dress.vertices) < PREVIEW_VERTEX_COUNT:
+            return None
+
+        if dress.digest not in self.meshes:
+            logger.info("衣装: 間引きメッシュ作成")
+            self.meshes[dress.digest] = self.decimate(dress)
+            while self.count < len(self.meshes):
+                self.meshes.popitem(last=False)
+        self.meshes.move_to_end(dress.digest)
+        mesh = self.meshes[dress.digest]
+
+        preview = PmxModel(dress.path)
+        preview.name = dress.name
+
+        for texture in dress.textures:
+            preview.textures.append(texture.copy(), is_sort=False)
+
+        for bone in dress.bones:
+            preview.bones.append(bone.copy())
+
+        # 代表頂点は元頂点そのものなので、ウェイトもそのまま引き継ぐ
+        vertex_map: dict[int, int] = {}
+        for vertex_index in mesh.vertex_indexes:
+            copy_vertex = dress.vertices[int(vertex_index)].copy()
+            copy_vertex.index = -1
+            vertex_map[int(vertex_index)] = len(preview.vertices)
+            preview.vertices.append(copy_vertex, is_sort=False)
+
+        for material, faces in zip(dress.materials, mesh.material_faces):
+            copy_material = material.copy()
+            copy_material.vertices_count = len(faces) * 3
+            preview.materials.append(copy_material, is_sort=False)
+
+            for face in faces:
+                preview.faces.append(
+                    Face(
+                        vertex_index0=vertex_map[int(face[0])],
+                        vertex_index1=vertex_map[int(face[1])],
+                        vertex_index2=vertex_map[int(face[2])],
+                    ),
+                    is_sort=False,
+                )
+
+        for morph in dress.morphs:
+            if morph.morph_type in (MorphType.BONE, MorphType.MATERIAL, MorphType.GROUP):
+                # ボーンや材質のモーフは衣装と同じモーフを使い、調整値の変更をそのまま反映させる
+                preview.morphs.append(morph)
+                continue
+
+            # 頂点INDEXを持つモーフは間引き後の頂点に付け替える（UV系は表示確認には不要なので空にする）
+            copy_morph = Morph(name=morph.name, english_name=morph.english_name)
+            copy_morph.is_system = morph.is_system
+            copy_morph.panel = morph.panel
+            copy_morph.morph_type = morph.morph_type
+            if morph.morph_type in (MorphType.VERTEX, MorphType.AFTER_VERTEX):
+                for offset in morph.offsets:
+                    vertex_offset: VertexMorphOffset = offset
+                    if vertex_offset.vertex_index in vertex_map:
+                        copy_morph.offsets.append(VertexMorphOffset(vertex_map[vertex_offset.vertex_index], vertex_offset.position.copy()))
+            preview.morphs.append(copy_morph)
+
+        preview.setup()
+
+        logger.debug(f"衣装: 間引きメッシュ [{len(dress.vertices)} -> {len(preview.vertices)}][{len(dress.faces)} -> {len(preview.faces)}]")
+
+        return preview
+
+    def decimate(self, dress: PmxModel) -> PreviewMesh:
+        """材質ごとにグリッドで頂点をまとめ、各セルの代表頂点だけで面を張り直す"""
+        positions = np.array([vertex.position.vector for vertex in dress.vertices])
+        faces = np.array([face.vertices for face in dress.faces], dtype=np.int64)
+
+        material_faces: list[np.ndarray] = []
+        prev_faces_count = 0
+        for material in dress.materials:
+            faces_count = material.vertices_count // 3
+            target_faces = faces[prev_faces_count : (prev_faces_count + faces_count)]
+            prev_faces_count += faces_count
+
+            if not len(target_faces):
+                material_faces.append(np.zeros((0, 3), dtype=np.int64))
+                continue
+
+            vertex_indexes = np.unique(target_faces)
+            target_positions = positions[vertex_indexes]
+            min_position = np.min(target_positions, axis=0)
+            extent = np.max(np.max(target_positions, axis=0) - min_position)
+
+            # 頂点は面上に並んでいるとみなし、使うセル数が頂点数×割合程度になる大きさにする
+            cell_count = max(1, int(np.sqrt(len(vertex_indexes) * PREVIEW_VERTEX_RATIO)))
+            cell_size = extent / cell_count if 0 < extent else 1.0
+            cells = np.floor((target_positions - min_position) / cell_size).astype(np.int64)
+            _, representatives, inverse = np.unique(cells, axis=0, return_index=True, return_inverse=True)
+
+            # 元頂点INDEX -> セルの代表頂点INDEX
+            representative_indexes = vertex_indexes[representatives][inverse.flatten()]
+            decimated_faces = representative_indexes[np.searchsorted(vertex_indexes, target_faces)]
+
+            # 潰れた面と重複した面を除く
+            decimated_faces = decimated_faces[
+                (decimated_faces[:, 0] != decimated_faces[:, 1])
+                & (decimated_faces[:, 1] != decimated_faces[:, 2])
+                & (decimated_faces[:, 2] != decimated_faces[:, 0])
+            ]
+            decimated_faces = np.unique(decimated_faces, axis=0)
+
+            # 全部潰れてしまうような小さい材質は、そのまま残す
+            material_faces.append(decimated_faces if len(decimated_faces) else target_faces)
+
+        vertex_indexes = np.unique(np.concatenate([faces.flatten() for faces in material_faces]))
+
+        return PreviewMesh(vertex_indexes, material_faces)
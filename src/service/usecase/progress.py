@@ -0,0 +1,74 @@
+import os
+from time import perf_counter
+
+from mlib.core.logger import MLogger
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+PROGRESS_INTERVAL = 0.1
+"""進捗を出力する間隔(秒)"""
+
+
+class Progress:
+    """
+    ループ中の進捗（段階名・処理済み件数・全体件数・残り時間）
+    update は値を覚えるだけで、前回の出力から一定時間経った時だけ一行にまとめて出力する
+    ループを抜けたら finish で最後の件数を出力する
+    """
+
+    def __init__(self, interval: float = PROGRESS_INTERVAL) -> None:
+        self.interval = interval
+        self.stage = ""
+        self.done = 0
+        self.total = 0
+        self.start_time = 0.0
+        self.output_time = 0.0
+
+    def start(self, stage: str, total: int) -> None:
+        """進捗を数える段階を始める"""
+        self.stage = stage
+        self.done = 0
+        self.total = total
+        self.start_time = perf_counter()
+        self.output_time = self.start_time
+
+    def update(self, done: int) -> None:
+        """処理済み件数を更新する（ループの中で毎回呼んでも良い）"""
+        self.done = done
+
+        now = perf_counter()
+        if now - self.output_time < self.interval:
+            return
+        self.output_time = now
+
+        self.output()
+
+    def finish(self) -> None:
+        """段階を終え、処理した件数を出力する（ループを抜けた後に呼ぶ）"""
+        self.done = self.total
+
+        logger.info(
+            "-- {s}: {d}/{t} (完了 {e}秒)",
+            s=__(self.stage),
+            d=self.done,
+            t=self.total,
+            e=f"{perf_counter() - self.start_time:.1f}",
+        )
+
+    @property
+    def eta(self) -> float:
+        """残り時間(秒)の見積もり"""
+        if not (0 < self.done < self.total):
+            return 0.0
+        return (perf_counter() - self.start_time) / self.done * (self.total - self.done)
+
+    def output(self) -> None:
+        logger.info(
+            "-- {s}: {d}/{t} (残り約{e}秒)",
+            s=__(self.stage),
+            d=self.done,
+            t=self.total,
+            e=f"{self.eta:.1f}",
+        )
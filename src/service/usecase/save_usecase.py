@@ -33,13 +33,29 @@ from mlib.pmx.pmx_writer import PmxWriter
 from mlib.utils.file_utils import separate_path
 from mlib.vmd.vmd_collection import VmdMotion
 from mlib.vmd.vmd_part import VmdMorphFrame
+from service.usecase.cancel_token import CancelToken
 from service.usecase.dress_bone import DressBones
+from service.usecase.progress import Progress
+from service.usecase.stage_timer import StageTimer
 
 logger = MLogger(os.path.basename(__file__), level=1)
 __ = logger.get_text
 
 
 class SaveUsecase:
+    def __init__(self, cancel_token: Optional[CancelToken] = None) -> None:
+        # 中断要求
+        self.cancel_token = cancel_token or CancelToken()
+        # 段階ごとの処理時間
+        self.timer = StageTimer()
+        # ループ中の進捗
+        self.progress = Progress()
+        # 出力先に書き込むテクスチャ（中断できなくなってからまとめて書き込む）
+        # 出力先パス -> コピー元パス
+        self.texture_copies: dict[str, str] = {}
+        # 出力先パス -> 色補正したテクスチャ画像
+        self.corrected_textures: dict[str, Image.Image] = {}
+
     def valid_output_path(
         self,
         model: PmxModel,
@@ -99,7 +115,11 @@ class SaveUsecase:
         dress_positions: dict[str, MVector3D],
         bone_target_dress: dict[str, bool],
     ) -> None:
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        self.timer.start("お着替えモデル出力")
+        self.timer.lap("出力設定")
+
+        self.texture_copies = {}
+        self.corrected_textures = {}
 
         model_motion = VmdMotion("model fit motion")
         if model_config_motion:
@@ -126,6 +146,10 @@ class SaveUsecase:
         dress_motion.morphs[dmf.name].append(dmf)
 
         dress_model = PmxModel(output_path)
+
+        self.timer.add_model("人物", model)
+        self.timer.add_model("衣装", dress)
+        self.timer.add_model("出力", dress_model)
         dress_model.model_name = model.name + "(" + dress.name + ")"
         dress_model.english_name = model.english_name + "(" + dress.english_name + ")"
         dress_model.extended_uv_count = max(model.extended_uv_count, dress.extended_uv_count)
@@ -183,22 +207,6 @@ class SaveUsecase:
             if alpha == 1.0 and material_name not in [__("ボーンライン"), __("全材質")]
         ]
 
-        with open(os.path.join(os.path.dirname(output_path), f"settings_{datetime.now():%Y%m%d_%H%M%S}.txt"), "w", encoding="utf-8") as f:
-            f.write(__("人物モデル") + "\n")
-            f.write(model.path + "\n")
-            f.write("\n")
-            f.write(__("人物モデル：出力対象材質") + "\n    ")
-            f.write(", ".join(model_output_material_names))
-            f.write("\n")
-            f.write(__("衣装モデル") + "\n")
-            f.write(dress.path + "\n")
-            f.write("\n")
-            f.write(__("衣装モデル：出力対象材質") + "\n    ")
-            f.write(", ".join(dress_output_material_names))
-            f.write("\n")
-            f.write(__("個別フィッティング") + "\n")
-            f.write("\n".join(fitting_messages))
-
         logger.info(
             "人物モデル: {m} ({p})\n  出力材質: {mm}\n衣装モデル: {d} ({q})\n  出力材質: {dm}\n個別フィッティング:\n  {f}",
             m=model.name,
@@ -211,6 +219,7 @@ class SaveUsecase:
         )
 
         logger.info("出力準備", decoration=MLogger.Decoration.LINE)
+        self.timer.lap("出力準備")
 
         # 衣装側の位置に合わせるボーンINDEXリスト
         dress_offset_bone_names = [
@@ -307,8 +316,11 @@ class SaveUsecase:
 
         dress_model_bones = DressBones()
         logger.info("ボーン出力", decoration=MLogger.Decoration.LINE)
+        self.timer.lap("ボーン出力")
+        self.progress.start("ボーン出力", len(model.bones) + len(dress.bones))
 
         for bone in model.bones:
+            self.cancel_token.check()
             if not (model.bone_trees.is_in_standard(bone.name) or bone.is_standard_extend):
                 # 準標準ではない場合、登録可否チェック
                 if [
@@ -394,10 +406,10 @@ class SaveUsecase:
             # 変形後の位置にボーンを配置する
             dress_model_bones.append(bone, is_dress=False, is_weight=is_weight, position=model_matrixes[0, bone.name].position.copy())
 
-            if not len(dress_model_bones) % 100:
-                logger.info("-- ボーン出力: {s}", s=len(dress_model_bones))
+            self.progress.update(len(dress_model_bones))
 
         for bone in dress.bones:
+            self.cancel_token.check()
             if (bone.is_standard or bone.is_standard_extend) and bone.name in dress_model_bones:
                 # 既に登録済みの準標準ボーンは追加しない
                 dress_model_bones.dress_map[bone.index] = dress_model_bones[bone.name].index
@@ -523,10 +535,13 @@ class SaveUsecase:
                 # そのまま追加する
                 dress_model_bones.append(bone, is_dress=True, is_weight=True, position=dress_bone_position)
 
-            if 0 == len(dress_model_bones) % 100:
-                logger.info("-- ボーン出力: {s}", s=len(dress_model_bones))
+            self.progress.update(len(dress_model_bones))
+
+        self.progress.finish()
 
         logger.info("ボーン定義再設定", decoration=MLogger.Decoration.LINE)
+        self.timer.lap("ボーン定義再設定")
+        self.progress.start("ボーン定義再設定", len(dress_model_bones))
 
         local_y_vector = MVector3D(0, -1, 0)
         for dress_model_bone in dress_model_bones:
@@ -583,9 +598,10 @@ class SaveUsecase:
 
             dress_model.bones.append(dress_model_bone.get_bone())
 
-            if 0 < len(dress_model.bones) and 0 == len(dress_model.bones) % 100:
-                logger.info("-- ボーン定義再設定: {s}", s=bone.index)
+            self.progress.update(len(dress_model.bones))
 
+        self.progress.finish()
+        self.progress.start("ボーン軸定義再設定", len(dress_model.bones))
         for bone in dress_model.bones:
             if bone.has_fixed_axis:
                 # 軸制限がある場合、合わせる
@@ -615,9 +631,9 @@ class SaveUsecase:
             #         )
             #         bone.layer = new_layer
 
-            if 0 < bone.index and not bone.index % 100:
-                logger.info("-- ボーン軸定義再設定: {s}", s=bone.index)
+            self.progress.update(bone.index)
 
+        self.progress.finish()
         model_all_bone_map: dict[int, int] = dict([(bone.index, dress_model_bones.model_map.get(bone.index, 0)) for bone in model.bones])
         dress_all_bone_map: dict[int, int] = dict([(bone.index, dress_model_bones.dress_map.get(bone.index, 0)) for bone in dress.bones])
 
@@ -631,13 +647,15 @@ class SaveUsecase:
         dress_material_map: dict[int, int] = {-1: -1}
 
         logger.info("材質出力", decoration=MLogger.Decoration.LINE)
+        self.timer.lap("材質出力")
+        self.progress.start("材質出力", len(model.materials) + len(dress.materials))
         model.update_vertices_by_material()
 
         material_cnt = 0
         prev_faces_count = 0
         for material in model.materials:
-            if not material_cnt % 10:
-                logger.info("-- 材質出力: {s}", s=material_cnt)
+            self.cancel_token.check()
+            self.progress.update(material_cnt)
             material_cnt += 1
 
             copied_material = model_materials[material.index].material.copy()
@@ -779,8 +797,8 @@ class SaveUsecase:
 
         prev_faces_count = 0
         for material in dress.materials:
-            if not material_cnt % 10:
-                logger.info("-- 材質出力: {s}", s=material_cnt)
+            self.cancel_token.check()
+            self.progress.update(material_cnt)
             material_cnt += 1
 
             copied_material = dress_materials[material.index].material.copy()
@@ -918,9 +936,13 @@ class SaveUsecase:
                         d=np.round(copied_material.diffuse.xyz.vector, decimals=1),
                     )
 
+        self.progress.finish()
+
         # ---------------------------------
 
         logger.info("モーフ出力", decoration=MLogger.Decoration.LINE)
+        self.timer.lap("モーフ出力")
+        self.progress.start("モーフ出力", len(model.morphs) + len(dress.morphs))
 
         # キー: 元々のINDEX、値: コピー先INDEX
         model_morph_map: dict[int, int] = {-1: -1}
@@ -928,6 +950,7 @@ class SaveUsecase:
 
         for is_group in (False, True):
             for morph in model.morphs:
+                self.cancel_token.check()
                 if (
                     morph.is_system
                     or (not is_group and morph.morph_type == MorphType.GROUP)
@@ -945,11 +968,11 @@ class SaveUsecase:
                     model_morph_map[morph.index] = len(dress_model.morphs)
                     dress_model.morphs.append(copy_morph)
 
-                if not len(dress_model.morphs) % 50:
-                    logger.info("-- モーフ出力: {s}", s=len(dress_model.morphs))
+                self.progress.update(len(dress_model.morphs))
 
         for is_group in (False, True):
             for morph in dress.morphs:
+                self.cancel_token.check()
                 if (
                     morph.is_system
                     or (not is_group and morph.morph_type == MorphType.GROUP)
@@ -969,18 +992,22 @@ class SaveUsecase:
                     dress_morph_map[morph.index] = len(dress_model.morphs)
                     dress_model.morphs.append(copy_morph)
 
-                if not len(dress_model.morphs) % 50:
-                    logger.info("-- モーフ出力: {s}", s=len(dress_model.morphs))
+                self.progress.update(len(dress_model.morphs))
+
+        self.progress.finish()
 
         # ---------------------------------
 
         logger.info("剛体出力", decoration=MLogger.Decoration.LINE)
+        self.timer.lap("剛体出力")
+        self.progress.start("剛体出力", len(model.rigidbodies) + len(dress.rigidbodies))
 
         # キー: 元々のINDEX、値: コピー先INDEX
         model_rigidbody_map: dict[int, int] = {-1: -1}
         dress_rigidbody_map: dict[int, int] = {-1: -1}
 
         for rigidbody in model.rigidbodies:
+            self.cancel_token.check()
             if 0 > rigidbody.bone_index:
                 # ボーンに紐付いていない剛体はとりあえず出力する
                 model_copy_rigidbody = rigidbody.copy()
@@ -1003,8 +1030,7 @@ class SaveUsecase:
                 model_rigidbody_map[rigidbody.index] = len(dress_model.rigidbodies)
                 dress_model.rigidbodies.append(model_copy_rigidbody)
 
-                if not len(dress_model.rigidbodies) % 50:
-                    logger.info("-- 剛体出力: {s}", s=len(dress_model.rigidbodies))
+                self.progress.update(len(dress_model.rigidbodies))
 
             elif (
                 rigidbody.is_system
@@ -1034,10 +1060,10 @@ class SaveUsecase:
             model_rigidbody_map[rigidbody.index] = len(dress_model.rigidbodies)
             dress_model.rigidbodies.append(model_copy_rigidbody)
 
-            if not len(dress_model.rigidbodies) % 50:
-                logger.info("-- 剛体出力: {s}", s=len(dress_model.rigidbodies))
+            self.progress.update(len(dress_model.rigidbodies))
 
         for rigidbody in dress.rigidbodies:
+            self.cancel_token.check()
             if 0 > rigidbody.bone_index:
                 # ボーンに紐付いていない剛体はとりあえず出力する
                 dress_copy_rigidbody = rigidbody.copy()
@@ -1063,8 +1089,7 @@ class SaveUsecase:
                 dress_rigidbody_map[rigidbody.index] = len(dress_model.rigidbodies)
                 dress_model.rigidbodies.append(dress_copy_rigidbody)
 
-                if not len(dress_model.rigidbodies) % 50:
-                    logger.info("-- 剛体出力: {s}", s=len(dress_model.rigidbodies))
+                self.progress.update(len(dress_model.rigidbodies))
 
             if (
                 rigidbody.is_system
@@ -1119,14 +1144,18 @@ class SaveUsecase:
             dress_rigidbody_map[rigidbody.index] = len(dress_model.rigidbodies)
             dress_model.rigidbodies.append(dress_copy_rigidbody)
 
-            if not len(dress_model.rigidbodies) % 50:
-                logger.info("-- 剛体出力: {s}", s=len(dress_model.rigidbodies))
+            self.progress.update(len(dress_model.rigidbodies))
+
+        self.progress.finish()
 
         # ---------------------------------
 
         logger.info("ジョイント出力", decoration=MLogger.Decoration.LINE)
+        self.timer.lap("ジョイント出力")
+        self.progress.start("ジョイント出力", len(model.joints) + len(dress.joints))
 
         for joint in model.joints:
+            self.cancel_token.check()
             if joint.is_system:
                 continue
             if not (joint.rigidbody_index_a in model_rigidbody_map and joint.rigidbody_index_b in model_rigidbody_map):
@@ -1152,10 +1181,10 @@ class SaveUsecase:
 
             dress_model.joints.append(model_copy_joint)
 
-            if not len(dress_model.joints) % 50:
-                logger.info("-- ジョイント出力: {s}", s=len(dress_model.joints))
+            self.progress.update(len(dress_model.joints))
 
         for joint in dress.joints:
+            self.cancel_token.check()
             if joint.is_system:
                 continue
             if not (joint.rigidbody_index_a in dress_rigidbody_map and joint.rigidbody_index_b in dress_rigidbody_map):
@@ -1183,14 +1212,17 @@ class SaveUsecase:
 
             dress_model.joints.append(dress_copy_joint)
 
-            if not len(dress_model.joints) % 50:
-                logger.info("-- ジョイント出力: {s}", s=len(dress_model.joints))
+            self.progress.update(len(dress_model.joints))
+
+        self.progress.finish()
 
         # ---------------------------------
 
         logger.info("表示枠出力", decoration=MLogger.Decoration.LINE)
+        self.timer.lap("表示枠出力")
 
         # まずは人物側の表情を表情順に入れる
+        self.progress.start("モーフ表示枠出力", len(model.morphs) + len(dress.morphs))
         morph_cnt = 0
         for morph in model.morphs:
             if morph.name not in dress_model.morphs:
@@ -1205,8 +1237,7 @@ class SaveUsecase:
                 )
 
                 morph_cnt += 1
-                if morph_cnt % 100 == 0:
-                    logger.info("-- モーフ表示枠出力: {s}", s=morph_cnt)
+                self.progress.update(morph_cnt)
 
         # その後、衣装側の表情を入れる
         for morph in dress.morphs:
@@ -1227,11 +1258,14 @@ class SaveUsecase:
                 )
 
                 morph_cnt += 1
-                if morph_cnt % 100 == 0:
-                    logger.info("-- モーフ表示枠出力: {s}", s=morph_cnt)
+                self.progress.update(morph_cnt)
+
+        self.progress.finish()
 
         dress_display_slot_indexes: dict[int, int] = {}
 
+        self.progress.start("ボーン表示枠出力", len(dress_model.bones))
+
         for bone in dress_model.bones:
             if 0 == bone.index:
                 # 全親は単品で追加
@@ -1306,11 +1340,12 @@ class SaveUsecase:
                 )
                 dress_display_slot_indexes[bone.index] = dress_model.display_slots[bone.name].index
 
-            if not bone.index % 100:
-                logger.info("-- ボーン表示枠出力: {s}", s=bone.index)
+            self.progress.update(bone.index)
 
+        self.progress.finish()
+        self.progress.start("不要ボーン除去", len(dress_model.bones))
         for bone in dress_model.bones:
-            logger.count("不要ボーン除去", index=bone.index, total_index_count=len(dress_model.bones), display_block=100)
+            self.progress.update(bone.index)
 
             if bone.is_ik and 0 > bone.ik.bone_index:
                 # IKターゲットが無い場合、出力対象外にする
@@ -1324,19 +1359,65 @@ class SaveUsecase:
                 # 握り拡散系は除外
                 dress_model.remove_bone(bone.name)
 
+        self.progress.finish()
+
+        # 書き込み始めたら中断しない
+        self.cancel_token.check()
+
+        # 設定ファイルは中断できなくなってから書く（中断した時に出力先へ残さない）
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        with open(os.path.join(os.path.dirname(output_path), f"settings_{datetime.now():%Y%m%d_%H%M%S}.txt"), "w", encoding="utf-8") as f:
+            f.write(__("人物モデル") + "\n")
+            f.write(model.path + "\n")
+            f.write("\n")
+            f.write(__("人物モデル：出力対象材質") + "\n    ")
+            f.write(", ".join(model_output_material_names))
+            f.write("\n")
+            f.write(__("衣装モデル") + "\n")
+            f.write(dress.path + "\n")
+            f.write("\n")
+            f.write(__("衣装モデル：出力対象材質") + "\n    ")
+            f.write(", ".join(dress_output_material_names))
+            f.write("\n")
+            f.write(__("個別フィッティング") + "\n")
+            f.write("\n".join(fitting_messages))
+
+        self.timer.lap("テクスチャ出力")
+        self.save_textures()
+
         logger.info("モデル出力", decoration=MLogger.Decoration.LINE)
+        self.timer.lap("モデル出力")
 
         PmxWriter(dress_model, output_path).save()
 
+        self.timer.end()
+
+    def save_textures(self) -> None:
+        """溜めておいたテクスチャを出力先に書き込む"""
+        for new_texture_path, texture_path in self.texture_copies.items():
+            os.makedirs(os.path.dirname(new_texture_path), exist_ok=True)
+            shutil.copyfile(texture_path, new_texture_path)
+
+        for corrected_texture_path, corrected_image in self.corrected_textures.items():
+            os.makedirs(os.path.dirname(corrected_texture_path), exist_ok=True)
+            corrected_image.save(corrected_texture_path)
+
     def override_texture(self, model: PmxModel, copied_material: Material, copied_texture: Texture, override_base_colors: list[int]):
-        if not copied_texture or not copied_texture.valid:
+        if not copied_texture:
+            return
+
+        # 出力先へのコピーは後で行うので、コピー元の画像を読む
+        copied_texture_path = os.path.abspath(os.path.join(os.path.dirname(model.path), copied_texture.name))
+        texture_path = self.texture_copies.get(copied_texture_path, copied_texture.path)
+        if not (texture_path and os.path.isfile(texture_path)):
             return
 
         logger.info("テクスチャ色補正 [{t}]", t=copied_material.name, decoration=MLogger.Decoration.LINE)
         model.update_vertices_by_material()
 
         # 上書き元のテクスチャ画像
-        copied_image = np.array(Image.open(copied_texture.path).convert("RGBA"), np.float64)
+        copied_image = np.array(Image.open(texture_path).convert("RGBA"), np.float64)
         # 補正テクスチャ画像
         corrected_image = np.asarray(np.copy(copied_image))
 
@@ -1347,8 +1428,9 @@ class SaveUsecase:
 
         # 衣装の指定材質に割り当てられた頂点INDEXが配置されている3次元頂点の位置
         vertex_colors: list[np.ndarray] = []
+        self.progress.start("衣装テクスチャ色取得", len(vertex_indexes))
         for i, vertex_index in enumerate(vertex_indexes):
-            logger.count("衣装テクスチャ色取得", i, len(vertex_indexes), display_block=500)
+            self.progress.update(i)
 
             vertex = model.vertices[vertex_index]
 
@@ -1358,6 +1440,8 @@ class SaveUsecase:
 
             vertex_colors.append(copied_image[dv, du, :3])
 
+        self.progress.finish()
+
         if vertex_colors:
             base_median_color = np.array(override_base_colors)
             vertex_median_color = np.median(vertex_colors, axis=0)
@@ -1387,9 +1471,8 @@ class SaveUsecase:
         model.textures.append(corrected_copied_texture)
         copied_material.texture_index = corrected_copied_texture.index
 
-        # 補正後のテクスチャを保存する
-        corrected_dress_output = Image.fromarray(corrected_image.astype(np.uint8))
-        corrected_dress_output.save(dress_correct_image_path)
+        # 補正後のテクスチャは、中断できなくなってから保存する
+        self.corrected_textures[dress_correct_image_path] = Image.fromarray(corrected_image.astype(np.uint8))
 
     def copy_texture(self, dest_model: PmxModel, texture: Texture, src_model_path: str, is_dress: bool) -> Optional[Texture]:
         copy_texture_name = os.path.join("Costume", texture.name) if is_dress else texture.name
@@ -1415,8 +1498,8 @@ class SaveUsecase:
                     decoration=MLogger.Decoration.BOX,
                 )
                 return None
-            os.makedirs(os.path.dirname(new_texture_path), exist_ok=True)
-            shutil.copyfile(texture_path, new_texture_path)
+            # 中断できなくなってからコピーする
+            self.texture_copies[os.path.abspath(new_texture_path)] = texture_path
         else:
             return None
         copy_texture.index = len(dest_model.textures)
@@ -0,0 +1,223 @@
+import json
+import os
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Iterator
+
+from mlib.core.logger import MLogger
+from mlib.pmx.pmx_collection import PmxModel
+from service.usecase.memory_usage import get_model_bytes, get_rss_bytes
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+# コンソールに出力する、時間のかかった段階の数
+SUMMARY_COUNT = 10
+
+
+class StageTime:
+    """
+    段階ごとの所要時間（同じ段階を複数回通った場合は合算する）
+    メモリ計測中の場合、段階中のピークと段階後に残ったメモリ量も持つ
+    """
+
+    def __init__(self, name: str, is_lap: bool = False) -> None:
+        self.name = name
+        self.is_lap = is_lap
+        self.elapsed = 0.0
+        self.count = 0
+        self.start_time = 0.0
+        self.children: dict[str, "StageTime"] = {}
+
+        self.is_memory = False
+        self.start_memory = 0
+        self.running_peak_memory = 0
+        # 段階開始時からの増分のピーク
+        self.peak_bytes = 0
+        # 段階開始時から終了時までの増分（合算）
+        self.retained_bytes = 0
+        # 段階終了時の物理メモリ使用量
+        self.rss_bytes = 0
+        # 段階終了時のモデル別・種類別の推定メモリ量
+        self.model_bytes: dict[str, dict[str, int]] = {}
+
+    @property
+    def self_elapsed(self) -> float:
+        """子の段階を除いた、この段階自体の所要時間"""
+        return max(0.0, self.elapsed - sum([child.elapsed for child in self.children.values()]))
+
+    def to_dict(self) -> dict[str, Any]:
+        stage_dict: dict[str, Any] = {
+            "name": self.name,
+            "elapsed": round(self.elapsed, 6),
+            "self_elapsed": round(self.self_elapsed, 6),
+            "count": self.count,
+        }
+        if self.is_memory:
+            stage_dict["peak_bytes"] = self.peak_bytes
+            stage_dict["retained_bytes"] = self.retained_bytes
+            stage_dict["rss_bytes"] = self.rss_bytes
+            stage_dict["model_bytes"] = self.model_bytes
+        stage_dict["children"] = [child.to_dict() for child in self.children.values()]
+        return stage_dict
+
+
+class StageTimer:
+    """
+    読み込みや出力の段階ごとの所要時間を階層で計測する
+    stage は with で囲んだ範囲を、lap は次の lap もしくは親の end までを一つの段階として計測する
+    tracemalloc で計測中の場合（起動引数 --trace_memory）、段階ごとのメモリ量も計測する
+    """
+
+    def __init__(self) -> None:
+        self.root = StageTime("")
+        self.stack: list[StageTime] = [self.root]
+        # メモリ量を見るモデル（計測のためにモデルを生かしておかないよう、弱参照で持つ）
+        self.models: dict[str, weakref.ref] = {}
+
+    def __getstate__(self) -> dict[str, Any]:
+        # 子プロセスから返す時、弱参照は送れないので外す
+        state = self.__dict__.copy()
+        state["models"] = {}
+        return state
+
+    def add_model(self, label: str, model: PmxModel) -> None:
+        """段階終了時に種類別のメモリ量を見るモデルを追加する"""
+        self.models[label] = weakref.ref(model)
+
+    def start(self, name: str, is_lap: bool = False) -> None:
+        """段階の計測を始める"""
+        parent = self.stack[-1]
+        if name not in parent.children:
+            parent.children[name] = StageTime(name, is_lap)
+        stage = parent.children[name]
+        stage.count += 1
+        if tracemalloc.is_tracing():
+            stage.is_memory = True
+            stage.start_memory = self.sample_memory()
+            stage.running_peak_memory = stage.start_memory
+        stage.start_time = perf_counter()
+        self.stack.append(stage)
+
+    def finish(self) -> None:
+        """計測中の段階を一つ終える"""
+        stage = self.stack[-1]
+        stage.elapsed += perf_counter() - stage.start_time
+        if stage.is_memory:
+            current_memory = self.sample_memory()
+            stage.peak_bytes = max(stage.peak_bytes, stage.running_peak_memory - stage.start_memory)
+            stage.retained_bytes += current_memory - stage.start_memory
+            stage.rss_bytes = get_rss_bytes()
+            stage.model_bytes = dict(
+                [(label, get_model_bytes(model_ref())) for label, model_ref in self.models.items() if model_ref() is not None]
+            )
+        self.stack.pop()
+
+    def end(self) -> None:
+        """直近の段階の計測を終える（途中の lap も一緒に終える）"""
+        while 1 < len(self.stack):
+            is_lap = self.stack[-1].is_lap
+            self.finish()
+            if not is_lap:
+                break
+
+    def lap(self, name: str) -> None:
+        """同じ階層で計測中の lap を終えて、次の lap を始める"""
+        if self.stack[-1].is_lap:
+            self.finish()
+        self.start(name, is_lap=True)
+
+    def sample_memory(self) -> int:
+        """
+        現在のメモリ量を返し、前回からのピークを計測中の全段階に反映する
+        段階ごとにピークを取れるように、tracemalloc のピークはその都度リセットする
+        """
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for stage in self.stack[1:]:
+            stage.running_peak_memory = max(stage.running_peak_memory, peak_memory)
+        return current_memory
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def to_dict(self) -> list[dict[str, Any]]:
+        return [child.to_dict() for child in self.root.children.values()]
+
+    def save(self, output_path: str) -> None:
+        """計測結果をJSONで出力する"""
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def get_stages(self) -> list[tuple[str, float, float]]:
+        """全段階のパス・所要時間・子の段階を除いた所要時間を、計測順に返す"""
+        stages: list[tuple[str, float, float]] = []
+
+        def collect(stage: StageTime, path: str) -> None:
+            for child in stage.children.values():
+                child_path = f"{path} > {child.name}" if path else child.name
+                stages.append((child_path, child.elapsed, child.self_elapsed))
+                collect(child, child_path)
+
+        collect(self.root, "")
+
+        return stages
+
+    def get_summary(self, count: int = SUMMARY_COUNT) -> list[tuple[str, float, float]]:
+        """子の段階を除いた所要時間が長い順に、段階のパス・所要時間・全体に占める割合を返す"""
+        stages = sorted([(path, self_elapsed) for path, _, self_elapsed in self.get_stages()], key=lambda x: -x[1])
+
+        total_elapsed = sum([child.elapsed for child in self.root.children.values()]) or 1.0
+        return [(path, elapsed, elapsed / total_elapsed) for path, elapsed in stages[:count]]
+
+    def get_memory_summary(self, count: int = SUMMARY_COUNT) -> list[tuple[str, int, int]]:
+        """メモリのピークが大きい順に、段階のパス・ピーク・残ったメモリ量を返す"""
+        stages: list[tuple[str, int, int]] = []
+
+        def collect(stage: StageTime, path: str) -> None:
+            for child in stage.children.values():
+                child_path = f"{path} > {child.name}" if path else child.name
+                if child.is_memory:
+                    stages.append((child_path, child.peak_bytes, child.retained_bytes))
+                collect(child, child_path)
+
+        collect(self.root, "")
+
+        return sorted(stages, key=lambda x: -x[1])[:count]
+
+    def output_summary(self, count: int = SUMMARY_COUNT) -> None:
+        """所要時間の長い段階をコンソールに出力する"""
+        summary = self.get_summary(count)
+        if not summary:
+            return
+
+        logger.info(
+            "処理時間の内訳（上位{c}件）\n{s}",
+            c=len(summary),
+            s="\n".join([f"  {elapsed:8.2f}s ({ratio * 100:5.1f}%) {path}" for path, elapsed, ratio in summary]),
+            decoration=MLogger.Decoration.LINE,
+        )
+
+        memory_summary = self.get_memory_summary(count)
+        if not memory_summary:
+            return
+
+        logger.info(
+            "メモリ使用量の内訳（上位{c}件）\n{s}",
+            c=len(memory_summary),
+            s="\n".join(
+                [
+                    f"  ピーク {peak_bytes / 1024 ** 2:8.1f}MB / 残存 {retained_bytes / 1024 ** 2:8.1f}MB {path}"
+                    for path, peak_bytes, retained_bytes in memory_summary
+                ]
+            ),
+            decoration=MLogger.Decoration.LINE,
+        )
@@ -0,0 +1,204 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+from mlib.core.logger import MLogger
+from mlib.core.math import MVector2D, MVector3D, MVector4D
+from mlib.pmx.bone_setting import BoneFlg
+from mlib.pmx.pmx_collection import PmxModel
+from mlib.pmx.pmx_part import Bdef2, Bone, Face, Joint, Material, Morph, MorphType, RigidBody, Vertex, VertexMorphOffset
+from service.usecase.dress_bone_setting import DRESS_STANDARD_BONE_NAMES
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+# 生成する体の骨格（ボーン名, 親ボーン名, 位置, 体の半径）
+# 足りない準標準ボーンは読み込み時に追加されるので、主要なボーンだけ置く
+SYNTHETIC_SKELETON: list[tuple[str, str, tuple[float, float, float], float]] = [
+    ("全ての親", "", (0.0, 0.0, 0.0), 0.0),
+    ("センター", "全ての親", (0.0, 8.0, 0.0), 0.0),
+    ("グルーブ", "センター", (0.0, 8.2, 0.0), 0.0),
+    ("腰", "グルーブ", (0.0, 12.0, 0.3), 1.4),
+    ("下半身", "腰", (0.0, 12.5, 0.3), 1.5),
+    ("上半身", "腰", (0.0, 12.5, 0.3), 1.3),
+    ("上半身2", "上半身", (0.0, 13.8, 0.2), 1.4),
+    ("首", "上半身2", (0.0, 16.4, 0.3), 0.4),
+    ("頭", "首", (0.0, 17.4, 0.2), 1.1),
+    ("左肩", "上半身2", (0.4, 16.0, 0.3), 0.5),
+    ("左腕", "左肩", (1.6, 15.6, 0.4), 0.5),
+    ("左ひじ", "左腕", (3.8, 13.6, 0.5), 0.4),
+    ("左手首", "左ひじ", (5.8, 11.8, 0.2), 0.3),
+    ("右肩", "上半身2", (-0.4, 16.0, 0.3), 0.5),
+    ("右腕", "右肩", (-1.6, 15.6, 0.4), 0.5),
+    ("右ひじ", "右腕", (-3.8, 13.6, 0.5), 0.4),
+    ("右手首", "右ひじ", (-5.8, 11.8, 0.2), 0.3),
+    ("左足", "下半身", (0.9, 11.5, 0.2), 0.8),
+    ("左ひざ", "左足", (1.0, 6.3, 0.0), 0.6),
+    ("左足首", "左ひざ", (1.1, 1.2, 0.6), 0.4),
+    ("左つま先", "左足首", (1.2, 0.1, -1.2), 0.3),
+    ("右足", "下半身", (-0.9, 11.5, 0.2), 0.8),
+    ("右ひざ", "右足", (-1.0, 6.3, 0.0), 0.6),
+    ("右足首", "右ひざ", (-1.1, 1.2, 0.6), 0.4),
+    ("右つま先", "右足首", (-1.2, 0.1, -1.2), 0.3),
+]
+
+# 追加ボーン（スカート・髪など）を繋げる親ボーン名
+EXTRA_BONE_PARENT_NAMES = ["下半身", "頭"]
+
+# 追加ボーンの一本あたりの長さ
+EXTRA_BONE_CHAIN_LENGTH = 4
+
+
+class SyntheticModel:
+    """
+    性能計測用に、準標準ボーンを持つ人物・衣装モデルを乱数で生成する
+    同じシードと要素数であれば、同じモデルが生成される
+    """
+
+    def __init__(self, seed: int = 0) -> None:
+        self.seed = seed
+
+    def create(
+        self,
+        name: str,
+        vertex_count: int,
+        bone_count: int,
+        morph_count: int,
+        material_count: int,
+        rigidbody_count: int,
+        scale: tuple[float, float, float] = (1.0, 1.0, 1.0),
+        thickness: float = 1.0,
+        path: Optional[str] = None,
+    ) -> PmxModel:
+        """
+        モデルを生成する
+        bone_count: 準標準ボーン以外に追加するボーンの数
+        scale: 骨格の縮尺（衣装を人物と少しずらすのに使う）
+        thickness: 体の半径に掛ける倍率（衣装は人物より少し外側に頂点を置く）
+        """
+        rng = np.random.default_rng(self.seed)
+
+        model = PmxModel(path or "")
+        model.model_name = name
+        model.english_name = name
+        model.initialize_display_slots()
+
+        self.create_bones(model, bone_count, np.array(scale))
+        self.create_vertices(model, rng, vertex_count, material_count, thickness)
+        self.create_morphs(model, rng, morph_count)
+        self.create_rigidbodies(model, rigidbody_count)
+
+        model.setup()
+
+        return model
+
+    def create_bones(self, model: PmxModel, bone_count: int, scale: np.ndarray) -> None:
+        for bone_name, parent_name, position, _ in SYNTHETIC_SKELETON:
+            bone = Bone(len(model.bones), bone_name, bone_name)
+            bone.position = MVector3D(*(np.array(position) * scale))
+            bone.parent_index = model.bones[parent_name].index if parent_name else -1
+            bone.bone_flg = DRESS_STANDARD_BONE_NAMES[bone_name].flag
+            model.bones.append(bone)
+
+        for n in range(bone_count):
+            # 追加ボーンは親ボーンの周りに垂らす
+            chain_index, chain_position = divmod(n, EXTRA_BONE_CHAIN_LENGTH)
+            parent_bone = model.bones[EXTRA_BONE_PARENT_NAMES[chain_index % len(EXTRA_BONE_PARENT_NAMES)]]
+            angle = chain_index * 2.399963
+            bone = Bone(len(model.bones), f"追加{chain_index:03d}_{chain_position}", f"extra{chain_index:03d}_{chain_position}")
+            bone.position = parent_bone.position + MVector3D(
+                np.cos(angle) * 1.5,
+                -(chain_position + 1) * 0.8,
+                np.sin(angle) * 1.5,
+            )
+            bone.parent_index = model.bones[f"追加{chain_index:03d}_{chain_position - 1}"].index if chain_position else parent_bone.index
+            bone.bone_flg = BoneFlg.CAN_ROTATE | BoneFlg.CAN_MANIPULATE | BoneFlg.IS_VISIBLE
+            bone.tail_position = MVector3D(0, -0.8, 0)
+            model.bones.append(bone)
+
+        # 子ボーンがある場合、表示先は最初の子ボーンにする
+        for bone in reversed(model.bones):
+            if 0 <= bone.parent_index:
+                parent_bone = model.bones[bone.parent_index]
+                parent_bone.tail_index = bone.index
+                parent_bone.bone_flg |= BoneFlg.TAIL_IS_BONE
+
+    def create_vertices(self, model: PmxModel, rng: np.random.Generator, vertex_count: int, material_count: int, thickness: float) -> None:
+        """ボーンから子ボーンに向かう円柱状に頂点を置き、材質ごとに連続する頂点で面を張る"""
+        radiuses = dict([(bone_name, radius) for bone_name, _, _, radius in SYNTHETIC_SKELETON])
+        segments = [
+            (bone, model.bones[bone.tail_index], radiuses.get(bone.name, 0.3) * thickness)
+            for bone in model.bones
+            if 0 <= bone.tail_index and 0 < radiuses.get(bone.name, 0.3)
+        ]
+
+        segment_indexes = np.sort(rng.integers(0, len(segments), vertex_count))
+        ratios = rng.random(vertex_count)
+        angles = rng.random(vertex_count) * np.pi * 2
+
+        for segment_index, ratio, angle in zip(segment_indexes, ratios, angles):
+            bone, tail_bone, radius = segments[segment_index]
+            normal = np.array([np.cos(angle), 0.0, np.sin(angle)])
+            position = bone.position.vector + (tail_bone.position.vector - bone.position.vector) * ratio + normal * radius
+
+            vertex = Vertex()
+            vertex.position = MVector3D(*position)
+            vertex.normal = MVector3D(*normal)
+            vertex.uv = MVector2D(angle / (np.pi * 2), ratio)
+            vertex.deform = Bdef2(bone.index, tail_bone.index, float(1 - ratio))
+            vertex.edge_factor = 1.0
+            model.vertices.append(vertex, is_sort=False)
+
+        # 材質ごとに頂点を均等に分ける
+        for material_index, vertex_indexes in enumerate(np.array_split(np.arange(vertex_count), max(1, material_count))):
+            material = Material(name=f"材質{material_index:03d}")
+            material.english_name = f"material{material_index:03d}"
+            material.diffuse = MVector4D(0.8, 0.8, 0.8, 1.0)
+            material.ambient = MVector3D(0.4, 0.4, 0.4)
+            for n in range(len(vertex_indexes) - 2):
+                model.faces.append(
+                    Face(
+                        vertex_index0=int(vertex_indexes[n]),
+                        vertex_index1=int(vertex_indexes[n + 1]),
+                        vertex_index2=int(vertex_indexes[n + 2]),
+                    ),
+                    is_sort=False,
+                )
+            material.vertices_count = max(0, len(vertex_indexes) - 2) * 3
+            model.materials.append(material, is_sort=False)
+
+    def create_morphs(self, model: PmxModel, rng: np.random.Generator, morph_count: int) -> None:
+        """頂点の一部を動かす頂点モーフを作る"""
+        for morph_index in range(morph_count):
+            morph = Morph(name=f"モーフ{morph_index:03d}")
+            morph.english_name = f"morph{morph_index:03d}"
+            morph.morph_type = MorphType.VERTEX
+            vertex_indexes = rng.choice(len(model.vertices), max(1, len(model.vertices) // 20), replace=False)
+            for vertex_index, offset in zip(vertex_indexes, rng.normal(0, 0.05, (len(vertex_indexes), 3))):
+                morph.offsets.append(VertexMorphOffset(int(vertex_index), MVector3D(*offset)))
+            model.morphs.append(morph)
+
+    def create_rigidbodies(self, model: PmxModel, rigidbody_count: int) -> None:
+        """ボーンの位置に剛体を置き、同じ親を持つ剛体同士をジョイントで繋ぐ"""
+        bone_rigidbody_indexes: dict[int, int] = {}
+        for n in range(rigidbody_count):
+            bone = model.bones[n % len(model.bones)]
+            rigidbody = RigidBody(name=f"剛体{n:03d}")
+            rigidbody.index = len(model.rigidbodies)
+            rigidbody.english_name = f"rigidbody{n:03d}"
+            rigidbody.bone_index = bone.index
+            rigidbody.shape_position = bone.position.copy()
+            rigidbody.shape_size = MVector3D(0.5, 0.5, 0.5)
+            model.rigidbodies.append(rigidbody)
+
+            if bone.parent_index in bone_rigidbody_indexes:
+                joint = Joint(name=f"ジョイント{n:03d}")
+                joint.index = len(model.joints)
+                joint.english_name = f"joint{n:03d}"
+                joint.rigidbody_index_a = bone_rigidbody_indexes[bone.parent_index]
+                joint.rigidbody_index_b = rigidbody.index
+                joint.position = bone.position.copy()
+                model.joints.append(joint)
+            bone_rigidbody_indexes[bone.index] = rigidbody.index
@@ -17,13 +17,19 @@ __ = logger.get_text
 class LoadMotionWorker(BaseWorker):
     def __init__(self, frame: BaseFrame, result_event: wx.Event) -> None:
         super().__init__(frame, result_event)
+        # 処理を始めた時のログの位置（ここから後だけを処理ごとのログに出力する）
+        self.log_mark: Optional[tuple[int, int]] = None
+
+    def start(self) -> None:
+        self.log_mark = self.frame.log_sink.mark()
+        super().start()
 
     def thread_execute(self) -> None:
         file_panel: FilePanel = self.frame.file_panel
         motion: Optional[VmdMotion] = None
 
         if file_panel.motion_ctrl.valid() and not file_panel.motion_ctrl.data:
-            motion = file_panel.motion_ctrl.reader.read_by_filepath(file_panel.motion_ctrl.path)
+            motion = file_panel.motion_reader.read_by_filepath(file_panel.motion_ctrl.path)
         elif file_panel.motion_ctrl.original_data:
             motion = file_panel.motion_ctrl.original_data
         else:
@@ -35,5 +41,5 @@ class LoadMotionWorker(BaseWorker):
         file_panel: FilePanel = self.frame.file_panel
         output_log_path = os.path.join(get_root_dir(), f"{os.path.basename(file_panel.output_pmx_ctrl.path)}.log")
 
-        # 出力されたメッセージを全部出力
-        file_panel.console_ctrl.text_ctrl.SaveFile(filename=output_log_path)
+        # 逐次書き出しているログをコピーする（コンソールには最近の行しか残っていない）
+        self.frame.log_sink.save(output_log_path, self.log_mark)
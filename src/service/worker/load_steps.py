@@ -0,0 +1,223 @@
+import os
+from typing import Optional, Union
+
+from mlib.core.logger import MLogger
+from mlib.pmx.pmx_collection import PmxModel
+from mlib.pmx.pmx_reader import PmxReader
+from mlib.vmd.vmd_collection import VmdMotion
+from mlib.vmd.vmd_reader import VmdReader
+from service.usecase.fitting_trace import FittingTrace
+from service.usecase.load_usecase import LoadUsecase
+from service.usecase.model_layer import create_model_layer
+from service.usecase.preview_mesh import PreviewMeshes
+from service.usecase.stage_timer import StageTimer
+from service.worker.prefetch_reader import PrefetchReader
+
+logger = MLogger(os.path.basename(__file__), level=1)
+__ = logger.get_text
+
+
+def load_model(usecase: LoadUsecase, reader: Union[PmxReader, PrefetchReader], model_path: str) -> tuple[PmxModel, PmxModel]:
+    """人物モデルを読み込んで、追加セットアップまで行う"""
+    logger.info("人物: 読み込み開始", decoration=MLogger.Decoration.BOX)
+
+    usecase.timer.start("人物")
+    usecase.timer.lap("読み込み")
+
+    # 人物を読み直す場合、前の人物と衣装の統計は使わない
+    usecase.clear_bone_statistics()
+    original_model = reader.read_by_filepath(model_path)
+
+    usecase.valid_model(original_model, "人物")
+    usecase.cancel_token.check()
+
+    # 面やテクスチャなど書き換えない部分は元モデルと共有する
+    model = create_model_layer(original_model)
+
+    usecase.timer.add_model("人物(元)", original_model)
+    usecase.timer.add_model("人物", model)
+
+    # 首根元にウェイトを振る
+    usecase.timer.lap("ウェイト調整")
+    usecase.replace_neck_root_weights(model)
+    model.update_vertices_by_bone()
+
+    # 人物に材質透明モーフを入れる
+    logger.info("人物: 追加セットアップ: 材質透過モーフ追加")
+    usecase.timer.lap("材質透過モーフ追加")
+    usecase.create_material_transparent_morphs(model)
+
+    usecase.timer.end()
+
+    return original_model, model
+
+
+def load_dress(
+    usecase: LoadUsecase,
+    reader: Union[PmxReader, PrefetchReader],
+    dress_path: str,
+    model: PmxModel,
+    preview_meshes: Optional[PreviewMeshes],
+) -> tuple[PmxModel, PmxModel, list[str], list[list[int]], Optional[PmxModel]]:
+    """
+    衣装モデルを読み込んで、人物に合わせたフィッティングモーフを作る
+    preview_meshes: 間引きメッシュの保持先（未指定の場合、間引きメッシュは作らない）
+    """
+    logger.info("衣装: 読み込み開始", decoration=MLogger.Decoration.BOX)
+
+    usecase.timer.start("衣装")
+    usecase.timer.lap("読み込み")
+
+    original_dress = reader.read_by_filepath(dress_path)
+
+    usecase.valid_model(original_dress, "衣装")
+    usecase.cancel_token.check()
+
+    # 面やテクスチャなど書き換えない部分は元モデルと共有する
+    dress = create_model_layer(original_dress)
+
+    usecase.timer.add_model("衣装(元)", original_dress)
+    usecase.timer.add_model("衣装", dress)
+    dress.update_vertices_by_bone()
+
+    logger.info("衣装: ボーン調整", decoration=MLogger.Decoration.BOX)
+
+    # 不足ボーン追加
+    logger.info("衣装: 不足ボーン調整", decoration=MLogger.Decoration.LINE)
+    usecase.timer.lap("insert_mismatch_bones")
+    usecase.insert_mismatch_bones(model, dress)
+
+    usecase.timer.lap("get_bone_positions")
+
+    model_standard_positions, model_out_standard_positions = usecase.get_bone_positions(model)
+    dress_standard_positions, dress_out_standard_positions = usecase.get_bone_positions(dress)
+
+    replaced_bone_names: list[str] = []
+
+    logger.info("衣装: 位置調整", decoration=MLogger.Decoration.LINE)
+
+    # 上半身の再設定
+    usecase.timer.lap("replace_upper")
+    replaced_bone_names += usecase.replace_upper(model, dress)
+
+    # 上半身2の再設定
+    usecase.timer.lap("replace_upper2")
+    replaced_bone_names += usecase.replace_upper2(model, dress)
+
+    # 上半身3の再設定
+    usecase.timer.lap("replace_upper3")
+    replaced_bone_names += usecase.replace_upper3(model, dress)
+
+    # # 胸の再設定
+    # replaced_bust_bone_names = usecase.replace_bust(model, dress)
+
+    # 首の再設定
+    usecase.timer.lap("replace_neck")
+    usecase.replace_neck(model, dress)
+
+    # 肩と腕の再設定
+    usecase.timer.lap("replace_shoulder_arm")
+    usecase.replace_shoulder_arm(model, dress)
+
+    # 捩りの再設定
+    usecase.timer.lap("replace_twist")
+    usecase.replace_twist(model, dress, replaced_bone_names)
+
+    # 下半身の再設定
+    usecase.timer.lap("replace_lower")
+    replaced_bone_names += usecase.replace_lower(model, dress)
+
+    usecase.cancel_token.check()
+
+    logger.info("衣装: ウェイト調整", decoration=MLogger.Decoration.LINE)
+    usecase.timer.lap("ウェイト調整")
+
+    # if replaced_bust_bone_names:
+    #     dress.setup()
+    #     usecase.replace_bust_weights(dress, replaced_bust_bone_names)
+
+    if replaced_bone_names:
+        dress.setup()
+        dress.replace_standard_weights(replaced_bone_names)
+        usecase.update_bone_statistics(dress)
+
+    # 首根元にウェイトを振る
+    usecase.replace_neck_root_weights(dress)
+    dress.update_vertices_by_bone()
+
+    # 衣装に材質透明モーフを入れる
+    logger.info("衣装: 追加セットアップ: 材質透過モーフ追加", decoration=MLogger.Decoration.BOX)
+    usecase.timer.lap("材質透過モーフ追加")
+    usecase.create_material_transparent_morphs(dress)
+
+    # 個別調整用モーフ追加
+    logger.info("衣装: 追加セットアップ: 個別調整ボーンモーフ追加", decoration=MLogger.Decoration.BOX)
+    usecase.timer.lap("create_dress_individual_bone_morphs")
+    individual_morph_names, individual_target_bone_indexes = usecase.create_dress_individual_bone_morphs(dress)
+
+    usecase.cancel_token.check()
+
+    # 衣装にフィッティングボーンモーフを入れる
+    logger.info("衣装: 追加セットアップ: フィッティングモーフ追加", decoration=MLogger.Decoration.BOX)
+    usecase.timer.lap("create_dress_fit_morphs")
+    usecase.create_dress_fit_morphs(
+        model,
+        dress,
+        model_standard_positions,
+        model_out_standard_positions,
+        dress_standard_positions,
+        dress_out_standard_positions,
+        usecase.is_symmetric_fitting,
+    )
+
+    preview_dress: Optional[PmxModel] = None
+    if preview_meshes:
+        # 操作中に表示する間引きメッシュ
+        usecase.timer.lap("間引きメッシュ作成")
+        preview_dress = preview_meshes.create_model(dress)
+
+    usecase.timer.end()
+
+    return original_dress, dress, individual_morph_names, individual_target_bone_indexes, preview_dress
+
+
+def load_all(
+    model_path: str,
+    dress_path: str,
+    motion_path: str,
+    is_trace_fitting: bool = False,
+    is_symmetric_fitting: bool = False,
+) -> tuple[tuple[PmxModel, PmxModel, PmxModel, PmxModel, VmdMotion, list[str], list[list[int]]], StageTimer, FittingTrace]:
+    """
+    人物・衣装・モーションをまとめて読み込む（子プロセスで実行する。段階ごとの処理時間とボーンフィッティングの記録も返す）
+    間引きメッシュは親プロセスの保持分を使えるように、親プロセスで作る
+    """
+    logger.info("お着替えモデル読み込み開始", decoration=MLogger.Decoration.BOX)
+
+    usecase = LoadUsecase()
+    usecase.trace.is_enabled = is_trace_fitting
+    usecase.is_symmetric_fitting = is_symmetric_fitting
+    original_model, model = load_model(usecase, PmxReader(), model_path)
+    original_dress, dress, individual_morph_names, individual_target_bone_indexes, _ = load_dress(
+        usecase, PmxReader(), dress_path, model, None
+    )
+
+    logger.info("モーション読み込み開始", decoration=MLogger.Decoration.BOX)
+    with usecase.timer.stage("モーション読み込み"):
+        motion = VmdReader().read_by_filepath(motion_path)
+
+    logger.info("お着替えモデル読み込み完了", decoration=MLogger.Decoration.BOX)
+
+    return (
+        (
+            original_model,
+            model,
+            original_dress,
+            dress,
+            motion,
+            individual_morph_names,
+            individual_target_bone_indexes,
+        ),
+        usecase.timer,
+        usecase.trace,
+    )
@@ -1,5 +1,6 @@
 import logging
 import os
+from datetime import datetime
 from typing import Optional
 
 import wx
@@ -12,7 +13,14 @@ from mlib.service.form.base_frame import BaseFrame
 from mlib.utils.file_utils import get_root_dir
 from mlib.vmd.vmd_collection import VmdMotion
 from service.form.panel.file_panel import FilePanel
+from service.usecase.cancel_token import CancelToken
+from service.usecase.fitting_trace import FittingTrace
 from service.usecase.load_usecase import LoadUsecase
+from service.usecase.model_cache import ModelCache
+from service.usecase.stage_timer import StageTimer
+from service.worker.load_steps import load_all, load_dress, load_model
+from service.worker.process_worker import execute_process
+from service.worker.stack_sampler import StackSampler
 
 logger = MLogger(os.path.basename(__file__), level=1)
 __ = logger.get_text
@@ -21,37 +29,83 @@ __ = logger.get_text
 class LoadWorker(BaseWorker):
     def __init__(self, frame: BaseFrame, result_event: wx.Event) -> None:
         super().__init__(frame, result_event)
+        self.cancel_token = CancelToken()
+        # 処理を始めた時のログの位置（ここから後だけを処理ごとのログに出力する）
+        self.log_mark: Optional[tuple[int, int]] = None
+
+    def start(self) -> None:
+        self.cancel_token.reset()
+        self.log_mark = self.frame.log_sink.mark()
+        super().start()
 
     def thread_execute(self):
+        # プロファイル指定がある場合、処理中のスタックを採取して出力する
+        profile_path = self.get_profile_path()
+        with StackSampler.profile(profile_path):
+            self.execute_load(profile_path)
+
+    def execute_load(self, profile_path: str):
         file_panel: FilePanel = self.frame.file_panel
+
+        cache_key: Optional[tuple] = None
+        cached_data: Optional[tuple] = None
+        if file_panel.model_ctrl.valid() and file_panel.dress_ctrl.valid():
+            # 最近読み込んだ人物と衣装の組み合わせの場合、フィッティング済みのモデルをそのまま使う
+            cache_key = ModelCache.get_file_key(file_panel.model_ctrl.path, file_panel.dress_ctrl.path)
+            if not (file_panel.model_ctrl.data and file_panel.dress_ctrl.data):
+                cached_data = self.frame.model_cache.get(cache_key)
+
+        if (
+            self.frame.process_logger_config
+            and file_panel.model_ctrl.valid()
+            and not file_panel.model_ctrl.data
+            and file_panel.dress_ctrl.valid()
+            and file_panel.motion_ctrl.valid()
+            and not cached_data
+        ):
+            # 人物から読み込み直す場合、フィッティングまで子プロセスで実行する
+            result_data, timer, trace = execute_process(
+                self.frame.process_logger_config,
+                load_all,
+                file_panel.model_ctrl.path,
+                file_panel.dress_ctrl.path,
+                file_panel.motion_ctrl.path,
+                self.frame.is_trace_fitting,
+                self.frame.is_symmetric_fitting,
+                cancel_token=self.cancel_token,
+                profile_path=(f"{os.path.splitext(profile_path)[0]}.process.folded" if profile_path else ""),
+            )
+
+            # 間引きメッシュは、直近の衣装の間引き結果を使い回せるように親プロセスで作る
+            with timer.stage("間引きメッシュ作成"):
+                preview_dress = self.frame.preview_meshes.create_model(result_data[3])
+            self.result_data = result_data + (preview_dress,)
+
+            self.put_model_cache(cache_key, self.result_data[:4] + self.result_data[5:])
+            self.output_timing(timer)
+            self.output_trace(trace)
+            return
+
         model: Optional[PmxModel] = None
         dress: Optional[PmxModel] = None
+        preview_dress: Optional[PmxModel] = None
         motion: Optional[VmdMotion] = None
         individual_morph_names: list[str] = []
 
         is_model_change = False
         is_dress_change = False
-        usecase = LoadUsecase()
+        usecase = LoadUsecase(self.cancel_token)
+        usecase.trace.is_enabled = self.frame.is_trace_fitting
+        usecase.is_symmetric_fitting = self.frame.is_symmetric_fitting
 
         logger.info("お着替えモデル読み込み開始", decoration=MLogger.Decoration.BOX)
 
-        if file_panel.model_ctrl.valid() and not file_panel.model_ctrl.data:
-            logger.info("人物: 読み込み開始", decoration=MLogger.Decoration.BOX)
-
-            original_model = file_panel.model_ctrl.reader.read_by_filepath(file_panel.model_ctrl.path)
-
-            usecase.valid_model(original_model, "人物")
-
-            model = original_model.copy()
-
-            # 首根元にウェイトを振る
-            usecase.replace_neck_root_weights(model)
-            model.update_vertices_by_bone()
-
-            # 人物に材質透明モーフを入れる
-            logger.info("人物: 追加セットアップ: 材質透過モーフ追加")
-            usecase.create_material_transparent_morphs(model)
-
+        if cached_data:
+            logger.info("人物: 読み込み済みのモデルを使用します")
+            original_model, model = cached_data[:2]
+            is_model_change = True
+        elif file_panel.model_ctrl.valid() and not file_panel.model_ctrl.data:
+            original_model, model = load_model(usecase, file_panel.model_reader, file_panel.model_ctrl.path)
             is_model_change = True
         elif file_panel.model_ctrl.original_data:
             original_model = file_panel.model_ctrl.original_data
@@ -60,93 +114,50 @@ class LoadWorker(BaseWorker):
             original_model = PmxModel()
             model = PmxModel()
 
-        if model and isinstance(model, PmxModel) and file_panel.dress_ctrl.valid() and (is_model_change or not file_panel.dress_ctrl.data):
-            logger.info("衣装: 読み込み開始", decoration=MLogger.Decoration.BOX)
-
-            original_dress = file_panel.dress_ctrl.reader.read_by_filepath(file_panel.dress_ctrl.path)
-
-            usecase.valid_model(original_dress, "衣装")
-
-            dress = original_dress.copy()
-            dress.update_vertices_by_bone()
-
-            logger.info("衣装: ボーン調整", decoration=MLogger.Decoration.BOX)
-
-            # 不足ボーン追加
-            logger.info("衣装: 不足ボーン調整", decoration=MLogger.Decoration.LINE)
-            usecase.insert_mismatch_bones(model, dress)
-
-            model_standard_positions, model_out_standard_positions = usecase.get_bone_positions(model)
-            dress_standard_positions, dress_out_standard_positions = usecase.get_bone_positions(dress)
-
-            replaced_bone_names: list[str] = []
-
-            logger.info("衣装: 位置調整", decoration=MLogger.Decoration.LINE)
-
-            # 上半身の再設定
-            replaced_bone_names += usecase.replace_upper(model, dress)
-
-            # 上半身2の再設定
-            replaced_bone_names += usecase.replace_upper2(model, dress)
-
-            # 上半身3の再設定
-            replaced_bone_names += usecase.replace_upper3(model, dress)
-
-            # # 胸の再設定
-            # replaced_bust_bone_names = usecase.replace_bust(model, dress)
-
-            # 首の再設定
-            usecase.replace_neck(model, dress)
-
-            # 肩と腕の再設定
-            usecase.replace_shoulder_arm(model, dress)
-
-            # 捩りの再設定
-            usecase.replace_twist(model, dress, replaced_bone_names)
-
-            # 下半身の再設定
-            replaced_bone_names += usecase.replace_lower(model, dress)
-
-            logger.info("衣装: ウェイト調整", decoration=MLogger.Decoration.LINE)
-
-            # if replaced_bust_bone_names:
-            #     dress.setup()
-            #     usecase.replace_bust_weights(dress, replaced_bust_bone_names)
-
-            if replaced_bone_names:
-                dress.setup()
-                dress.replace_standard_weights(replaced_bone_names)
-
-            # 首根元にウェイトを振る
-            usecase.replace_neck_root_weights(dress)
-            dress.update_vertices_by_bone()
-
-            # 衣装に材質透明モーフを入れる
-            logger.info("衣装: 追加セットアップ: 材質透過モーフ追加", decoration=MLogger.Decoration.BOX)
-            usecase.create_material_transparent_morphs(dress)
-
-            # 個別調整用モーフ追加
-            logger.info("衣装: 追加セットアップ: 個別調整ボーンモーフ追加", decoration=MLogger.Decoration.BOX)
-            individual_morph_names, individual_target_bone_indexes = usecase.create_dress_individual_bone_morphs(dress)
-
-            # 衣装にフィッティングボーンモーフを入れる
-            logger.info("衣装: 追加セットアップ: フィッティングモーフ追加", decoration=MLogger.Decoration.BOX)
-            usecase.create_dress_fit_morphs(
-                model, dress, model_standard_positions, model_out_standard_positions, dress_standard_positions, dress_out_standard_positions
+        if cached_data:
+            logger.info("衣装: 読み込み済みのモデルを使用します")
+            original_dress, dress, individual_morph_names, individual_target_bone_indexes, preview_dress = cached_data[2:]
+            is_dress_change = True
+        elif (
+            model and isinstance(model, PmxModel) and file_panel.dress_ctrl.valid() and (is_model_change or not file_panel.dress_ctrl.data)
+        ):
+            (
+                original_dress,
+                dress,
+                individual_morph_names,
+                individual_target_bone_indexes,
+                preview_dress,
+            ) = load_dress(usecase, file_panel.dress_reader, file_panel.dress_ctrl.path, model, self.frame.preview_meshes)
+
+            self.put_model_cache(
+                cache_key,
+                (
+                    original_model,
+                    model,
+                    original_dress,
+                    dress,
+                    individual_morph_names,
+                    individual_target_bone_indexes,
+                    preview_dress,
+                ),
             )
 
             is_dress_change = True
         elif file_panel.dress_ctrl.original_data:
             original_dress = file_panel.dress_ctrl.original_data
             dress = file_panel.dress_ctrl.data
+            preview_dress = self.frame.dress_preview_model
         else:
             original_dress = PmxModel()
             dress = PmxModel()
 
+        usecase.cancel_token.check()
+
         if file_panel.motion_ctrl.valid() and (not file_panel.motion_ctrl.data or is_model_change or is_dress_change):
             logger.info("モーション読み込み開始", decoration=MLogger.Decoration.BOX)
 
-            motion = file_panel.motion_ctrl.reader.read_by_filepath(file_panel.motion_ctrl.path)
+            with usecase.timer.stage("モーション読み込み"):
+                motion = file_panel.motion_reader.read_by_filepath(file_panel.motion_ctrl.path)
         elif file_panel.motion_ctrl.original_data:
             motion = file_panel.motion_ctrl.original_data
         else:
@@ -166,12 +177,58 @@ class LoadWorker(BaseWorker):
             PmxWriter(dress, out_path, include_system=True).save()
             logger.debug(f"変形モーフ付き衣装: 出力: {out_path}")
 
-        self.result_data = (original_model, model, original_dress, dress, motion, individual_morph_names, individual_target_bone_indexes)
+        self.result_data = (
+            original_model,
+            model,
+            original_dress,
+            dress,
+            motion,
+            individual_morph_names,
+            individual_target_bone_indexes,
+            preview_dress,
+        )
+
+        self.output_timing(usecase.timer)
+        self.output_trace(usecase.trace)
 
         logger.info("お着替えモデル読み込み完了", decoration=MLogger.Decoration.BOX)
 
+    def put_model_cache(self, cache_key: Optional[tuple], cache_data: tuple) -> None:
+        """
+        読み込み・フィッティング済みのモデルを保持する
+        cache_data: (人物元モデル, 人物モデル, 衣装元モデル, 衣装モデル, 個別調整モーフ名, 個別調整ボーンINDEX, 間引きメッシュの衣装モデル)
+        """
+        if not cache_key:
+            return
+
+        original_model, model, original_dress, dress, _, _, preview_dress = cache_data
+        self.frame.model_cache.put(cache_key, cache_data, original_model, model, original_dress, dress, preview_dress)
+
     def output_log(self):
         file_panel: FilePanel = self.frame.file_panel
         output_log_path = os.path.join(get_root_dir(), f"{os.path.basename(file_panel.output_pmx_ctrl.path)}.log")
-        # 出力されたメッセージを全部出力
-        file_panel.console_ctrl.text_ctrl.SaveFile(filename=output_log_path)
+        # 逐次書き出しているログをコピーする（コンソールには最近の行しか残っていない）
+        self.frame.log_sink.save(output_log_path, self.log_mark)
+
+    def output_timing(self, timer: StageTimer) -> None:
+        """段階ごとの処理時間をログと同じ場所に出力する"""
+        file_panel: FilePanel = self.frame.file_panel
+        output_timing_path = os.path.join(get_root_dir(), f"{os.path.basename(file_panel.output_pmx_ctrl.path)}.load.json")
+        timer.save(output_timing_path)
+        timer.output_summary()
+
+    def output_trace(self, trace: FittingTrace) -> None:
+        """ボーンフィッティングの記録をログと同じ場所に出力する（記録していない場合は何もしない）"""
+        if not trace.rows:
+            return
+
+        file_panel: FilePanel = self.frame.file_panel
+        output_trace_path = os.path.join(get_root_dir(), f"{os.path.basename(file_panel.output_pmx_ctrl.path)}.fit.csv")
+        trace.save(output_trace_path)
+        trace.output_summary()
+
+    def get_profile_path(self) -> str:
+        """スタックの出力先（プロファイル指定が無い場合は空）"""
+        if not self.frame.is_profile:
+            return ""
+        return os.path.join(get_root_dir(), "profile", f"load_{datetime.now():%Y%m%d_%H%M%S}.folded")
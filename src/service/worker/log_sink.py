@@ -0,0 +1,118 @@
+import os
+import shutil
+from threading import Lock
+from typing import IO, Any, Optional
+
+from mlib.core.logger import MLogger
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+LOG_FILE_NAME = "console.log"
+"""逐次書き出すログのファイル名"""
+
+LOG_MAX_BYTES = 10 * 1024**2
+"""ログファイル1つあたりの上限バイト数（超えたら次のファイルに切り替える）"""
+
+LOG_BACKUP_COUNT = 3
+"""切り替えた古いログファイルを残す数"""
+
+
+class LogSink:
+    """
+    標準出力の代わりに出力を受け取り、ログファイルに逐次書き出してから元の出力先（コンソール）に流す
+    行単位でファイルに書き出すので、途中でプロセスが落ちてもそれまでのログは残る
+    ログファイルは起動をまたいで追記するので、処理ごとのログは mark で覚えた位置から save で切り出す
+    """
+
+    def __init__(self, stream: Any, log_path: str, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT) -> None:
+        """
+        stream: 元の出力先（write を持つもの）
+        log_path: ログファイルパス
+        """
+        self.stream = stream
+        self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.lock = Lock()
+        # ログファイルを切り替えた回数
+        self.rotation_count = 0
+        # 現在のログファイルのバイト数（書き込むたびに tell しないよう、書いた分を足していく）
+        self.file_bytes = 0
+
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        self.file = self.open()
+
+    def open(self) -> IO[str]:
+        # 起動をまたいで追記するので、既に書かれている分から数える
+        self.file_bytes = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        # 行バッファにして、改行ごとにファイルに書き出す
+        return open(self.log_path, "a", encoding="utf-8", buffering=1)
+
+    def write(self, text: str) -> int:
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(text)
+                # 改行は書き込み時にOSの改行コードに変換される
+                self.file_bytes += len(text.encode("utf-8")) + text.count("\n") * (len(os.linesep) - 1)
+                if self.max_bytes < self.file_bytes:
+                    self.rotate()
+
+        self.stream.write(text)
+        return len(text)
+
+    def flush(self) -> None:
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+        if hasattr(self.stream, "flush"):
+            self.stream.flush()
+
+    def rotate(self) -> None:
+        """ログファイルを切り替える（古いものから順に番号をずらし、上限を超えたものは消す）"""
+        self.file.close()
+
+        for n in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.log_path}.{n}"):
+                os.replace(f"{self.log_path}.{n}", f"{self.log_path}.{n + 1}")
+        if 0 < self.backup_count:
+            os.replace(self.log_path, f"{self.log_path}.1")
+        else:
+            os.remove(self.log_path)
+
+        self.file = self.open()
+        self.rotation_count += 1
+
+    def mark(self) -> tuple[int, int]:
+        """現在の書き込み位置（切り替えた回数, ファイル内のバイト位置）"""
+        with self.lock:
+            self.file.flush()
+            return self.rotation_count, self.file.tell()
+
+    def save(self, output_path: str, start_mark: Optional[tuple[int, int]] = None) -> None:
+        """
+        ログを指定パスにコピーする
+        start_mark: mark で覚えた位置。指定した場合はそこから後（途中で切り替えたファイルも含む）だけをコピーする
+        """
+        with self.lock:
+            self.file.flush()
+
+            rotation_count, start_position = start_mark or (self.rotation_count, 0)
+            # 古い順に、切り替え済みのファイル（番号が大きいほど古い）と現在のファイル
+            log_paths = [f"{self.log_path}.{n}" for n in range(self.rotation_count - rotation_count, 0, -1)] + [self.log_path]
+
+            with open(output_path, "wb") as output_file:
+                for n, log_path in enumerate(log_paths):
+                    if not os.path.exists(log_path):
+                        # 古すぎて消えたファイルは飛ばし、残っている分だけコピーする
+                        continue
+                    with open(log_path, "rb") as log_file:
+                        if n == 0:
+                            log_file.seek(start_position)
+                        shutil.copyfileobj(log_file, output_file)
+
+    def close(self) -> None:
+        """ログファイルを閉じる（閉じた後に来た出力は、元の出力先にだけ流す）"""
+        with self.lock:
+            self.file.close()
@@ -0,0 +1,80 @@
+import os
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Any, Optional
+
+from mlib.core.logger import MLogger
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+class PrefetchReader:
+    """
+    ファイルパスが指定された時点で裏で読み込んでおくリーダー
+    読み込み時にパスが変わっていた場合は、先読みした結果を捨てて読み直す
+    """
+
+    def __init__(self, reader_class: type, is_enabled: bool = True) -> None:
+        """
+        reader_class: read_by_filepath を持つリーダークラス（スレッドごとに別インスタンスで読み込む）
+        is_enabled: 先読みするか（子プロセスで読み込む場合、先読みしても使われないので先読みしない）
+        """
+        self.reader_class = reader_class
+        self.is_enabled = is_enabled
+        # 画面と読み込み処理の両方から触るので、先読み中のパスと結果はロックして入れ替える
+        self.lock = Lock()
+        self.path = ""
+        self.future: Optional[Future] = None
+
+    def prefetch(self, path: str) -> None:
+        """裏で読み込みを始める（同じパスを読み込み中の場合は何もしない）"""
+        if not self.is_enabled:
+            return
+
+        with self.lock:
+            if self.future and path == self.path:
+                return
+
+            if self.future:
+                self.future.cancel()
+            self.path = path
+            self.future = Future()
+            # 先読み中でもアプリを終了できるよう、デーモンスレッドで読み込む
+            Thread(target=self.read, args=(self.future, path), daemon=True).start()
+
+    def read(self, future: Future, path: str) -> None:
+        if not future.set_running_or_notify_cancel():
+            # 読み込み前に捨てられた場合は読み込まない
+            return
+
+        try:
+            future.set_result(self.reader_class().read_by_filepath(path))
+        except Exception as e:
+            future.set_exception(e)
+
+    def clear(self) -> None:
+        """先読みを捨てる（読み込み中の場合も結果は使わない）"""
+        with self.lock:
+            if self.future:
+                self.future.cancel()
+            self.path = ""
+            self.future = None
+
+    def read_by_filepath(self, path: str) -> Any:
+        """先読みしたパスと同じ場合は先読み結果を返し、そうでない場合はその場で読み込む"""
+        with self.lock:
+            future = self.future if path == self.path else None
+            if future:
+                # 先読み結果は一度使ったら捨てる（読み込んだデータはファイルパネル側で保持する）
+                self.path = ""
+                self.future = None
+
+        if future:
+            try:
+                return future.result()
+            except Exception:
+                # 先読みに失敗した場合は、その場で読み直してエラーを出す
+                logger.debug(f"先読み失敗: {path}")
+
+        return self.reader_class().read_by_filepath(path)
@@ -0,0 +1,122 @@
+import os
+import pickle
+import sys
+import tempfile
+import traceback
+from multiprocessing import get_context
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Optional
+
+from mlib.core.exception import MApplicationException
+from mlib.core.logger import MLogger
+from service.usecase.cancel_token import CancelToken
+from service.worker.stack_sampler import StackSampler
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+# 中断要求を確認する間隔(秒)
+CANCEL_POLL_SECONDS = 0.1
+
+# 子プロセスから送るメッセージの種類
+MESSAGE_TEXT = "text"
+MESSAGE_RESULT = "result"
+MESSAGE_ERROR = "error"
+
+
+class PipeWriter:
+    """子プロセスの標準出力をパイプ経由で親プロセスに流す"""
+
+    def __init__(self, conn: Connection) -> None:
+        self.conn = conn
+
+    def write(self, text: str) -> int:
+        if text:
+            self.conn.send((MESSAGE_TEXT, text))
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def execute_process(
+    logger_config: dict[str, Any],
+    target: Callable[..., Any],
+    *args: Any,
+    cancel_token: Optional[CancelToken] = None,
+    profile_path: str = "",
+) -> Any:
+    """
+    重い処理を子プロセスで実行する（GILを握らないので、その間もUIが固まらない）
+    ログは子プロセスの標準出力をパイプで受け取ってそのまま出力し、結果はキャッシュファイル経由で受け取る
+    logger_config: 子プロセスでロガーを初期化する引数
+    target: 子プロセスで実行する関数（モジュール直下に定義したもの）
+    cancel_token: 中断要求があった場合、子プロセスを止める
+    profile_path: 指定した場合、子プロセスでスタックを採取して出力する
+    """
+    parent_conn, child_conn = get_context("spawn").Pipe(duplex=False)
+    cache_path = os.path.join(tempfile.gettempdir(), f"{os.getpid()}_{target.__name__}.pkl")
+
+    process = get_context("spawn").Process(
+        target=execute_child, args=(child_conn, cache_path, logger_config, target, args, profile_path), daemon=True
+    )
+    process.start()
+    child_conn.close()
+
+    result: Any = None
+    try:
+        while True:
+            if cancel_token and cancel_token.is_canceled:
+                # 子プロセスは途中で止めて、途中までの結果は捨てる
+                process.terminate()
+                cancel_token.check()
+
+            if not parent_conn.poll(CANCEL_POLL_SECONDS):
+                continue
+
+            try:
+                message_type, message = parent_conn.recv()
+            except EOFError:
+                raise MApplicationException("子プロセスが異常終了しました")
+
+            if message_type == MESSAGE_TEXT:
+                sys.stdout.write(message)
+            elif message_type == MESSAGE_ERROR:
+                raise message
+            elif message_type == MESSAGE_RESULT:
+                with open(cache_path, "rb") as f:
+                    result = pickle.load(f)
+                break
+    finally:
+        process.join()
+        parent_conn.close()
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+    return result
+
+
+def execute_child(
+    conn: Connection, cache_path: str, logger_config: dict[str, Any], target: Callable[..., Any], args: tuple, profile_path: str
+) -> None:
+    """子プロセス側の実行"""
+    sys.stdout = PipeWriter(conn)
+    sys.stderr = sys.stdout
+
+    try:
+        MLogger.initialize(**logger_config)
+
+        with StackSampler.profile(profile_path):
+            result = target(*args)
+
+        with open(cache_path, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        conn.send((MESSAGE_RESULT, None))
+    except MApplicationException as e:
+        conn.send((MESSAGE_ERROR, e))
+    except Exception:
+        conn.send((MESSAGE_ERROR, MApplicationException(traceback.format_exc())))
+    finally:
+        conn.close()
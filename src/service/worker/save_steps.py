@@ -0,0 +1,15 @@
+import os
+
+from mlib.core.logger import MLogger
+from service.usecase.save_usecase import SaveUsecase
+from service.usecase.stage_timer import StageTimer
+
+logger = MLogger(os.path.basename(__file__), level=1)
+__ = logger.get_text
+
+
+def save(*args) -> StageTimer:
+    """お着替えモデルを出力する（子プロセスで実行する。段階ごとの処理時間を返す）"""
+    usecase = SaveUsecase()
+    usecase.save(*args)
+    return usecase.timer
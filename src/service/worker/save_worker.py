@@ -1,4 +1,6 @@
 import os
+from datetime import datetime
+from typing import Optional
 
 import wx
 
@@ -9,7 +11,12 @@ from mlib.service.form.base_frame import BaseFrame
 from mlib.utils.file_utils import get_root_dir
 from service.form.panel.config_panel import ConfigPanel
 from service.form.panel.file_panel import FilePanel
+from service.usecase.cancel_token import CancelToken
 from service.usecase.save_usecase import SaveUsecase
+from service.usecase.stage_timer import StageTimer
+from service.worker.process_worker import execute_process
+from service.worker.save_steps import save
+from service.worker.stack_sampler import StackSampler
 
 logger = MLogger(os.path.basename(__file__))
 __ = logger.get_text
@@ -18,8 +25,22 @@ __ = logger.get_text
 class SaveWorker(BaseWorker):
     def __init__(self, frame: BaseFrame, result_event: wx.Event) -> None:
         super().__init__(frame, result_event)
+        self.cancel_token = CancelToken()
+        # 処理を始めた時のログの位置（ここから後だけを処理ごとのログに出力する）
+        self.log_mark: Optional[tuple[int, int]] = None
+
+    def start(self) -> None:
+        self.cancel_token.reset()
+        self.log_mark = self.frame.log_sink.mark()
+        super().start()
 
     def thread_execute(self):
+        # プロファイル指定がある場合、処理中のスタックを採取して出力する
+        profile_path = self.get_profile_path()
+        with StackSampler.profile(profile_path):
+            self.execute_save(profile_path)
+
+    def execute_save(self, profile_path: str):
         file_panel: FilePanel = self.frame.file_panel
         config_panel: ConfigPanel = self.frame.config_panel
 
@@ -44,7 +65,7 @@ class SaveWorker(BaseWorker):
 
         logger.info("お着替えモデル出力開始", decoration=MLogger.Decoration.BOX)
 
-        SaveUsecase().save(
+        save_args = (
             file_panel.model_ctrl.data,
             file_panel.dress_ctrl.original_data,
             file_panel.dress_ctrl.data,
@@ -67,11 +88,40 @@ class SaveWorker(BaseWorker):
             config_panel.dress_bone_ctrl.bone_target_dress,
         )
 
+        if self.frame.process_logger_config:
+            # 出力処理は子プロセスで実行する
+            timer = execute_process(
+                self.frame.process_logger_config,
+                save,
+                *save_args,
+                cancel_token=self.cancel_token,
+                profile_path=(f"{os.path.splitext(profile_path)[0]}.process.folded" if profile_path else ""),
+            )
+        else:
+            usecase = SaveUsecase(self.cancel_token)
+            usecase.save(*save_args)
+            timer = usecase.timer
+
+        self.output_timing(timer)
+
         logger.info("*** お着替えモデル出力成功 ***\n出力先: {f}", f=file_panel.output_pmx_ctrl.path, decoration=MLogger.Decoration.BOX)
 
     def output_log(self):
         file_panel: FilePanel = self.frame.file_panel
         output_log_path = os.path.join(get_root_dir(), f"{os.path.basename(file_panel.output_pmx_ctrl.path)}.log")
 
-        # 出力されたメッセージを全部出力
-        file_panel.console_ctrl.text_ctrl.SaveFile(filename=output_log_path)
+        # 逐次書き出しているログをコピーする（コンソールには最近の行しか残っていない）
+        self.frame.log_sink.save(output_log_path, self.log_mark)
+
+    def output_timing(self, timer: StageTimer) -> None:
+        """段階ごとの処理時間をログと同じ場所に出力する"""
+        file_panel: FilePanel = self.frame.file_panel
+        output_timing_path = os.path.join(get_root_dir(), f"{os.path.basename(file_panel.output_pmx_ctrl.path)}.save.json")
+        timer.save(output_timing_path)
+        timer.output_summary()
+
+    def get_profile_path(self) -> str:
+        """スタックの出力先（プロファイル指定が無い場合は空）"""
+        if not self.frame.is_profile:
+            return ""
+        return os.path.join(get_root_dir(), "profile", f"save_{datetime.now():%Y%m%d_%H%M%S}.folded")
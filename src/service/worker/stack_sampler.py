@@ -0,0 +1,77 @@
+import os
+import sys
+from contextlib import contextmanager
+from threading import Event, Thread, get_ident
+from types import FrameType
+from typing import Iterator, Optional
+
+from mlib.core.logger import MLogger
+
+logger = MLogger(os.path.basename(__file__))
+__ = logger.get_text
+
+
+PROFILE_INTERVAL = 0.005
+"""スタックを採取する間隔(秒)"""
+
+
+class StackSampler:
+    """
+    指定スレッドのスタックを一定間隔で採取するプロファイラ
+    結果は flamegraph.pl や speedscope で読める折り畳み形式（関数;関数;... 回数）で出力する
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        # キー: 折り畳んだスタック、値: 採取回数
+        self.stacks: dict[str, int] = {}
+        self.stop_event = Event()
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            frame: Optional[FrameType] = sys._current_frames().get(self.thread_id)
+            if not frame:
+                continue
+
+            frame_names: list[str] = []
+            while frame:
+                frame_names.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)})")
+                frame = frame.f_back
+
+            stack = ";".join(reversed(frame_names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def save(self, output_path: str) -> None:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+
+    @classmethod
+    @contextmanager
+    def profile(cls, output_path: Optional[str]) -> Iterator[None]:
+        """
+        with で囲んだ範囲を実行しているスレッドのスタックを採取して出力する
+        output_path: 出力先。未指定の場合は何もしない
+        """
+        if not output_path:
+            yield
+            return
+
+        sampler = cls(get_ident())
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.save(output_path)
+            logger.info("プロファイル出力: {p}", p=output_path)